@@ -4,8 +4,17 @@ Aplicaciones Distribuidas
 Sistema de gestión de calificaciones
 """
 
+import os
 import socket
 import json
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from nucleo.protocolo import recibir_mensaje, enviar_mensaje  # Mismo enmarcado que el servidor
+
+# Copia local del catálogo de NRCs: solo se descargan los cambios desde la última versión
+catalogo_nrcs = {}
+version_nrcs = None
 
 def mostrar_menu():
     """Muestra el menú de opciones"""
@@ -21,12 +30,47 @@ def mostrar_menu():
     print("6. Salir")
     print("="*50)
 
-def agregar_calificacion():
+def sincronizar_nrcs(client_socket):
+    """Actualiza la copia local del catálogo enviando la versión que ya se tiene"""
+    global catalogo_nrcs, version_nrcs
+    comando = {
+        "accion": "nrcs",
+        "datos": {
+            "version": version_nrcs
+        }
+    }
+    enviar_mensaje(client_socket, json.dumps(comando))
+    respuesta = json.loads(recibir_mensaje(client_socket))
+    
+    if respuesta['status'] != 'success':
+        return False
+    
+    if 'data' in respuesta:
+        catalogo_nrcs = {row['NRC']: row['Materia'] for row in respuesta['data']}
+    elif not respuesta.get('no_modificado'):
+        for nrc in respuesta.get('eliminados', []):
+            catalogo_nrcs.pop(nrc, None)
+        for row in respuesta.get('agregados', []):
+            catalogo_nrcs[row['NRC']] = row['Materia']
+    version_nrcs = respuesta.get('version')
+    return True
+
+def mostrar_nrcs_disponibles(client_socket):
+    """Muestra los NRCs vigentes consultando el catálogo actualizado"""
+    try:
+        sincronizar_nrcs(client_socket)
+    except (OSError, ValueError, KeyError):
+        pass  # Se muestra la última copia conocida
+    
+    if catalogo_nrcs:
+        print("\nNRCs disponibles: " + ", ".join(sorted(catalogo_nrcs)))
+
+def agregar_calificacion(client_socket):
     """Solicita datos para agregar una calificación"""
     print("\n--- AGREGAR CALIFICACIÓN ---")
     id_est = input("ID del estudiante: ")
     nombre = input("Nombre del estudiante: ")
-    print("\nNRCs disponibles: MAT101, MAT102, FIS101, FIS102, QUI101, PRG101, PRG102, BDD101, RED101, SOP101")
+    mostrar_nrcs_disponibles(client_socket)
     materia = input("NRC de la materia: ").upper()
     calificacion = input("Calificación: ")
     
@@ -42,10 +86,18 @@ def agregar_calificacion():
     return json.dumps(comando)
 
 def listar_calificaciones():
-    """Solicita listar todas las calificaciones"""
+    """Solicita listar las calificaciones (el servidor las envía por páginas)"""
+    materia = input("\nFiltrar por NRC (Enter para todas): ").strip().upper()
+    
     comando = {
-        "accion": "listar"
+        "accion": "listar",
+        "datos": {
+            "stream": True,
+            "limite": 200
+        }
     }
+    if materia:
+        comando["datos"]["materia"] = materia
     return json.dumps(comando)
 
 def buscar_calificacion():
@@ -61,7 +113,7 @@ def buscar_calificacion():
     }
     return json.dumps(comando)
 
-def actualizar_calificacion():
+def actualizar_calificacion(client_socket):
     """Solicita datos para actualizar una calificación"""
     print("\n--- ACTUALIZAR CALIFICACIÓN ---")
     id_est = input("ID del estudiante: ")
@@ -78,7 +130,7 @@ def actualizar_calificacion():
     }
     
     if cambiar_nrc == 's':
-        print("NRCs disponibles: MAT101, MAT102, FIS101, FIS102, QUI101, PRG101, PRG102, BDD101, RED101, SOP101")
+        mostrar_nrcs_disponibles(client_socket)
         datos_update["nueva_materia"] = input("Nuevo NRC: ").upper()
     
     comando = {
@@ -122,6 +174,9 @@ def mostrar_respuesta(respuesta_json):
                                 print(f"    {key}: {value}")
                 else:
                     print(f"  {respuesta['data']}")
+        elif respuesta['status'] == 'pendiente':
+            # El servidor aplicó el cambio pero todavía no lo pudo guardar en disco
+            print("\n! PENDIENTE:", respuesta.get('mensaje', ''))
         else:
             print("\n✗ ERROR:", respuesta.get('mensaje', 'Error desconocido'))
             
@@ -130,6 +185,32 @@ def mostrar_respuesta(respuesta_json):
     except Exception as e:
         print(f"\n✗ ERROR: {e}")
 
+def mostrar_listado(client_socket):
+    """Muestra el listado a medida que llegan las páginas del servidor"""
+    numero = 0
+    while True:
+        respuesta_json = recibir_mensaje(client_socket)
+        if respuesta_json is None:
+            raise ConnectionError("El servidor cerró la conexión")
+        respuesta = json.loads(respuesta_json)
+        
+        if respuesta['status'] != 'success':
+            print("\n✗ ERROR:", respuesta.get('mensaje', 'Error desconocido'))
+            return
+        
+        if numero == 0:
+            print("\n✓ ÉXITO:\n\nDatos:")
+        for item in respuesta['data']:
+            numero += 1
+            print(f"\n  Registro {numero}:")
+            for key, value in item.items():
+                print(f"    {key}: {value}")
+        
+        if respuesta.get('fin'):
+            if numero == 0:
+                print("  No hay registros")
+            return
+
 def main():
     # Configuración del cliente
     HOST = '127.0.0.1'
@@ -148,13 +229,13 @@ def main():
             opcion = input("\nSeleccione una opción: ")
             
             if opcion == '1':
-                comando = agregar_calificacion()
+                comando = agregar_calificacion(client_socket)
             elif opcion == '2':
                 comando = listar_calificaciones()
             elif opcion == '3':
                 comando = buscar_calificacion()
             elif opcion == '4':
-                comando = actualizar_calificacion()
+                comando = actualizar_calificacion(client_socket)
             elif opcion == '5':
                 comando = eliminar_calificacion()
             elif opcion == '6':
@@ -166,13 +247,20 @@ def main():
             
             try:
                 # Enviar comando al servidor
-                client_socket.send(comando.encode('utf-8'))
+                enviar_mensaje(client_socket, comando)
                 
-                # Recibir respuesta
-                respuesta = client_socket.recv(4096).decode('utf-8')
-                
-                # Mostrar respuesta
-                mostrar_respuesta(respuesta)
+                if opcion == '2':
+                    # El listado llega en varias respuestas parciales
+                    mostrar_listado(client_socket)
+                else:
+                    # Recibir respuesta
+                    respuesta = recibir_mensaje(client_socket)
+                    if respuesta is None:
+                        print("\n[!] El servidor cerró la conexión")
+                        break
+                    
+                    # Mostrar respuesta
+                    mostrar_respuesta(respuesta)
                 
                 input("\nPresione Enter para continuar...")
                 
@@ -1,17 +1,56 @@
 """
 Servidor de NRCs (Códigos de Registro de Curso)
-Servidor simple y secuencial que valida materias/NRC
+Servidor que valida materias/NRC
+Modos: secuencial (por defecto) o asyncio (--modo asyncio) para miles de conexiones
 Puerto: 12346
+
+Protocolo: cada comando termina en salto de línea y cada respuesta es una línea JSON,
+por lo que un cliente puede enviar varias consultas por la misma conexión.
+Un comando sin salto de línea se atiende como antes: una respuesta y se cierra
+(se reconoce por los primeros bytes y, si son ambiguos, porque el cliente deja de
+enviar sin haber mandado un salto de línea).
+
+Cada versión del catálogo se identifica por un hash de su contenido (ETag):
+LISTAR|<version> responde "no modificado" o solo los NRCs agregados/eliminados.
+En modo asyncio, SUSCRIBIR|<version> mantiene la conexión abierta y envía un evento
+cada vez que nrcs.csv se recarga.
+BUSCAR_PREFIJO|<texto>[|<limite>] autocompleta por código o por palabras del nombre
+de la materia usando índices ordenados (búsqueda binaria).
 """
 
+import argparse
+import asyncio
+import bisect
+import itertools
 import socket
 import csv
+import hashlib
 import json
 import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
 
 ARCHIVO_NRC = 'nrcs.csv'
 HOST = '127.0.0.1'
 PORT = 12346
+BACKLOG = 1024  # Conexiones pendientes en cola (limitado también por net.core.somaxconn)
+FIN_DE_MENSAJE = b'\n'  # Delimitador de comandos y respuestas
+MAX_COMANDO = 64 * 1024  # Tamaño máximo de un comando sin delimitador
+ESPERA_SIN_ENMARCADO = 0.2  # Pausa sin salto de línea tras la que el comando se toma como de un cliente antiguo
+SALUDO = b'HOLA' + FIN_DE_MENSAJE  # Lo primero que envía cliente_nrc en cada conexión nueva
+MAX_COMANDO_ANTIGUO = 1024  # El servidor original leía cada comando con un solo recv(1024)
+_conexiones_persistentes = False  # True en modo asyncio: la conexión sigue abierta tras cada ráfaga (ver HOLA)
+
+# Catálogo en memoria: se carga una vez y un vigilante en segundo plano lo recarga si cambia nrcs.csv
+INTERVALO_VERIFICACION = 1.0  # Segundos entre verificaciones de mtime/tamaño del archivo
+_catalogo = None  # Instantánea vigente (se reemplaza completa, nunca se modifica); las consultas la leen sin lock
+_catalogo_lock = threading.Lock()  # Serializa las recargas del catálogo
+HISTORIAL_VERSIONES = 16  # Versiones anteriores desde las que se puede pedir un delta
+_historial = OrderedDict()  # version -> índice de esa versión (la más reciente al final)
+LIMITE_PREFIJO = 10  # Resultados por defecto de BUSCAR_PREFIJO
+MAX_LIMITE_PREFIJO = 100
 
 def inicializar_nrc_csv():
     """Crea el archivo de NRCs si no existe con datos de ejemplo"""
@@ -32,30 +71,235 @@ def inicializar_nrc_csv():
             writer.writerow(['SOP101', 'Sistemas Operativos'])
         print(f"[*] Archivo {ARCHIVO_NRC} creado con datos de ejemplo")
 
-def listar_nrcs():
-    """Lista todos los NRCs disponibles"""
+def firma_archivo_nrc():
+    """Retorna (mtime, tamaño) de nrcs.csv para detectar cambios sin leerlo"""
+    estado = os.stat(ARCHIVO_NRC)
+    return (estado.st_mtime_ns, estado.st_size)
+
+def normalizar_texto(texto):
+    """Minúsculas y sin tildes, para comparar nombres de materias"""
+    descompuesto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).casefold().strip()
+
+def construir_indices_prefijo(indice):
+    """
+    Construye listas ordenadas (clave, NRC) para buscar por prefijo con bisect:
+    por código, por nombre completo normalizado y por cada palabra del nombre.
+    """
+    codigos = sorted((clave, clave) for clave in indice)
+    nombres = sorted((normalizar_texto(row['Materia']), clave) for clave, row in indice.items())
+    palabras = sorted(
+        (palabra, clave)
+        for nombre, clave in nombres
+        for palabra in set(nombre.split())
+    )
+    normalizados = {clave: nombre.split() for nombre, clave in nombres}
+    return {"codigos": codigos, "nombres": nombres, "palabras": palabras, "normalizados": normalizados}
+
+def cargar_catalogo(firma):
+    """
+    Lee nrcs.csv y construye el índice por NRC normalizado y la respuesta LISTAR serializada.
+    La versión es un hash del contenido: no cambia si el archivo se reescribe igual.
+    """
+    filas = []
+    indice = {}
+    with open(ARCHIVO_NRC, 'r', encoding='utf-8') as file:
+        reader = csv.DictReader(file)
+        for row in reader:
+            filas.append(row)
+            indice[row['NRC'].strip().upper()] = row
+    
+    contenido = json.dumps(filas, sort_keys=True).encode('utf-8')
+    version = hashlib.sha1(contenido).hexdigest()[:16]
+    respuesta_listar = {"status": "ok", "version": version, "data": filas}
+    return {
+        "firma": firma,
+        "version": version,
+        "indice": indice,
+        "respuesta_listar": respuesta_listar,
+        "listar_bytes": json.dumps(respuesta_listar).encode('utf-8'),
+        "prefijos": construir_indices_prefijo(indice),
+        "deltas": {}  # version anterior -> respuesta delta (se calcula al primer pedido)
+    }
+
+def registrar_version(catalogo):
+    """Guarda el índice de la versión publicada para poder calcular deltas después"""
+    _historial[catalogo['version']] = catalogo['indice']
+    _historial.move_to_end(catalogo['version'])
+    while len(_historial) > HISTORIAL_VERSIONES:
+        _historial.popitem(last=False)
+
+def obtener_catalogo():
+    """
+    Retorna la instantánea vigente del catálogo. No toma locks ni lee el archivo:
+    las recargas las hace recargar_catalogo fuera del camino de las consultas.
+    """
+    return _catalogo
+
+def recargar_catalogo():
+    """
+    Compara la firma de nrcs.csv y, si cambió, construye una instantánea nueva y la publica
+    de forma atómica. La llaman el arranque y el vigilante (hilo o executor), nunca una consulta.
+    """
+    global _catalogo
+    
+    with _catalogo_lock:
+        catalogo = _catalogo
+        try:
+            firma = firma_archivo_nrc()
+            if catalogo is None or firma != catalogo['firma']:
+                nuevo = cargar_catalogo(firma)
+                if catalogo is not None and nuevo['version'] == catalogo['version']:
+                    # Mismo contenido: se conserva la instantánea (y sus deltas ya calculados)
+                    catalogo['firma'] = firma
+                else:
+                    catalogo = nuevo
+                    registrar_version(catalogo)
+                    _catalogo = catalogo
+                    print(f"[*] Catálogo de NRCs cargado: {len(catalogo['indice'])} NRCs (versión {catalogo['version']})")
+        except Exception as e:
+            # Si la recarga falla se sigue sirviendo la última versión válida
+            if catalogo is None:
+                raise
+            print(f"[ERROR] No se pudo recargar {ARCHIVO_NRC}: {e}")
+        return catalogo
+
+def vigilar_catalogo_hilo():
+    """Modo secuencial: revisa nrcs.csv en un hilo aparte para que la recarga no frene las consultas"""
+    def vigilar():
+        while True:
+            time.sleep(INTERVALO_VERIFICACION)
+            try:
+                recargar_catalogo()
+            except Exception as e:
+                print(f"[ERROR] Vigilando {ARCHIVO_NRC}: {e}")
+    
+    hilo = threading.Thread(target=vigilar, daemon=True)
+    hilo.start()
+
+def calcular_delta(indice_anterior, indice_actual):
+    """Retorna (agregados o modificados, códigos eliminados) entre dos versiones"""
+    agregados = [row for clave, row in indice_actual.items() if indice_anterior.get(clave) != row]
+    eliminados = [clave for clave in indice_anterior if clave not in indice_actual]
+    return agregados, eliminados
+
+def listar_nrcs(version_cliente=None):
+    """
+    Lista todos los NRCs disponibles.
+    Si el cliente indica la versión que ya tiene, responde solo lo necesario:
+    "no_modificado" si es la vigente, o el delta si está en el historial.
+    """
     try:
-        nrcs = []
-        with open(ARCHIVO_NRC, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                nrcs.append(row)
-        return {"status": "ok", "data": nrcs}
+        catalogo = obtener_catalogo()
+        if not version_cliente:
+            return catalogo['respuesta_listar']
+        
+        if version_cliente == catalogo['version']:
+            return {"status": "ok", "version": catalogo['version'], "no_modificado": True}
+        
+        delta = catalogo['deltas'].get(version_cliente)
+        if delta is None:
+            indice_anterior = _historial.get(version_cliente)
+            if indice_anterior is None:
+                # Versión desconocida o demasiado antigua: catálogo completo
+                return catalogo['respuesta_listar']
+            agregados, eliminados = calcular_delta(indice_anterior, catalogo['indice'])
+            delta = {"status": "ok", "version": catalogo['version'], "desde": version_cliente,
+                     "agregados": agregados, "eliminados": eliminados}
+            catalogo['deltas'][version_cliente] = delta
+        return delta
     except Exception as e:
         return {"status": "error", "mensaje": str(e)}
 
 def buscar_nrc(nrc_codigo):
-    """Busca un NRC específico"""
+    """Busca un NRC específico en el índice en memoria"""
     try:
-        with open(ARCHIVO_NRC, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                if row['NRC'].upper() == nrc_codigo.upper():
-                    return {"status": "ok", "data": row}
+        row = obtener_catalogo()['indice'].get(nrc_codigo.strip().upper())
+        if row is not None:
+            return {"status": "ok", "data": row}
         return {"status": "error", "mensaje": f"NRC '{nrc_codigo}' no existe"}
     except Exception as e:
         return {"status": "error", "mensaje": str(e)}
 
+def buscar_nrcs(nrc_codigos):
+    """Valida varios NRCs en una sola consulta; retorna el resultado de cada código normalizado"""
+    try:
+        indice = obtener_catalogo()['indice']
+        resultados = {}
+        for nrc_codigo in nrc_codigos:
+            clave = nrc_codigo.strip().upper()
+            if not clave or clave in resultados:
+                continue
+            row = indice.get(clave)
+            if row is not None:
+                resultados[clave] = {"status": "ok", "data": row}
+            else:
+                resultados[clave] = {"status": "error", "mensaje": f"NRC '{clave}' no existe"}
+        return {"status": "ok", "data": resultados}
+    except Exception as e:
+        return {"status": "error", "mensaje": str(e)}
+
+def recorrer_prefijo(lista, prefijo):
+    """Genera las claves de NRC cuyas entradas en la lista ordenada empiezan con el prefijo"""
+    posicion = bisect.bisect_left(lista, (prefijo,))
+    while posicion < len(lista) and lista[posicion][0].startswith(prefijo):
+        yield lista[posicion][1]
+        posicion += 1
+
+def rango_prefijo(lista, prefijo):
+    """Retorna (inicio, fin) de las entradas de la lista ordenada que empiezan con el prefijo"""
+    return bisect.bisect_left(lista, (prefijo,)), bisect.bisect_left(lista, (prefijo + '\U0010ffff',))
+
+def buscar_por_palabras(prefijos, tokens):
+    """
+    Genera los NRCs con una palabra que empieza con cada token. Recorre solo el rango
+    del token más selectivo (el más corto en el índice) y filtra por los demás.
+    """
+    palabras = prefijos['palabras']
+    rangos = [rango_prefijo(palabras, token) for token in tokens]
+    elegido = min(range(len(tokens)), key=lambda n: rangos[n][1] - rangos[n][0])
+    otros = tokens[:elegido] + tokens[elegido + 1:]
+    for posicion in range(*rangos[elegido]):
+        clave = palabras[posicion][1]
+        if all(any(palabra.startswith(token) for palabra in prefijos['normalizados'][clave]) for token in otros):
+            yield clave
+
+def buscar_nrc_prefijo(texto, limite=LIMITE_PREFIJO):
+    """
+    Autocompleta NRCs por prefijo. Orden de los resultados:
+    1. código que empieza con el texto, 2. nombre completo que empieza con el texto,
+    3. nombres con palabras que empiezan con cada palabra del texto.
+    """
+    try:
+        limite = max(1, min(int(limite), MAX_LIMITE_PREFIJO))
+        catalogo = obtener_catalogo()
+        prefijos = catalogo['prefijos']
+        consulta = normalizar_texto(texto)
+        if not consulta:
+            return {"status": "error", "mensaje": "Texto de búsqueda vacío"}
+        
+        tokens = consulta.split()
+        candidatos = [
+            recorrer_prefijo(prefijos['codigos'], consulta.upper().replace(' ', '')),
+            recorrer_prefijo(prefijos['nombres'], consulta),
+            buscar_por_palabras(prefijos, tokens)
+        ]
+        
+        vistos = set()
+        resultados = []
+        for grupo in candidatos:
+            for clave in grupo:
+                if clave not in vistos:
+                    vistos.add(clave)
+                    resultados.append(catalogo['indice'][clave])
+                    if len(resultados) >= limite:
+                        return {"status": "ok", "data": resultados}
+        return {"status": "ok", "data": resultados}
+    except ValueError:
+        return {"status": "error", "mensaje": "Límite inválido"}
+    except Exception as e:
+        return {"status": "error", "mensaje": str(e)}
+
 def procesar_comando(comando_str):
     """Procesa comandos del cliente"""
     try:
@@ -67,20 +311,111 @@ def procesar_comando(comando_str):
         accion = partes[0].upper()
         
         if accion == "LISTAR":
-            return listar_nrcs()
+            version_cliente = partes[1].strip() if len(partes) == 2 else None
+            return listar_nrcs(version_cliente)
         elif accion == "BUSCAR" and len(partes) == 2:
             nrc_codigo = partes[1].strip()
             return buscar_nrc(nrc_codigo)
+        elif accion == "BUSCAR_MULTI" and len(partes) == 2:
+            return buscar_nrcs(partes[1].split(','))
+        elif accion == "BUSCAR_PREFIJO" and len(partes) in (2, 3):
+            return buscar_nrc_prefijo(partes[1], partes[2] if len(partes) == 3 else LIMITE_PREFIJO)
+        elif accion == "HOLA":
+            # Anuncia si el cliente puede reutilizar la conexión para más comandos
+            return {"status": "ok", "persistente": _conexiones_persistentes}
+        elif accion == "SUSCRIBIR":
+            # Las suscripciones las atiende el event loop (ver atender_suscripcion)
+            return {"status": "error", "mensaje": "SUSCRIBIR requiere el servidor en modo asyncio"}
         else:
             return {"status": "error", "mensaje": "Comando no reconocido"}
             
     except Exception as e:
         return {"status": "error", "mensaje": str(e)}
 
-def main():
-    # Inicializar archivo CSV
-    inicializar_nrc_csv()
+def responder(comando_str):
+    """
+    Procesa un comando y retorna (respuesta, bytes a enviar).
+    LISTAR (sin versión) reutiliza el JSON ya serializado de la instantánea vigente.
+    """
+    if comando_str.strip().upper() == "LISTAR":
+        try:
+            catalogo = obtener_catalogo()
+            return catalogo['respuesta_listar'], catalogo['listar_bytes']
+        except Exception:
+            pass
     
+    respuesta = procesar_comando(comando_str)
+    return respuesta, json.dumps(respuesta).encode('utf-8')
+
+def registrar_consulta(contador, client_address, data):
+    """Muestra en consola la consulta recibida"""
+    print(f"[Consulta #{contador}] Desde {client_address}: {data if len(data) <= 80 else data[:80] + '...'}")
+
+def registrar_respuesta(contador, respuesta):
+    """Muestra en consola el resultado de la consulta"""
+    if respuesta['status'] == 'ok':
+        print(f"[Respuesta #{contador}] ✓ OK")
+    else:
+        print(f"[Respuesta #{contador}] ✗ {respuesta['mensaje']}")
+
+def separar_comandos(buffer):
+    """Separa los comandos completos del buffer; retorna (comandos, resto sin delimitador)"""
+    *comandos, resto = buffer.split(FIN_DE_MENSAJE)
+    return [c.decode('utf-8') for c in comandos if c.strip()], resto
+
+def atender_comando(contador, client_address, data, enmarcado=True):
+    """Procesa un comando y retorna los bytes a enviar (con delimitador si es enmarcado)"""
+    registrar_consulta(contador, client_address, data)
+    respuesta, payload = responder(data)
+    registrar_respuesta(contador, respuesta)
+    return payload + FIN_DE_MENSAJE if enmarcado else payload
+
+def clasificar_rafaga(buffer):
+    """
+    Decide por los primeros bytes si el cliente usa enmarcado: True si ya llegó un salto
+    de línea o empieza con HOLA, False si es un comando completo de los que enviaban los
+    clientes antiguos (LISTAR o BUSCAR|<nrc>) y None si todavía no se puede saber.
+    """
+    if not buffer or FIN_DE_MENSAJE in buffer or SALUDO.startswith(bytes(buffer[:len(SALUDO)])):
+        return True
+    partes = bytes(buffer).strip().split(b'|')
+    accion = partes[0].upper()
+    if len(buffer) <= MAX_COMANDO_ANTIGUO and (accion, len(partes)) in ((b'LISTAR', 1), (b'BUSCAR', 2)):
+        return False
+    return None
+
+def leer_primera_rafaga(client_socket):
+    """
+    Lee el inicio de una conexión hasta ver un salto de línea.
+    Retorna (buffer, enmarcado): si los primeros bytes no lo deciden (ver clasificar_rafaga),
+    un cliente que hace una pausa o cierra sin enviar ninguno es un cliente sin enmarcado
+    (un solo comando y espera la respuesta).
+    """
+    buffer = client_socket.recv(65536)
+    enmarcado = clasificar_rafaga(buffer)
+    if enmarcado is False:
+        return buffer, False
+    # Con HOLA solo falta el resto de la línea: se espera el timeout normal, no la pausa
+    client_socket.settimeout(5 if enmarcado else ESPERA_SIN_ENMARCADO)
+    try:
+        while buffer and FIN_DE_MENSAJE not in buffer and len(buffer) <= MAX_COMANDO:
+            parte = client_socket.recv(65536)
+            if not parte:
+                break
+            buffer += parte
+    except socket.timeout:
+        pass
+    finally:
+        client_socket.settimeout(5)
+    return buffer, not buffer or FIN_DE_MENSAJE in buffer
+
+def servir_secuencial(backlog):
+    """
+    Atiende las conexiones una por una.
+    Responde todos los comandos enviados en la ráfaga inicial y cierra la conexión,
+    para que un cliente con conexión persistente no bloquee a los demás
+    (el cliente reconecta de forma transparente).
+    """
     # Crear socket TCP
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
@@ -88,8 +423,8 @@ def main():
     try:
         # Enlazar y escuchar
         server_socket.bind((HOST, PORT))
-        server_socket.listen(5)
-        print(f"[*] Servidor de NRCs escuchando en {HOST}:{PORT}")
+        server_socket.listen(backlog)
+        print(f"[*] Servidor de NRCs escuchando en {HOST}:{PORT} (modo secuencial)")
         print(f"[*] Archivo de NRCs: {ARCHIVO_NRC}")
         print("[*] Esperando consultas...")
         print("[*] Presione Ctrl+C para detener\n")
@@ -99,25 +434,32 @@ def main():
         while True:
             # Aceptar conexión
             client_socket, client_address = server_socket.accept()
-            contador += 1
+            client_socket.settimeout(5)  # Un cliente lento no puede retener el servidor
             
             try:
                 # Recibir comando
-                data = client_socket.recv(1024).decode('utf-8')
+                buffer, enmarcado = leer_primera_rafaga(client_socket)
                 
-                if data:
-                    print(f"[Consulta #{contador}] Desde {client_address}: {data}")
+                if len(buffer) > MAX_COMANDO and not enmarcado:
+                    print(f"[ERROR] Comando demasiado largo desde {client_address}")
+                elif not enmarcado:
+                    # Cliente sin enmarcado: una respuesta y se cierra
+                    contador += 1
+                    client_socket.sendall(atender_comando(contador, client_address, buffer.decode('utf-8'), enmarcado=False))
+                else:
+                    # Completar el último comando si llegó partido
+                    while buffer and not buffer.endswith(FIN_DE_MENSAJE) and len(buffer) < MAX_COMANDO:
+                        parte = client_socket.recv(4096)
+                        if not parte:
+                            break
+                        buffer += parte
                     
-                    # Procesar comando
-                    respuesta = procesar_comando(data)
-                    
-                    # Enviar respuesta en JSON
-                    client_socket.send(json.dumps(respuesta).encode('utf-8'))
-                    
-                    if respuesta['status'] == 'ok':
-                        print(f"[Respuesta #{contador}] ✓ OK")
-                    else:
-                        print(f"[Respuesta #{contador}] ✗ {respuesta['mensaje']}")
+                    comandos, resto = separar_comandos(buffer + FIN_DE_MENSAJE if buffer else buffer)
+                    respuestas = []
+                    for data in comandos:
+                        contador += 1
+                        respuestas.append(atender_comando(contador, client_address, data))
+                    client_socket.sendall(b''.join(respuestas))
                 
             except Exception as e:
                 print(f"[ERROR] Error procesando consulta: {e}")
@@ -132,5 +474,181 @@ def main():
         server_socket.close()
         print("[*] Servidor cerrado")
 
+_contador_asyncio = itertools.count(1)
+
+# Suscriptores a cambios del catálogo (solo modo asyncio)
+MAX_BUFFER_SUSCRIPTOR = 1024 * 1024  # Un suscriptor que no lee más de esto se desconecta
+_suscriptores = set()  # writers de las conexiones suscritas
+
+async def atender_suscripcion(reader, writer, client_address, version_cliente):
+    """
+    Mantiene abierta una suscripción: envía primero lo que le falta al cliente
+    (como LISTAR|<version>) y luego los eventos que publique vigilar_catalogo.
+    """
+    respuesta = dict(listar_nrcs(version_cliente))
+    respuesta['evento'] = 'catalogo'
+    # Suscrito antes del primer drain: una recarga mientras se envía el catálogo
+    # encola su evento detrás de él en vez de perderse
+    _suscriptores.add(writer)
+    print(f"[Suscripción] {client_address} suscrito ({len(_suscriptores)} activos)")
+    try:
+        writer.write(json.dumps(respuesta).encode('utf-8') + FIN_DE_MENSAJE)
+        await writer.drain()
+        # El suscriptor no envía más comandos; solo se espera a que cierre
+        while await reader.read(4096):
+            pass
+    finally:
+        _suscriptores.discard(writer)
+        print(f"[Suscripción] {client_address} desconectado ({len(_suscriptores)} activos)")
+
+def notificar_suscriptores(version_anterior):
+    """Envía a todos los suscriptores el cambio desde version_anterior a la vigente"""
+    evento = dict(listar_nrcs(version_anterior))
+    evento['evento'] = 'catalogo'
+    payload = json.dumps(evento).encode('utf-8') + FIN_DE_MENSAJE
+    
+    for writer in list(_suscriptores):
+        if writer.transport.get_write_buffer_size() > MAX_BUFFER_SUSCRIPTOR:
+            print("[Suscripción] Suscriptor lento desconectado")
+            _suscriptores.discard(writer)
+            writer.close()
+            continue
+        writer.write(payload)
+    print(f"[Suscripción] Cambio de catálogo notificado a {len(_suscriptores)} suscriptores")
+
+async def vigilar_catalogo():
+    """Revisa periódicamente nrcs.csv y publica cada versión nueva a los suscriptores"""
+    loop = asyncio.get_running_loop()
+    version = obtener_catalogo()['version']
+    while True:
+        await asyncio.sleep(INTERVALO_VERIFICACION)
+        try:
+            # La recarga lee el archivo: se hace fuera del event loop
+            catalogo = await loop.run_in_executor(None, recargar_catalogo)
+        except Exception as e:
+            print(f"[ERROR] Vigilando {ARCHIVO_NRC}: {e}")
+            continue
+        if catalogo['version'] != version:
+            notificar_suscriptores(version)
+            version = catalogo['version']
+
+async def leer_primera_rafaga_asyncio(reader):
+    """Como leer_primera_rafaga, pero sobre un StreamReader de asyncio"""
+    buffer = await reader.read(65536)
+    enmarcado = clasificar_rafaga(buffer)
+    if enmarcado is False:
+        return buffer, False
+    espera = None if enmarcado else ESPERA_SIN_ENMARCADO
+    try:
+        while buffer and FIN_DE_MENSAJE not in buffer and len(buffer) <= MAX_COMANDO:
+            parte = await asyncio.wait_for(reader.read(65536), espera)
+            if not parte:
+                break
+            buffer += parte
+    except asyncio.TimeoutError:
+        pass
+    return buffer, not buffer or FIN_DE_MENSAJE in buffer
+
+async def atender_conexion_asyncio(reader, writer):
+    """Atiende una conexión persistente dentro del event loop hasta que el cliente la cierre"""
+    client_address = writer.get_extra_info('peername')
+    
+    try:
+        # Recibir comando
+        buffer, enmarcado = await leer_primera_rafaga_asyncio(reader)
+        
+        if len(buffer) > MAX_COMANDO and not enmarcado:
+            print(f"[ERROR] Comando demasiado largo desde {client_address}")
+            return
+        if not enmarcado:
+            # Cliente sin enmarcado: una respuesta y se cierra
+            writer.write(atender_comando(next(_contador_asyncio), client_address, buffer.decode('utf-8'), enmarcado=False))
+            await writer.drain()
+            return
+        
+        while True:
+            comandos, buffer = separar_comandos(buffer)
+            
+            # El catálogo está en memoria y se recarga en el executor: procesar no bloquea el event loop
+            for data in comandos:
+                partes = data.strip().split('|')
+                if partes[0].upper() == "SUSCRIBIR":
+                    await writer.drain()
+                    await atender_suscripcion(reader, writer, client_address, partes[1].strip() if len(partes) == 2 else None)
+                    return
+                writer.write(atender_comando(next(_contador_asyncio), client_address, data))
+            await writer.drain()
+            
+            if len(buffer) > MAX_COMANDO:
+                print(f"[ERROR] Comando demasiado largo desde {client_address}")
+                break
+            
+            parte = await reader.read(65536)
+            if not parte:
+                # Último comando sin delimitador antes de cerrar
+                if buffer.strip():
+                    writer.write(atender_comando(next(_contador_asyncio), client_address, buffer.decode('utf-8')))
+                    await writer.drain()
+                break
+            buffer += parte
+    
+    except Exception as e:
+        print(f"[ERROR] Error procesando consulta: {e}")
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except Exception:
+            pass
+
+async def servir_asyncio(backlog):
+    """Atiende miles de conexiones concurrentes en un único hilo con asyncio"""
+    global _conexiones_persistentes
+    _conexiones_persistentes = True
+    server = await asyncio.start_server(
+        atender_conexion_asyncio, HOST, PORT,
+        backlog=backlog, reuse_address=True
+    )
+    print(f"[*] Servidor de NRCs escuchando en {HOST}:{PORT} (modo asyncio, backlog {backlog})")
+    print(f"[*] Archivo de NRCs: {ARCHIVO_NRC}")
+    print("[*] Esperando consultas...")
+    print("[*] Presione Ctrl+C para detener\n")
+    
+    vigilante = asyncio.ensure_future(vigilar_catalogo())
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        vigilante.cancel()
+
+def parsear_argumentos():
+    """Lee las opciones de línea de comandos"""
+    parser = argparse.ArgumentParser(description="Servidor de validación de NRCs")
+    parser.add_argument('--modo', choices=['secuencial', 'asyncio'], default='secuencial',
+                        help="Modelo de atención de conexiones (por defecto: secuencial)")
+    parser.add_argument('--backlog', type=int, default=BACKLOG,
+                        help=f"Tamaño de la cola de conexiones pendientes (por defecto: {BACKLOG})")
+    return parser.parse_args()
+
+def main():
+    args = parsear_argumentos()
+    
+    # Inicializar archivo CSV y cargar el catálogo en memoria
+    inicializar_nrc_csv()
+    recargar_catalogo()
+    
+    if args.modo == 'asyncio':
+        try:
+            asyncio.run(servir_asyncio(args.backlog))
+        except KeyboardInterrupt:
+            print("\n[!] Servidor de NRCs detenido por el usuario")
+        except Exception as e:
+            print(f"[ERROR] Error del servidor: {e}")
+        finally:
+            print("[*] Servidor cerrado")
+    else:
+        vigilar_catalogo_hilo()
+        servir_secuencial(args.backlog)
+
 if __name__ == "__main__":
-    main()
+    main()
\ No newline at end of file
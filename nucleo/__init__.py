@@ -0,0 +1,6 @@
+"""
+Núcleo compartido del servidor de calificaciones - Laboratorio 2
+Aplicaciones Distribuidas
+Protocolo, despacho de comandos, almacenamiento y modelos de concurrencia que usan
+los servidores sin_hilos/ y con_hilos/ (cada uno con sus valores por defecto)
+"""
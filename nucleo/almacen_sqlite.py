@@ -0,0 +1,185 @@
+"""
+Almacén SQLite de calificaciones - Laboratorio 2
+Aplicaciones Distribuidas
+Alternativa al CSV + log: base sqlite3 en modo WAL con índices por ID y por materia
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+
+from .almacenamiento import CAMPOS, Almacen, migrar_csv
+
+POOL_SQLITE = 8  # Conexiones inactivas que se conservan para reutilizar
+ESPERA_BLOQUEO = 30  # Segundos que una escritura espera a que se libere la base
+
+# Sentencias fijas: sqlite3 guarda compiladas (preparadas) las últimas usadas en cada conexión
+CREAR_TABLA = """
+CREATE TABLE IF NOT EXISTS calificaciones (
+    fila INTEGER PRIMARY KEY AUTOINCREMENT,
+    ID TEXT NOT NULL,
+    Nombre TEXT NOT NULL,
+    Materia TEXT NOT NULL,
+    Calificacion TEXT NOT NULL
+)"""
+CREAR_INDICES = (
+    "CREATE INDEX IF NOT EXISTS idx_calificaciones_id_materia ON calificaciones (ID, Materia)",
+    "CREATE INDEX IF NOT EXISTS idx_calificaciones_materia ON calificaciones (upper(Materia))",
+)
+SQL_INSERTAR = "INSERT INTO calificaciones (ID, Nombre, Materia, Calificacion) VALUES (?, ?, ?, ?)"
+SQL_PRIMERA = "SELECT fila FROM calificaciones WHERE ID = ? AND Materia = ? ORDER BY fila LIMIT 1"
+SQL_ACTUALIZAR = "UPDATE calificaciones SET Calificacion = ?, Materia = ? WHERE fila = ?"
+SQL_ELIMINAR = "DELETE FROM calificaciones WHERE ID = ? AND Materia = ?"
+SQL_POR_ID = "SELECT ID, Nombre, Materia, Calificacion FROM calificaciones WHERE ID = ? ORDER BY fila"
+SQL_TODAS = "SELECT ID, Nombre, Materia, Calificacion FROM calificaciones ORDER BY fila"
+SQL_PAGINA = ("SELECT fila, ID, Nombre, Materia, Calificacion FROM calificaciones "
+              "WHERE fila > ? ORDER BY fila LIMIT ?")
+SQL_PAGINA_MATERIA = ("SELECT fila, ID, Nombre, Materia, Calificacion FROM calificaciones "
+                      "WHERE upper(Materia) = ? AND fila > ? ORDER BY fila LIMIT ?")
+SQL_CONTAR = "SELECT COUNT(*) FROM calificaciones"
+
+class AlmacenSQLite(Almacen):
+    """
+    Calificaciones en una base SQLite en modo WAL: las lecturas no bloquean a la
+    escritura ni entre sí, y SQLite se encarga de índices, durabilidad y recuperación.
+    Cada operación toma una conexión del pool (una por hilo mientras dura la operación).
+    """
+    
+    def __init__(self, ruta, fsync=True, tamano_pool=POOL_SQLITE):
+        self.ruta = ruta
+        self.sincronizacion = 'FULL' if fsync else 'NORMAL'
+        self.tamano_pool = tamano_pool
+        self.libres = []
+        self.lock_pool = threading.Lock()
+        
+        conexion = self._abrir_conexion()
+        conexion.execute(CREAR_TABLA)
+        for sentencia in CREAR_INDICES:
+            conexion.execute(sentencia)
+        self._liberar_conexion(conexion)
+    
+    def _abrir_conexion(self):
+        """Conexión nueva en modo WAL y sin transacciones implícitas (se abren con BEGIN IMMEDIATE)"""
+        conexion = sqlite3.connect(self.ruta, timeout=ESPERA_BLOQUEO, isolation_level=None,
+                                   check_same_thread=False, cached_statements=64)
+        conexion.execute("PRAGMA journal_mode=WAL")
+        conexion.execute(f"PRAGMA synchronous={self.sincronizacion}")
+        return conexion
+    
+    def _obtener_conexion(self):
+        """Toma una conexión libre del pool o abre una nueva"""
+        with self.lock_pool:
+            if self.libres:
+                return self.libres.pop()
+        return self._abrir_conexion()
+    
+    def _liberar_conexion(self, conexion):
+        """Devuelve la conexión al pool (o la cierra si el pool está lleno)"""
+        with self.lock_pool:
+            if len(self.libres) < self.tamano_pool:
+                self.libres.append(conexion)
+                return
+        conexion.close()
+    
+    def _consultar(self, sql, parametros=()):
+        """Ejecuta una lectura y retorna todas las filas"""
+        conexion = self._obtener_conexion()
+        try:
+            return conexion.execute(sql, parametros).fetchall()
+        finally:
+            self._liberar_conexion(conexion)
+    
+    def _escribir(self, operacion):
+        """Ejecuta `operacion(conexion)` dentro de una transacción de escritura y retorna su resultado"""
+        conexion = self._obtener_conexion()
+        try:
+            conexion.execute("BEGIN IMMEDIATE")
+            try:
+                resultado = operacion(conexion)
+            except Exception:
+                conexion.execute("ROLLBACK")
+                raise
+            conexion.execute("COMMIT")
+            return resultado
+        finally:
+            self._liberar_conexion(conexion)
+    
+    def agregar(self, filas):
+        """Agrega filas al final en una sola transacción"""
+        valores = [tuple(fila.get(campo, '') for campo in CAMPOS) for fila in filas]
+        self._escribir(lambda conexion: conexion.executemany(SQL_INSERTAR, valores))
+    
+    def actualizar(self, id_estudiante, materia, calificacion, nueva_materia=None):
+        """Actualiza la primera fila con esa clave; retorna False si no existe"""
+        def operacion(conexion):
+            fila = conexion.execute(SQL_PRIMERA, (id_estudiante, materia)).fetchone()
+            if fila is None:
+                return False
+            conexion.execute(SQL_ACTUALIZAR, (calificacion, nueva_materia or materia, fila[0]))
+            return True
+        return self._escribir(operacion)
+    
+    def eliminar(self, id_estudiante, materia):
+        """Elimina las filas con esa clave; retorna cuántas se eliminaron"""
+        return self._escribir(lambda conexion: conexion.execute(SQL_ELIMINAR, (id_estudiante, materia)).rowcount)
+    
+    def buscar_por_id(self, id_estudiante):
+        """Filas de un estudiante (índice por ID)"""
+        return [dict(zip(CAMPOS, fila)) for fila in self._consultar(SQL_POR_ID, (id_estudiante,))]
+    
+    def todas(self):
+        """Todas las filas en orden de inserción"""
+        return [dict(zip(CAMPOS, fila)) for fila in self._consultar(SQL_TODAS)]
+    
+    def pagina(self, cursor, limite, materia=None):
+        """Página de filas posteriores a la fila `cursor`; se pide una de más para saber si quedan"""
+        despues_de = int(cursor) if cursor else 0
+        if materia is None:
+            resultado = self._consultar(SQL_PAGINA, (despues_de, limite + 1))
+        else:
+            resultado = self._consultar(SQL_PAGINA_MATERIA, (materia, despues_de, limite + 1))
+        filas = [dict(zip(CAMPOS, fila[1:])) for fila in resultado[:limite]]
+        siguiente = str(resultado[limite - 1][0]) if len(resultado) > limite else None
+        return filas, siguiente
+    
+    def __len__(self):
+        return self._consultar(SQL_CONTAR)[0][0]
+    
+    def compactar(self):
+        """Vuelca el WAL de SQLite a la base y lo trunca"""
+        ruta_wal = self.ruta + '-wal'
+        if not os.path.exists(ruta_wal) or os.path.getsize(ruta_wal) == 0:
+            return False
+        conexion = self._obtener_conexion()
+        try:
+            ocupado, _, _ = conexion.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+            return not ocupado
+        finally:
+            self._liberar_conexion(conexion)
+    
+    def cerrar(self):
+        """Cierra las conexiones del pool"""
+        with self.lock_pool:
+            libres, self.libres = self.libres, []
+        for conexion in libres:
+            conexion.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Migra calificaciones de un CSV a una base SQLite")
+    parser.add_argument('csv', help="CSV de calificaciones (se aplica su log de escrituras si existe)")
+    parser.add_argument('base', help="Base SQLite de destino (debe estar vacía)")
+    args = parser.parse_args()
+    
+    almacen = AlmacenSQLite(args.base)
+    try:
+        if len(almacen):
+            print(f"[ERROR] {args.base} ya tiene calificaciones; no se migra")
+            return
+        copiadas = migrar_csv(args.csv, almacen)
+        print(f"[*] {copiadas} calificaciones migradas de {args.csv} a {args.base}")
+    finally:
+        almacen.cerrar()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1242 @@
+"""
+Almacenamiento en memoria de calificaciones - Laboratorio 2
+Aplicaciones Distribuidas
+Tabla indexada que evita recorrer el CSV en cada búsqueda, actualización o eliminación,
+persistida como snapshot CSV + log de escrituras
+"""
+
+import csv
+import json
+import os
+import threading
+import time
+import zlib
+from bisect import bisect_left, bisect_right, insort
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from heapq import merge
+from itertools import tee
+from operator import itemgetter
+
+try:
+    import fcntl  # Bloqueo de archivos entre procesos (solo Unix)
+except ImportError:
+    fcntl = None
+
+from .snapshot_binario import SnapshotBinario, escribir_binario
+
+CAMPOS = ['ID', 'Nombre', 'Materia', 'Calificacion']
+
+def normalizar_fila(fila):
+    """Fila con exactamente los CAMPOS y todos como texto (como quedan al releerla del CSV)"""
+    return {campo: '' if fila.get(campo) is None else str(fila.get(campo)) for campo in CAMPOS}
+
+# Log de escrituras: se compacta en un snapshot nuevo al llegar a este número de entradas
+# o cada INTERVALO_COMPACTACION segundos si tiene alguna
+MAX_ENTRADAS_LOG = 10000
+INTERVALO_COMPACTACION = 300
+
+# Commit en grupo: un hilo escritor junta las escrituras pendientes y las baja al log con un
+# solo write + fsync; el lote se cierra al juntar FSYNC_REGISTROS entradas o tras FSYNC_MS
+# milisegundos desde la primera. Con FSYNC_MS = 0 (siempre) cada lote es lo que se acumuló
+# mientras se hacía el fsync anterior
+FSYNC_MS = 0
+FSYNC_REGISTROS = 500
+
+class EscrituraPendiente(OSError):
+    """
+    El lote de una escritura no se pudo bajar al log. El cambio ya está en la tabla y el
+    hilo escritor lo sigue reintentando: no falló, su confirmación en disco quedó pendiente.
+    """
+
+class LockLecturaEscritura:
+    """
+    Lock de lectores/escritor: cualquier número de lecturas a la vez, escrituras exclusivas.
+    Evita que los escritores esperen para siempre: cuando uno está esperando, los lectores
+    nuevos esperan a que termine (los que ya estaban leyendo terminan normalmente).
+    """
+    
+    def __init__(self):
+        self.condicion = threading.Condition()
+        self.lectores = 0
+        self.escribiendo = False
+        self.escritores_esperando = 0
+    
+    def adquirir_lectura(self):
+        with self.condicion:
+            while self.escribiendo or self.escritores_esperando:
+                self.condicion.wait()
+            self.lectores += 1
+    
+    def liberar_lectura(self):
+        with self.condicion:
+            self.lectores -= 1
+            if self.lectores == 0:
+                self.condicion.notify_all()
+    
+    def adquirir_escritura(self):
+        with self.condicion:
+            self.escritores_esperando += 1
+            while self.escribiendo or self.lectores:
+                self.condicion.wait()
+            self.escritores_esperando -= 1
+            self.escribiendo = True
+    
+    def liberar_escritura(self):
+        with self.condicion:
+            self.escribiendo = False
+            self.condicion.notify_all()
+    
+    @contextmanager
+    def lectura(self):
+        """Uso: `with lock.lectura(): ...`"""
+        self.adquirir_lectura()
+        try:
+            yield
+        finally:
+            self.liberar_lectura()
+    
+    @contextmanager
+    def escritura(self):
+        """Uso: `with lock.escritura(): ...`"""
+        self.adquirir_escritura()
+        try:
+            yield
+        finally:
+            self.liberar_escritura()
+
+@contextmanager
+def bloqueo_archivo(ruta, exclusivo):
+    """
+    Bloqueo entre procesos (flock) compartido o exclusivo sobre `ruta`. Cada uso abre su
+    propio descriptor, así también excluye a otros hilos del mismo proceso.
+    """
+    with open(ruta, 'a') as file:
+        fcntl.flock(file, fcntl.LOCK_EX if exclusivo else fcntl.LOCK_SH)
+        yield  # Al cerrar el archivo se libera el bloqueo
+
+def paginar(recorrido, despues_de, limite):
+    """
+    Hasta `limite` filas de un recorrido de pares (rowid, fila) en orden.
+    Retorna: (filas, último rowid entregado o None si no quedan más)
+    """
+    filas = []
+    ultimo = despues_de
+    for rowid, fila in recorrido:
+        if len(filas) >= limite:
+            return filas, ultimo
+        filas.append(fila)
+        ultimo = rowid
+    return filas, None
+
+class TablaCalificaciones:
+    """
+    Calificaciones en memoria con un índice primario por (ID, Materia) y
+    secundarios por ID de estudiante y por NRC. Cada fila tiene un número
+    (rowid) creciente que conserva el orden de inserción del CSV.
+    Las filas no se modifican en su lugar: una actualización las reemplaza,
+    así quien ya obtuvo una fila nunca la ve a medio cambiar.
+    No es thread-safe: quien la use debe proteger el acceso con un lock
+    (las consultas no modifican nada y pueden ejecutarse a la vez entre sí).
+    """
+    
+    def __init__(self):
+        self.filas = {}       # rowid -> fila {'ID', 'Nombre', 'Materia', 'Calificacion'}
+        self.orden = []       # rowids en orden creciente (puede contener rowids eliminados)
+        self.por_clave = {}   # (ID, Materia) -> [rowid, ...] (el CSV admite filas repetidas)
+        self.por_id = {}      # ID -> {rowid: None}
+        self.por_nrc = {}     # Materia normalizada -> [rowid, ...] ordenados (para paginar con bisect)
+        self.siguiente_rowid = 1
+    
+    def __len__(self):
+        return len(self.filas)
+    
+    def _indexar(self, rowid, fila):
+        """Agrega la fila a los tres índices (las listas de rowids quedan ordenadas)"""
+        de_clave = self.por_clave.setdefault((fila['ID'], fila['Materia']), [])
+        if not de_clave or de_clave[-1] < rowid:
+            de_clave.append(rowid)
+        else:
+            insort(de_clave, rowid)
+        self.por_id.setdefault(fila['ID'], {})[rowid] = None
+        de_materia = self.por_nrc.setdefault(fila['Materia'].upper(), [])
+        if not de_materia or de_materia[-1] < rowid:
+            de_materia.append(rowid)  # Inserción al final (lo habitual)
+        else:
+            insort(de_materia, rowid)  # Fila existente que cambió de materia
+    
+    def _desindexar(self, rowid, fila):
+        """Quita la fila de los tres índices (borrando las entradas que quedan vacías)"""
+        clave = (fila['ID'], fila['Materia'])
+        rowids = self.por_clave[clave]
+        rowids.remove(rowid)
+        if not rowids:
+            del self.por_clave[clave]
+        grupo = self.por_id[fila['ID']]
+        del grupo[rowid]
+        if not grupo:
+            del self.por_id[fila['ID']]
+        materia = fila['Materia'].upper()
+        de_materia = self.por_nrc[materia]
+        del de_materia[bisect_left(de_materia, rowid)]
+        if not de_materia:
+            del self.por_nrc[materia]
+    
+    def insertar(self, fila, rowid=None):
+        """Agrega una fila al final de la tabla, o con el rowid indicado (fragmentos); retorna su rowid"""
+        if rowid is None:
+            rowid = self.siguiente_rowid
+        elif rowid in self.filas:
+            raise ValueError(f"El rowid {rowid} ya existe")
+        self.siguiente_rowid = max(self.siguiente_rowid, rowid + 1)
+        fila = normalizar_fila(fila)
+        self.filas[rowid] = fila
+        if not self.orden or self.orden[-1] < rowid:
+            self.orden.append(rowid)
+        else:
+            posicion = bisect_left(self.orden, rowid)
+            if posicion == len(self.orden) or self.orden[posicion] != rowid:  # Puede seguir ahí si se eliminó
+                self.orden.insert(posicion, rowid)
+        self._indexar(rowid, fila)
+        return rowid
+    
+    def contiene(self, rowid):
+        return rowid in self.filas
+    
+    def buscar_por_id(self, id_estudiante):
+        """Filas de un estudiante en orden de inserción"""
+        return [self.filas[rowid] for rowid in sorted(self.por_id.get(id_estudiante, ()))]
+    
+    def actualizar(self, id_estudiante, materia, calificacion, nueva_materia=None):
+        """Cambia la calificación (y opcionalmente la materia) de la primera fila con esa clave"""
+        rowids = self.por_clave.get((id_estudiante, materia))
+        if not rowids:
+            return False
+        rowid = rowids[0]
+        anterior = self.filas[rowid]
+        fila = dict(anterior, Calificacion=str(calificacion))
+        if not nueva_materia or str(nueva_materia) == anterior['Materia']:
+            self.filas[rowid] = fila  # Misma clave: los índices siguen valiendo
+            return True
+        fila['Materia'] = str(nueva_materia)
+        self._desindexar(rowid, anterior)
+        self.filas[rowid] = fila
+        self._indexar(rowid, fila)
+        return True
+    
+    def ubicar(self, id_estudiante, materia):
+        """(rowid, fila) de la primera fila con esa clave o None"""
+        rowids = self.por_clave.get((id_estudiante, materia))
+        return (rowids[0], self.filas[rowids[0]]) if rowids else None
+    
+    def primera(self, id_estudiante, materia):
+        """Primera fila con esa clave o None"""
+        rowids = self.por_clave.get((id_estudiante, materia))
+        return self.filas[rowids[0]] if rowids else None
+    
+    def eliminar(self, id_estudiante, materia, solo_primera=False):
+        """Elimina todas las filas con esa clave (o solo la primera); retorna cuántas se eliminaron"""
+        rowids = self.por_clave.get((id_estudiante, materia))
+        if not rowids:
+            return 0
+        eliminar = rowids[:1] if solo_primera else list(rowids)
+        cantidad = len(eliminar)
+        for rowid in eliminar:
+            self._desindexar(rowid, self.filas.pop(rowid))
+        # Los rowids eliminados se purgan de `orden` cuando son mayoría
+        if len(self.orden) > 2 * len(self.filas) + 64:
+            self.orden = [rowid for rowid in self.orden if rowid in self.filas]
+        return cantidad
+    
+    def recorrer(self, despues_de=0, materia=None):
+        """Pares (rowid, fila) con rowid mayor que `despues_de` en orden, opcionalmente de una sola materia"""
+        candidatos = self.orden if materia is None else self.por_nrc.get(materia, [])
+        for posicion in range(bisect_right(candidatos, despues_de), len(candidatos)):
+            rowid = candidatos[posicion]
+            fila = self.filas.get(rowid)
+            if fila is not None:  # None: eliminada
+                yield rowid, fila
+    
+    def todas(self):
+        """Todas las filas en orden de inserción"""
+        return [fila for _, fila in self.recorrer()]
+    
+    def pagina(self, despues_de, limite, materia=None):
+        """
+        Hasta `limite` filas con rowid mayor que `despues_de`, opcionalmente de una sola materia.
+        Retorna: (filas, último rowid entregado o None si no quedan más)
+        """
+        return paginar(self.recorrer(despues_de, materia), despues_de, limite)
+    
+    def congelar(self):
+        """
+        Para compactar sin el lock: (pares (rowid, fila) en orden, siguiente rowid).
+        Las filas no se modifican en su lugar, así que basta copiar la lista de pares.
+        """
+        return list(self.recorrer()), self.siguiente_rowid
+
+class Almacen:
+    """
+    Interfaz común de los almacenes de calificaciones (CSV + log, fragmentado, SQLite).
+    Todas las operaciones son thread-safe y las escrituras retornan cuando están en disco.
+    Las filas son dicts con las claves de CAMPOS.
+    """
+    
+    def agregar(self, filas):
+        """Agrega filas al final"""
+        raise NotImplementedError
+    
+    def actualizar(self, id_estudiante, materia, calificacion, nueva_materia=None):
+        """Actualiza la primera fila con esa clave (y opcionalmente su materia); retorna False si no existe"""
+        raise NotImplementedError
+    
+    def eliminar(self, id_estudiante, materia):
+        """Elimina las filas con esa clave; retorna cuántas se eliminaron"""
+        raise NotImplementedError
+    
+    def buscar_por_id(self, id_estudiante):
+        """Filas de un estudiante"""
+        raise NotImplementedError
+    
+    def todas(self):
+        """Todas las filas"""
+        raise NotImplementedError
+    
+    def pagina(self, cursor, limite, materia=None):
+        """
+        Hasta `limite` filas a partir de un cursor opaco (None para empezar), opcionalmente de una materia.
+        Retorna: (filas, cursor siguiente o None si se llegó al final)
+        """
+        raise NotImplementedError
+    
+    def __len__(self):
+        raise NotImplementedError
+    
+    def compactar(self):
+        """Reduce lo que haya que reproducir al iniciar; retorna True si hubo algo que compactar"""
+        return False
+    
+    def iniciar_compactacion(self, intervalo=INTERVALO_COMPACTACION):
+        """Lanza la compactación periódica si el almacén la necesita"""
+        return None
+    
+    def cerrar(self):
+        """Baja a disco lo pendiente y libera los archivos"""
+
+def leer_csv(ruta):
+    """Carga un CSV de calificaciones en una tabla nueva (con la columna _fila, con esos rowids)"""
+    tabla = TablaCalificaciones()
+    if os.path.exists(ruta):
+        with open(ruta, 'r', newline='', encoding='utf-8') as file:
+            for row in csv.DictReader(file):
+                tabla.insertar(row, int(row['_fila']) if row.get('_fila') else None)
+    return tabla
+
+def escribir_csv(ruta, filas, campos=CAMPOS):
+    """Reescribe el CSV completo de forma atómica (archivo temporal + reemplazo)"""
+    temporal = ruta + '.tmp'
+    with open(temporal, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=campos)
+        writer.writeheader()
+        writer.writerows(filas)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporal, ruta)
+
+class TablaBinaria:
+    """
+    Misma interfaz que TablaCalificaciones, pero las filas del snapshot binario se
+    consultan en el archivo mapeado (SnapshotBinario) y en memoria solo se guardan los
+    cambios posteriores: filas del snapshot eliminadas o modificadas y filas nuevas.
+    El snapshot guarda el rowid de cada fila; las nuevas siguen desde su siguiente rowid,
+    así los rowids (y los cursores de página) no cambian al compactar.
+    """
+    
+    def __init__(self, snapshot):
+        self.base = snapshot
+        self.cantidad_base = len(snapshot)
+        self.borradas = set()     # Filas del snapshot eliminadas
+        self.modificadas = {}     # Fila del snapshot -> fila actualizada
+        self.nuevas = TablaCalificaciones()
+        self.nuevas.siguiente_rowid = snapshot.siguiente_rowid
+    
+    def __len__(self):
+        return self.cantidad_base - len(self.borradas) + len(self.nuevas)
+    
+    @property
+    def siguiente_rowid(self):
+        return self.nuevas.siguiente_rowid
+    
+    def _fila_base(self, numero):
+        fila = self.modificadas.get(numero)
+        return fila if fila is not None else self.base.fila(numero)
+    
+    def _coincidencias_base(self, id_estudiante, materia):
+        """Filas vigentes del snapshot con esa clave (el ID no cambia, la materia sí puede)"""
+        return [numero for numero in self.base.filas_de_id(id_estudiante)
+                if numero not in self.borradas and self._fila_base(numero)['Materia'] == materia]
+    
+    def _primera_es_base(self, coincidencias, id_estudiante, materia):
+        """
+        Indica si la primera fila con esa clave (la de menor rowid) es del snapshot:
+        en un fragmento, una fila trasladada puede llegar con un rowid menor.
+        """
+        rowids = self.nuevas.por_clave.get((id_estudiante, materia))
+        return bool(coincidencias) and (not rowids or self.base.rowids[coincidencias[0]] < rowids[0])
+    
+    def contiene(self, rowid):
+        numero = bisect_left(self.base.rowids, rowid)
+        if numero < self.cantidad_base and self.base.rowids[numero] == rowid and numero not in self.borradas:
+            return True
+        return self.nuevas.contiene(rowid)
+    
+    def insertar(self, fila, rowid=None):
+        if rowid is not None and self.contiene(rowid):
+            raise ValueError(f"El rowid {rowid} ya existe")
+        return self.nuevas.insertar(fila, rowid)
+    
+    def ubicar(self, id_estudiante, materia):
+        coincidencias = self._coincidencias_base(id_estudiante, materia)
+        if self._primera_es_base(coincidencias, id_estudiante, materia):
+            return self.base.rowids[coincidencias[0]], self._fila_base(coincidencias[0])
+        return self.nuevas.ubicar(id_estudiante, materia)
+    
+    def primera(self, id_estudiante, materia):
+        ubicada = self.ubicar(id_estudiante, materia)
+        return ubicada[1] if ubicada else None
+    
+    def buscar_por_id(self, id_estudiante):
+        del_snapshot = [(self.base.rowids[numero], self._fila_base(numero))
+                        for numero in self.base.filas_de_id(id_estudiante) if numero not in self.borradas]
+        nuevas = [(rowid, self.nuevas.filas[rowid]) for rowid in sorted(self.nuevas.por_id.get(id_estudiante, ()))]
+        return [fila for _, fila in merge(del_snapshot, nuevas, key=itemgetter(0))]
+    
+    def actualizar(self, id_estudiante, materia, calificacion, nueva_materia=None):
+        coincidencias = self._coincidencias_base(id_estudiante, materia)
+        if not self._primera_es_base(coincidencias, id_estudiante, materia):
+            return self.nuevas.actualizar(id_estudiante, materia, calificacion, nueva_materia)
+        fila = dict(self._fila_base(coincidencias[0]), Calificacion=str(calificacion))
+        if nueva_materia:
+            fila['Materia'] = str(nueva_materia)
+        self.modificadas[coincidencias[0]] = fila
+        return True
+    
+    def eliminar(self, id_estudiante, materia, solo_primera=False):
+        coincidencias = self._coincidencias_base(id_estudiante, materia)
+        if solo_primera:
+            if not self._primera_es_base(coincidencias, id_estudiante, materia):
+                return self.nuevas.eliminar(id_estudiante, materia, solo_primera=True)
+            coincidencias = coincidencias[:1]
+        for numero in coincidencias:
+            self.borradas.add(numero)
+            self.modificadas.pop(numero, None)
+        if solo_primera:
+            return 1
+        return len(coincidencias) + self.nuevas.eliminar(id_estudiante, materia)
+    
+    def _recorrer_base(self, despues_de, materia):
+        """Pares (rowid, fila) vigentes del snapshot con rowid mayor que `despues_de`, en orden"""
+        desde = bisect_right(self.base.rowids, despues_de)
+        if materia is None:
+            candidatos = range(desde, self.cantidad_base)
+        else:
+            del_snapshot = self.base.filas_de_materia(materia)
+            movidas = sorted(numero for numero, fila in self.modificadas.items()
+                             if fila['Materia'].upper() == materia)
+            candidatos = merge(del_snapshot[bisect_left(del_snapshot, desde):],
+                               movidas[bisect_left(movidas, desde):])
+        anterior = None
+        for numero in candidatos:
+            if numero == anterior or numero in self.borradas:
+                continue  # Repetida (movida dentro de su misma materia) o eliminada
+            anterior = numero
+            fila = self._fila_base(numero)
+            if materia is not None and fila['Materia'].upper() != materia:
+                continue  # Cambió de materia después del snapshot
+            yield self.base.rowids[numero], fila
+    
+    def recorrer(self, despues_de=0, materia=None):
+        """Como TablaCalificaciones.recorrer: el snapshot y las filas nuevas intercalados por rowid"""
+        return merge(self._recorrer_base(despues_de, materia), self.nuevas.recorrer(despues_de, materia),
+                     key=itemgetter(0))
+    
+    def todas(self):
+        return [fila for _, fila in self.recorrer()]
+    
+    def pagina(self, despues_de, limite, materia=None):
+        return paginar(self.recorrer(despues_de, materia), despues_de, limite)
+    
+    def congelar(self):
+        """
+        Para compactar sin el lock: (pares (rowid, fila) en orden, siguiente rowid).
+        El snapshot mapeado no cambia; solo se copian los cambios, y las filas del snapshot
+        se leen del archivo a medida que se escribe el nuevo (sin armar la lista completa).
+        """
+        base, borradas, modificadas = self.base, set(self.borradas), dict(self.modificadas)
+        
+        def del_snapshot():
+            for numero in range(len(base)):
+                if numero not in borradas:
+                    fila = modificadas.get(numero)
+                    yield base.rowids[numero], (fila if fila is not None else base.fila(numero))
+        
+        return merge(del_snapshot(), list(self.nuevas.recorrer()), key=itemgetter(0)), self.siguiente_rowid
+
+def leer_binario(ruta):
+    """Abre un snapshot binario (mmap) como tabla"""
+    return TablaBinaria(SnapshotBinario(ruta))
+
+def escribir_pares_csv(ruta, pares, siguiente_rowid=None, con_rowid=False):
+    """
+    Snapshot CSV desde pares (rowid, fila). El CSV no guarda rowids (se renumeran al cargarlo)
+    salvo con `con_rowid`, que los escribe en la columna _fila (fragmentos y multiproceso).
+    """
+    if con_rowid:
+        escribir_csv(ruta, (dict(fila, _fila=rowid) for rowid, fila in pares), CAMPOS + ['_fila'])
+    else:
+        escribir_csv(ruta, (fila for _, fila in pares))
+
+def escribir_pares_binario(ruta, pares, siguiente_rowid=None):
+    """Snapshot binario desde pares (rowid, fila), conservando los rowids; `pares` se recorre una vez"""
+    de_filas, de_rowids = tee(pares)
+    escribir_binario(ruta, (fila for _, fila in de_filas), (rowid for rowid, _ in de_rowids), siguiente_rowid)
+
+# Formatos del snapshot: extensión, lectura (ruta -> tabla), escritura (ruta, pares (rowid, fila),
+# siguiente rowid) y si al compactar se vuelve a abrir el snapshot nuevo
+FORMATOS = {
+    'csv': ('.csv', leer_csv, escribir_pares_csv, False),
+    'binario': ('.bin', leer_binario, escribir_pares_binario, True),
+}
+
+def aplicar_entrada(tabla, entrada):
+    """Aplica a la tabla una entrada del log de escrituras"""
+    operacion = entrada['op']
+    if operacion == 'agregar':
+        # 'fila' es el formato del log que escribía el servidor sin hilos; 'rowids', el de los fragmentos
+        filas = entrada['filas'] if 'filas' in entrada else [entrada['fila']]
+        for fila, rowid in zip(filas, entrada.get('rowids') or [None] * len(filas)):
+            tabla.insertar(fila, rowid)
+    elif operacion == 'actualizar':
+        tabla.actualizar(entrada['id'], entrada['materia'], entrada['calificacion'], entrada.get('nueva_materia'))
+    elif operacion == 'eliminar':
+        tabla.eliminar(entrada['id'], entrada['materia'], entrada.get('solo_primera', False))
+    else:
+        raise ValueError(f"Operación desconocida en el log: {operacion}")
+
+def reproducir_log(ruta, tabla, desde=0):
+    """
+    Aplica a la tabla las entradas de un log a partir del byte `desde`;
+    retorna (entradas aplicadas, bytes válidos leídos).
+    Una última línea incompleta o corrupta (caída a mitad de una escritura) se descarta;
+    una entrada completa que no se puede aplicar se informa y se salta.
+    """
+    aplicadas = 0
+    validos = 0
+    if not os.path.exists(ruta):
+        return aplicadas, validos
+    with open(ruta, 'rb') as file:
+        file.seek(desde)
+        for linea in file:
+            if not linea.endswith(b'\n'):
+                break
+            try:
+                entrada = json.loads(linea)
+            except ValueError:
+                break
+            try:
+                aplicar_entrada(tabla, entrada)
+                aplicadas += 1
+            except (KeyError, TypeError, AttributeError, ValueError) as e:
+                print(f"[!] Entrada del log {ruta} que no se puede aplicar, se omite ({e!r}): {linea[:200]!r}")
+            validos += len(linea)
+    return aplicadas, validos
+
+class ContadorRowids:
+    """Numeración de rowids compartida por los fragmentos de un AlmacenFragmentado (thread-safe)"""
+    
+    def __init__(self):
+        self.siguiente = 1
+        self.lock = threading.Lock()
+    
+    def ajustar(self, siguiente):
+        """Al abrir un fragmento: la numeración sigue después de sus rowids"""
+        with self.lock:
+            self.siguiente = max(self.siguiente, siguiente)
+    
+    def reservar(self, cantidad):
+        """Rowids nuevos, crecientes y sin usar en ningún fragmento"""
+        with self.lock:
+            inicio = self.siguiente
+            self.siguiente += cantidad
+        return list(range(inicio, inicio + cantidad))
+
+class AlmacenCalificaciones(Almacen):
+    """
+    Calificaciones en una tabla persistida como snapshot + log de escrituras. El snapshot es
+    un CSV (se carga entero en una TablaCalificaciones) o, con formato 'binario', un
+    snapshot binario que se consulta con mmap sin cargarlo (TablaBinaria).
+    Agregar, actualizar y eliminar solo agregan una línea al log (el costo no depende del
+    tamaño del CSV); una compactación en segundo plano vuelca la tabla a un snapshot nuevo
+    y descarta el log. Al iniciar se carga el snapshot y se reproduce el log.
+    
+    Compactación (segura ante caídas en cualquier paso):
+      1. Con el lock: copia de las filas y el log activo pasa a ser `<log>.1`
+      2. Sin el lock: snapshot en `<csv>.nuevo` (escrito completo antes de aparecer)
+      3. Se borra `<log>.1` y `<csv>.nuevo` reemplaza al CSV
+      4. Binario: con el lock se abre el snapshot nuevo y se reproduce solo el log activo,
+         así se sueltan el mapeo anterior y los cambios acumulados en memoria
+    Si al recuperar existe `<csv>.nuevo` sin `<log>.1`, el paso 3 quedó a medias y se termina.
+    
+    Las escrituras se aplican a la tabla con el lock tomado y se encolan para el hilo
+    escritor (commit en grupo); quien escribe recibe la respuesta recién cuando su lote
+    está en disco (fsync), pero las lecturas ya ven el cambio desde que se aplica.
+    Si el lote falla, el cambio no se deshace (el hilo escritor lo reintenta) y quien
+    escribe recibe EscrituraPendiente: el resultado es incierto, no un error.
+    
+    Con `multiproceso` varios procesos comparten los archivos, cada uno con su tabla:
+    las escrituras toman además un bloqueo exclusivo de `<snapshot>.lock`, aplican antes lo
+    que los otros procesos agregaron al log y no lo sueltan hasta que la propia está en
+    el log. Las lecturas se ponen al día con el log si cambió. La compactación se hace
+    completa con el bloqueo tomado; los demás procesos ven un log nuevo y recargan.
+    Los rowids van en el log y en el snapshot (en CSV, en la columna _fila): tras
+    recargar, cada proceso conserva la numeración y los cursores siguen valiendo.
+    
+    Con `en_linea` (servidores de un solo hilo) no se lanza ningún hilo: cada escritura
+    se baja al log con write + fsync antes de tocar la tabla, y la compactación se hace
+    al final de la escritura que llena el log o que llega vencido el intervalo.
+    
+    Con `contador_rowids` (fragmentos) los rowids salen de una numeración compartida, van
+    en el log con cada fila agregada y el snapshot los guarda (en CSV, en la columna _fila).
+    """
+    
+    def __init__(self, ruta_snapshot, max_entradas_log=MAX_ENTRADAS_LOG,
+                 fsync_ms=FSYNC_MS, fsync_registros=FSYNC_REGISTROS, fsync=True, formato='csv',
+                 multiproceso=False, en_linea=False, contador_rowids=None):
+        if multiproceso and fcntl is None:
+            raise ValueError("El modo multiproceso requiere bloqueo de archivos (fcntl), no disponible en este sistema")
+        extension, self.leer_snapshot, self.escribir_snapshot, self.reabrir_al_compactar = FORMATOS[formato]
+        if formato == 'csv' and (contador_rowids is not None or multiproceso):
+            self.escribir_snapshot = partial(escribir_pares_csv, con_rowid=True)
+        self.ruta_snapshot = ruta_snapshot
+        # El log del CSV es <nombre>.log; el del binario <nombre>.bin.log (pueden convivir)
+        base = os.path.splitext(ruta_snapshot)[0]
+        self.ruta_log = base + ('.log' if formato == 'csv' else extension + '.log')
+        self.ruta_log_anterior = self.ruta_log + '.1'
+        self.ruta_nuevo = ruta_snapshot + '.nuevo'
+        self.ruta_bloqueo = ruta_snapshot + '.lock'
+        self.multiproceso = multiproceso
+        self.en_linea = en_linea
+        self.contador_rowids = contador_rowids
+        self.max_entradas_log = max_entradas_log
+        self.intervalo_compactacion = None  # en_linea: segundos entre compactaciones (ver iniciar_compactacion)
+        self.ultima_compactacion = time.monotonic()
+        self.lock = LockLecturaEscritura()  # Protege la tabla y el orden de las escrituras
+        self.lock_compactacion = threading.Lock()
+        self.pendiente_compactar = threading.Event()
+        self.tabla = None
+        self.log = None
+        self.entradas_log = 0
+        self.posicion_log = 0  # Bytes del log ya aplicados a la tabla (multiproceso)
+        self.inodo_log = None  # Identifica el log activo: cambia cuando otro proceso compacta
+        if multiproceso:
+            with bloqueo_archivo(self.ruta_bloqueo, exclusivo=True):
+                self.recuperar()
+        else:
+            self.recuperar()
+        if contador_rowids is not None:
+            contador_rowids.ajustar(self.tabla.siguiente_rowid)
+        
+        # Cola del commit en grupo: cada escritura recibe un número de secuencia
+        self.fsync_ms = fsync_ms
+        self.fsync_registros = max(1, fsync_registros)
+        self.fsync = fsync
+        self.cola = threading.Condition()
+        self.pendientes = []   # Líneas del log aún no escritas
+        self.encolados = 0     # Secuencia de la última escritura encolada
+        self.confirmados = 0   # Secuencia de la última escritura en disco
+        self.fallidos = 0      # Secuencia de la última escritura cuyo lote falló
+        self.error_escritura = None
+        self.lotes = 0
+        if not en_linea:
+            threading.Thread(target=self._escribir_lotes, daemon=True).start()
+    
+    def recuperar(self):
+        """Carga el snapshot, termina una compactación interrumpida y reproduce los logs"""
+        if not os.path.exists(self.ruta_snapshot) and not os.path.exists(self.ruta_nuevo):
+            self.escribir_snapshot(self.ruta_snapshot, [])
+        for temporal in (self.ruta_snapshot + '.tmp', self.ruta_nuevo + '.tmp'):
+            if os.path.exists(temporal):
+                os.remove(temporal)
+        if os.path.exists(self.ruta_nuevo):
+            if os.path.exists(self.ruta_log_anterior):
+                os.remove(self.ruta_nuevo)  # Snapshot sin confirmar: el CSV anterior + logs siguen vigentes
+            else:
+                os.replace(self.ruta_nuevo, self.ruta_snapshot)
+        
+        self._cargar()
+        if self.entradas_log:
+            print(f"[*] {self.entradas_log} escrituras recuperadas del log")
+        
+        if os.path.exists(self.ruta_log_anterior):
+            # La compactación anterior no terminó: se une al log activo para la próxima
+            with self.lock.escritura():
+                self._fusionar_log_anterior()
+        self._marcar_log()
+    
+    def _cargar(self):
+        """Carga el snapshot, reproduce `<log>.1` y el log, y abre el log para agregar"""
+        self.tabla = self.leer_snapshot(self.ruta_snapshot)
+        self.entradas_log = 0
+        for ruta in (self.ruta_log_anterior, self.ruta_log):
+            aplicadas, validos = reproducir_log(ruta, self.tabla)
+            self.entradas_log += aplicadas
+            if os.path.exists(ruta) and os.path.getsize(ruta) > validos:
+                print(f"[!] Log {ruta}: se descartó una entrada incompleta al final")
+                os.truncate(ruta, validos)
+        self.log = open(self.ruta_log, 'ab')
+    
+    def _marcar_log(self):
+        """Recuerda hasta dónde está aplicado el log activo (con el lock tomado)"""
+        estado = os.fstat(self.log.fileno())
+        self.inodo_log = estado.st_ino
+        self.posicion_log = estado.st_size
+    
+    def _log_cambio(self):
+        """multiproceso: indica si otro proceso escribió en el log o lo compactó"""
+        try:
+            estado = os.stat(self.ruta_log)
+        except FileNotFoundError:
+            return True  # Compactación en curso
+        return estado.st_ino != self.inodo_log or estado.st_size != self.posicion_log
+    
+    def _sincronizar(self, exclusivo):
+        """
+        multiproceso: aplica a la tabla lo que otros procesos agregaron al log (con el lock y
+        el bloqueo de archivo tomados); si el log es otro porque compactaron, recarga todo.
+        """
+        if os.stat(self.ruta_log).st_ino != self.inodo_log:
+            self.log.close()
+            self._cargar()
+        else:
+            aplicadas, validos = reproducir_log(self.ruta_log, self.tabla, self.posicion_log)
+            self.entradas_log += aplicadas
+            if exclusivo and os.path.getsize(self.ruta_log) > self.posicion_log + validos:
+                # Un proceso se cayó a mitad de una escritura: se descarta antes de agregar detrás
+                print(f"[!] Log {self.ruta_log}: se descartó una entrada incompleta al final")
+                os.truncate(self.ruta_log, self.posicion_log + validos)
+        self._marcar_log()
+        if self.entradas_log >= self.max_entradas_log:
+            self.pendiente_compactar.set()
+    
+    @contextmanager
+    def _escritura(self):
+        """
+        Lock de escritura. Con multiproceso también el bloqueo exclusivo del archivo: la tabla
+        se pone al día con el log antes y lo escrito queda en el log antes de soltarlo.
+        """
+        with self.lock.escritura():
+            if not self.multiproceso:
+                yield
+                return
+            with bloqueo_archivo(self.ruta_bloqueo, exclusivo=True):
+                self._sincronizar(exclusivo=True)
+                try:
+                    yield
+                finally:
+                    self._vaciar_cola()
+                    self._marcar_log()
+    
+    @contextmanager
+    def _lectura(self):
+        """Lock de lectura; con multiproceso, antes se aplican las escrituras de otros procesos"""
+        if self.multiproceso and self._log_cambio():
+            with self.lock.escritura(), bloqueo_archivo(self.ruta_bloqueo, exclusivo=False):
+                self._sincronizar(exclusivo=False)
+        with self.lock.lectura():
+            yield
+    
+    def _fusionar_log_anterior(self):
+        """Une `<log>.1` con el log activo (con el lock tomado)"""
+        self.log.close()
+        with open(self.ruta_log_anterior, 'ab') as anterior, open(self.ruta_log, 'rb') as activo:
+            anterior.write(activo.read())
+        os.replace(self.ruta_log_anterior, self.ruta_log)
+        self.log = open(self.ruta_log, 'ab')
+    
+    def _registrar(self, entrada):
+        """
+        Encola una entrada para el log (con el lock tomado); retorna su número de secuencia.
+        En línea la escribe en el acto: si falla lanza OSError y la tabla no se debe tocar.
+        """
+        linea = json.dumps(entrada).encode('utf-8') + b'\n'
+        if self.en_linea:
+            self._escribir_en_linea(linea)
+        with self.cola:
+            self.encolados += 1
+            secuencia = self.encolados
+            if self.en_linea:
+                self.confirmados = secuencia
+            else:
+                self.pendientes.append(linea)
+                self.cola.notify_all()
+        self.entradas_log += 1
+        if self.entradas_log >= self.max_entradas_log:
+            self.pendiente_compactar.set()
+        return secuencia
+    
+    def _bajar_al_log(self, datos):
+        """
+        Agrega datos al log con flush (y fsync). Si falla, el log se recorta a como estaba:
+        reintentar no duplica entradas ni deja una a medias delante de las siguientes.
+        """
+        tamano = os.fstat(self.log.fileno()).st_size  # Sin nada en el buffer: cada escritura hace flush
+        try:
+            self.log.write(datos)
+            self.log.flush()
+            if self.fsync:
+                os.fsync(self.log.fileno())
+        except (OSError, ValueError):
+            try:
+                self.log.close()
+            except OSError:
+                pass
+            os.truncate(self.ruta_log, tamano)
+            self.log = open(self.ruta_log, 'ab')
+            raise
+    
+    def _escribir_en_linea(self, linea):
+        """en_linea: agrega la línea al log con fsync; si falla, el log se deja como estaba"""
+        try:
+            self._bajar_al_log(linea)
+        except (OSError, ValueError) as e:
+            print(f"[ERROR] No se pudo escribir el log de escrituras: {e}")
+            raise OSError(f"No se pudo confirmar la escritura en disco: {e}")
+    
+    def _compactar_en_linea(self):
+        """en_linea: compacta al terminar una escritura si el log se llenó o venció el intervalo"""
+        if not self.en_linea or self.entradas_log == 0:
+            return
+        vencido = (self.intervalo_compactacion is not None
+                   and time.monotonic() - self.ultima_compactacion >= self.intervalo_compactacion)
+        if self.pendiente_compactar.is_set() or vencido:
+            self.ultima_compactacion = time.monotonic()
+            try:
+                self.compactar()
+            except Exception as e:
+                print(f"[ERROR] No se pudo compactar el log: {e}")
+    
+    def _esperar_confirmacion(self, secuencia):
+        """Bloquea hasta que la escritura `secuencia` esté en disco; EscrituraPendiente si su lote falló"""
+        with self.cola:
+            while self.confirmados < secuencia:
+                if self.fallidos >= secuencia:
+                    raise EscrituraPendiente(f"Escritura aplicada pero aún sin confirmar en disco, se sigue "
+                                             f"reintentando: {self.error_escritura}")
+                self.cola.wait()
+    
+    def _escribir_lotes(self):
+        """Hilo escritor: junta las escrituras pendientes y las baja al log con un solo fsync"""
+        while True:
+            with self.cola:
+                while not self.pendientes:
+                    self.cola.wait()
+                # Se espera a que el lote se llene o venza el plazo desde la primera entrada
+                limite = time.monotonic() + self.fsync_ms / 1000
+                while len(self.pendientes) < self.fsync_registros:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        break
+                    self.cola.wait(restante)
+                lote = self.pendientes
+                self.pendientes = []
+                ultimo = self.encolados
+            
+            try:
+                self._bajar_al_log(b''.join(lote))
+            except (OSError, ValueError) as e:
+                print(f"[ERROR] No se pudo escribir el log de escrituras: {e}")
+                with self.cola:
+                    # El lote se reintenta (la tabla ya tiene los cambios), pero se avisa a quienes esperan
+                    self.pendientes[:0] = lote
+                    self.fallidos = ultimo
+                    self.error_escritura = e
+                    self.cola.notify_all()
+                time.sleep(1)
+                continue
+            
+            with self.cola:
+                self.confirmados = ultimo
+                self.lotes += 1
+                self.cola.notify_all()
+    
+    def _vaciar_cola(self):
+        """Espera a que todo lo encolado esté en el log (con el lock tomado, así no entra nada nuevo)"""
+        self._esperar_confirmacion(self.encolados)
+    
+    def agregar(self, filas):
+        """Agrega filas al final; retorna cuando están en disco"""
+        filas = [normalizar_fila(fila) for fila in filas]  # Al log solo llega lo que se puede reproducir
+        with self._escritura():
+            entrada = {"op": "agregar", "filas": filas}
+            if self.contador_rowids is not None:
+                entrada["rowids"] = self.contador_rowids.reservar(len(filas))
+            elif self.multiproceso:
+                # Quien recargó el snapshot no sabe si se borraron las últimas filas: el log fija los rowids
+                siguiente = self.tabla.siguiente_rowid
+                entrada["rowids"] = list(range(siguiente, siguiente + len(filas)))
+            secuencia = self._registrar(entrada)
+            aplicar_entrada(self.tabla, entrada)
+        self._esperar_confirmacion(secuencia)
+        self._compactar_en_linea()
+    
+    def actualizar(self, id_estudiante, materia, calificacion, nueva_materia=None):
+        """Actualiza la primera fila con esa clave; retorna False si no existe"""
+        calificacion = str(calificacion)
+        nueva_materia = str(nueva_materia) if nueva_materia else None
+        with self._escritura():
+            if self.tabla.primera(id_estudiante, materia) is None:
+                return False
+            secuencia = self._registrar({"op": "actualizar", "id": id_estudiante, "materia": materia,
+                                         "calificacion": calificacion, "nueva_materia": nueva_materia})
+            self.tabla.actualizar(id_estudiante, materia, calificacion, nueva_materia)
+        self._esperar_confirmacion(secuencia)
+        self._compactar_en_linea()
+        return True
+    
+    def eliminar(self, id_estudiante, materia):
+        """Elimina las filas con esa clave; retorna cuántas se eliminaron"""
+        with self._escritura():
+            if self.tabla.primera(id_estudiante, materia) is None:
+                return 0
+            secuencia = self._registrar({"op": "eliminar", "id": id_estudiante, "materia": materia})
+            eliminadas = self.tabla.eliminar(id_estudiante, materia)
+        self._esperar_confirmacion(secuencia)
+        self._compactar_en_linea()
+        return eliminadas
+    
+    def buscar_por_id(self, id_estudiante):
+        """Filas de un estudiante"""
+        with self._lectura():
+            return self.tabla.buscar_por_id(id_estudiante)
+    
+    def todas(self):
+        """Todas las filas en orden de inserción"""
+        with self._lectura():
+            return self.tabla.todas()
+    
+    def pagina(self, cursor, limite, materia=None):
+        """
+        Página de filas a partir de un cursor opaco (el rowid de la última fila entregada).
+        Retorna: (filas, cursor siguiente o None si se llegó al final)
+        """
+        despues_de = int(cursor) if cursor else 0
+        with self._lectura():
+            filas, ultimo = self.tabla.pagina(despues_de, limite, materia)
+        return filas, (str(ultimo) if ultimo is not None else None)
+    
+    def __len__(self):
+        return len(self.tabla)
+    
+    def compactar(self):
+        """Vuelca la tabla a un snapshot nuevo y descarta el log; retorna False si no había nada que compactar"""
+        with self.lock_compactacion:
+            if self.multiproceso:
+                # Entre procesos la compactación se hace completa con el archivo bloqueado
+                with self._escritura():
+                    return self._compactar(nullcontext)
+            return self._compactar(self.lock.escritura)
+    
+    def _compactar(self, lock):
+        """Pasos de la compactación; `lock` protege los que tocan la tabla y el log"""
+        with lock():
+            if self.entradas_log == 0:
+                return False
+            self._vaciar_cola()
+            pares, siguiente_rowid = self.tabla.congelar()
+            compactadas = self.entradas_log
+            self.log.close()
+            os.replace(self.ruta_log, self.ruta_log_anterior)
+            self.log = open(self.ruta_log, 'ab')
+            self.entradas_log = 0
+            self.pendiente_compactar.clear()
+        
+        try:
+            self.escribir_snapshot(self.ruta_nuevo, pares, siguiente_rowid)
+        except OSError:
+            with lock():
+                self._vaciar_cola()
+                self._fusionar_log_anterior()
+                self.entradas_log += compactadas
+            raise
+        os.remove(self.ruta_log_anterior)
+        os.replace(self.ruta_nuevo, self.ruta_snapshot)
+        if self.reabrir_al_compactar:
+            with lock():
+                self._vaciar_cola()
+                self.log.close()
+                self._cargar()
+                self._marcar_log()
+        print(f"[*] Log compactado: {compactadas} escrituras, snapshot de {len(self.tabla)} calificaciones")
+        return True
+    
+    def iniciar_compactacion(self, intervalo=INTERVALO_COMPACTACION):
+        """Lanza el hilo que compacta el log al llenarse o cada `intervalo` segundos (en línea no hay hilo)"""
+        if self.en_linea:
+            self.intervalo_compactacion = intervalo
+            return None
+        
+        def compactar_periodicamente():
+            while True:
+                self.pendiente_compactar.wait(intervalo)
+                try:
+                    self.compactar()
+                except Exception as e:
+                    print(f"[ERROR] No se pudo compactar el log: {e}")
+        
+        hilo = threading.Thread(target=compactar_periodicamente, daemon=True)
+        hilo.start()
+        return hilo
+    
+    def cerrar(self):
+        """Baja al log las escrituras pendientes y lo cierra (se reproduce al iniciar)"""
+        with self.lock.escritura():
+            self._vaciar_cola()
+            self.log.close()
+
+def migrar_csv(ruta_csv, almacen):
+    """
+    Copia al almacén las calificaciones de un CSV (con su log de escrituras aplicado).
+    Solo se usa con un almacén vacío; retorna cuántas filas se copiaron.
+    """
+    original = AlmacenCalificaciones(ruta_csv, en_linea=True)  # Solo se lee: no hace falta el hilo escritor
+    try:
+        filas = original.todas()
+    finally:
+        original.cerrar()
+    if filas:
+        almacen.agregar(filas)
+    return len(filas)
+
+class AlmacenFragmentado(Almacen):
+    """
+    Calificaciones repartidas en fragmentos, cada uno un AlmacenCalificaciones con su
+    propio CSV, log, índices y lock: las escrituras de fragmentos distintos no se bloquean.
+    
+    Particiones:
+      - 'nrc': un fragmento por materia (se crean al llegar la primera calificación)
+      - 'id':  `cantidad` fragmentos, elegidos por un hash del ID del estudiante
+    
+    Los fragmentos viven en un directorio junto con un archivo `particion` que recuerda
+    el modo, así no se puede reabrir con otro reparto. `listar` recorre los fragmentos
+    en orden de clave; el cursor de página es "<fragmento>:<rowid>". Los rowids se
+    numeran en común para todos los fragmentos, así una fila que cambia de fragmento
+    conserva el suyo.
+    """
+    
+    def __init__(self, directorio, particion='nrc', cantidad=8, max_entradas_log=MAX_ENTRADAS_LOG,
+                 fsync_ms=FSYNC_MS, fsync_registros=FSYNC_REGISTROS, fsync=True, formato='csv', en_linea=False):
+        if particion not in ('nrc', 'id'):
+            raise ValueError(f"Partición desconocida: {particion}")
+        self.directorio = directorio
+        self.particion = particion
+        self.cantidad = cantidad
+        self.opciones = (max_entradas_log, fsync_ms, fsync_registros, fsync, formato)
+        self.en_linea = en_linea
+        self.intervalo_compactacion = None  # en_linea: se pasa a cada fragmento, incluso a los que se creen después
+        self.extension = FORMATOS[formato][0]
+        self.fragmentos = {}  # clave del fragmento -> AlmacenCalificaciones
+        self.lock_fragmentos = threading.Lock()
+        self.contador_rowids = ContadorRowids()
+        
+        descripcion = particion if particion == 'nrc' else f"id:{cantidad}"
+        ruta_particion = os.path.join(directorio, 'particion')
+        os.makedirs(directorio, exist_ok=True)
+        if os.path.exists(ruta_particion):
+            with open(ruta_particion, 'r', encoding='utf-8') as file:
+                existente = file.read().strip()
+            if existente != descripcion:
+                raise ValueError(f"{directorio} está fragmentado por '{existente}', no por '{descripcion}'")
+        else:
+            with open(ruta_particion, 'w', encoding='utf-8') as file:
+                file.write(descripcion + '\n')
+        
+        for nombre in sorted(os.listdir(directorio)):
+            if nombre.endswith(self.extension):
+                clave = self._clave_de_archivo(nombre[:-len(self.extension)])
+                self.fragmentos[clave] = AlmacenCalificaciones(os.path.join(directorio, nombre), *self.opciones,
+                                                               en_linea=en_linea, contador_rowids=self.contador_rowids)
+    
+    @staticmethod
+    def _archivo_de_clave(clave):
+        """Nombre de archivo para un fragmento (las claves con caracteres raros van en hexadecimal)"""
+        if clave and all(c.isascii() and (c.isalnum() or c in '_-') for c in clave) and not clave.startswith('x_'):
+            return clave
+        return 'x_' + clave.encode('utf-8').hex()
+    
+    @staticmethod
+    def _clave_de_archivo(nombre):
+        if nombre.startswith('x_'):
+            return bytes.fromhex(nombre[2:]).decode('utf-8')
+        return nombre
+    
+    def _clave(self, id_estudiante, materia):
+        """Fragmento al que pertenece una calificación"""
+        if self.particion == 'nrc':
+            return materia.upper()
+        return str(zlib.crc32(id_estudiante.encode('utf-8')) % self.cantidad)
+    
+    def _fragmento(self, clave, crear=False):
+        """AlmacenCalificaciones de un fragmento (None si no existe y no se pide crearlo)"""
+        fragmento = self.fragmentos.get(clave)
+        if fragmento is None and crear:
+            with self.lock_fragmentos:
+                fragmento = self.fragmentos.get(clave)
+                if fragmento is None:
+                    ruta = os.path.join(self.directorio, self._archivo_de_clave(clave) + self.extension)
+                    fragmento = AlmacenCalificaciones(ruta, *self.opciones, en_linea=self.en_linea,
+                                                      contador_rowids=self.contador_rowids)
+                    if self.intervalo_compactacion is not None:
+                        fragmento.iniciar_compactacion(self.intervalo_compactacion)
+                    self.fragmentos[clave] = fragmento
+        return fragmento
+    
+    def _en_orden(self):
+        """Fragmentos ordenados por clave"""
+        return sorted(self.fragmentos.items())
+    
+    def agregar(self, filas):
+        """Agrega filas repartiéndolas por fragmento; retorna cuando todas están en disco"""
+        grupos = {}
+        for fila in map(normalizar_fila, filas):
+            grupos.setdefault(self._clave(fila['ID'], fila['Materia']), []).append(fila)
+        for clave, grupo in grupos.items():
+            self._fragmento(clave, crear=True).agregar(grupo)
+    
+    def actualizar(self, id_estudiante, materia, calificacion, nueva_materia=None):
+        """Actualiza la primera fila con esa clave; retorna False si no existe"""
+        origen = self._fragmento(self._clave(id_estudiante, materia))
+        if origen is None:
+            return False
+        clave_destino = self._clave(id_estudiante, nueva_materia or materia)
+        if clave_destino == self._clave(id_estudiante, materia):
+            return origen.actualizar(id_estudiante, materia, calificacion, nueva_materia)
+        return self._trasladar(origen, self._fragmento(clave_destino, crear=True),
+                               id_estudiante, materia, calificacion, nueva_materia)
+    
+    def _trasladar(self, origen, destino, id_estudiante, materia, calificacion, nueva_materia):
+        """
+        Cambia de materia una fila que pasa a otro fragmento, con ambos locks tomados
+        (siempre en el mismo orden para no bloquearse con otro traslado). La copia se
+        confirma en el destino antes de registrar el borrado en el origen: ante una caída
+        puede quedar duplicada, pero nunca se pierde. La fila conserva su rowid.
+        """
+        primero, segundo = sorted((origen, destino), key=id)
+        with primero.lock.escritura(), segundo.lock.escritura():
+            ubicada = origen.tabla.ubicar(id_estudiante, materia)
+            if ubicada is None:
+                return False
+            rowid, anterior = ubicada
+            if destino.tabla.contiene(rowid):
+                # Solo en fragmentos escritos antes de numerar los rowids en común
+                rowid = self.contador_rowids.reservar(1)[0]
+            fila = normalizar_fila(dict(anterior, Materia=nueva_materia, Calificacion=calificacion))
+            entrada = {"op": "agregar", "filas": [fila], "rowids": [rowid]}
+            secuencia = destino._registrar(entrada)
+            aplicar_entrada(destino.tabla, entrada)
+            # Si la copia queda pendiente, el borrado no se registra: la fila queda en ambos fragmentos
+            destino._esperar_confirmacion(secuencia)
+            secuencia = origen._registrar({"op": "eliminar", "id": id_estudiante, "materia": materia,
+                                           "solo_primera": True})
+            origen.tabla.eliminar(id_estudiante, materia, solo_primera=True)
+        origen._esperar_confirmacion(secuencia)
+        return True
+    
+    def eliminar(self, id_estudiante, materia):
+        """Elimina las filas con esa clave; retorna cuántas se eliminaron"""
+        fragmento = self._fragmento(self._clave(id_estudiante, materia))
+        return fragmento.eliminar(id_estudiante, materia) if fragmento else 0
+    
+    def buscar_por_id(self, id_estudiante):
+        """Filas de un estudiante (por NRC hay que consultar el índice de cada fragmento)"""
+        if self.particion == 'id':
+            fragmento = self._fragmento(self._clave(id_estudiante, ''))
+            return fragmento.buscar_por_id(id_estudiante) if fragmento else []
+        resultados = []
+        for _, fragmento in self._en_orden():
+            resultados.extend(fragmento.buscar_por_id(id_estudiante))
+        return resultados
+    
+    def todas(self):
+        """Todas las filas, fragmento por fragmento"""
+        filas = []
+        for _, fragmento in self._en_orden():
+            filas.extend(fragmento.todas())
+        return filas
+    
+    def pagina(self, cursor, limite, materia=None):
+        """Página de filas a partir de un cursor "<fragmento>:<rowid>"; retorna (filas, cursor siguiente o None)"""
+        clave_actual, cursor_fragmento = cursor.rsplit(':', 1) if cursor else ('', None)
+        if self.particion == 'nrc' and materia is not None:
+            fragmentos = [(materia, self.fragmentos[materia])] if materia in self.fragmentos else []
+        else:
+            fragmentos = self._en_orden()
+        
+        filas = []
+        for posicion, (clave, fragmento) in enumerate(fragmentos):
+            if clave < clave_actual:
+                continue
+            if clave > clave_actual:
+                cursor_fragmento = None
+            parte, siguiente = fragmento.pagina(cursor_fragmento, limite - len(filas), materia)
+            filas.extend(parte)
+            if siguiente is not None:
+                return filas, f"{clave}:{siguiente}"
+            clave_actual, cursor_fragmento = clave, None
+            if len(filas) >= limite:
+                # El fragmento se terminó justo: la próxima página sigue en el siguiente que tenga filas
+                if any(resto.pagina(None, 1, materia)[0] for _, resto in fragmentos[posicion + 1:]):
+                    return filas, f"{clave}:{fragmento.tabla.siguiente_rowid - 1}"
+                break
+        return filas, None
+    
+    def __len__(self):
+        return sum(len(fragmento) for fragmento in list(self.fragmentos.values()))
+    
+    def compactar(self):
+        """Compacta el log de todos los fragmentos; retorna True si alguno tenía escrituras"""
+        compactados = [fragmento.compactar() for _, fragmento in self._en_orden()]
+        return any(compactados)
+    
+    def iniciar_compactacion(self, intervalo=INTERVALO_COMPACTACION):
+        """
+        Un solo hilo revisa todos los fragmentos: compacta los llenos y, cada `intervalo` segundos, todos.
+        En línea cada fragmento compacta al terminar sus propias escrituras.
+        """
+        if self.en_linea:
+            self.intervalo_compactacion = intervalo
+            for _, fragmento in self._en_orden():
+                fragmento.iniciar_compactacion(intervalo)
+            return None
+        
+        def compactar_periodicamente():
+            proxima = time.monotonic() + intervalo
+            while True:
+                time.sleep(1)
+                vencido = time.monotonic() >= proxima
+                if vencido:
+                    proxima = time.monotonic() + intervalo
+                for clave, fragmento in self._en_orden():
+                    if vencido or fragmento.pendiente_compactar.is_set():
+                        try:
+                            fragmento.compactar()
+                        except Exception as e:
+                            print(f"[ERROR] No se pudo compactar el fragmento {clave}: {e}")
+        
+        hilo = threading.Thread(target=compactar_periodicamente, daemon=True)
+        hilo.start()
+        return hilo
+    
+    def cerrar(self):
+        """Cierra el log de todos los fragmentos"""
+        for _, fragmento in self._en_orden():
+            fragmento.cerrar()
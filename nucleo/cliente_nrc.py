@@ -0,0 +1,741 @@
+"""
+Cliente del servidor de NRCs - Laboratorio 2
+Aplicaciones Distribuidas
+Pool de conexiones reutilizables (si el servidor de NRCs las mantiene abiertas) compartido por todos los hilos del servidor de calificaciones,
+caché en memoria de las respuestas de validación, coalescencia de consultas
+concurrentes por el mismo NRC (una sola consulta viaja por la red) y circuit breaker
+con respaldo local del catálogo para seguir validando si el servidor de NRCs cae.
+Los lotes de NRCs se validan con BUSCAR_MULTI (en grupos de tamaño acotado) y una suscripción a cambios
+del catálogo invalida la caché en cuanto se recarga nrcs.csv.
+"""
+
+import socket
+import csv
+import json
+import os
+import select
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+# Configuración del servidor de NRCs
+NRC_SERVER_HOST = '127.0.0.1'
+NRC_SERVER_PORT = 12346
+NRC_TIMEOUT = 5  # Segundos de espera por respuesta del servidor de NRCs
+NRC_LOTE_BYTES = 4000  # Tamaño máximo de cada BUSCAR_MULTI (cabe en una lectura de cualquier versión del servidor)
+
+# Configuración del pool de conexiones
+NRC_POOL_TAMANO = 8  # Conexiones abiertas como máximo hacia el servidor de NRCs
+NRC_POOL_ESPERA = 5  # Segundos máximos esperando una conexión libre del pool
+NRC_POOL_MAX_INACTIVIDAD = 60  # Conexiones ociosas más antiguas se descartan
+
+_pool_libres = []  # Pila de (conexion, ultimo_uso); se reutiliza primero la más reciente
+_pool_abiertas = 0  # Conexiones abiertas (libres + en uso)
+_pool_condicion = threading.Condition()  # Protege el pool y despierta a los hilos en espera
+
+# Configuración de la caché de validaciones (el catálogo cambia muy rara vez)
+NRC_CACHE_TAMANO = 4096  # Entradas máximas (LRU); 0 desactiva la caché
+NRC_CACHE_TTL = 300  # Segundos de vida de una respuesta "NRC válido"
+NRC_CACHE_TTL_NEGATIVO = 30  # Segundos de vida de una respuesta "NRC no existe"
+
+_cache_nrc = OrderedDict()  # NRC normalizado -> (respuesta, expira); el final es lo más reciente
+_cache_lock = threading.Lock()
+_cache_aciertos = 0
+_cache_fallos = 0
+_cache_generacion = 0  # Aumenta en cada invalidación; evita guardar respuestas que quedaron viejas
+
+# Consultas en curso: los hilos que piden el mismo NRC esperan la respuesta del primero
+_vuelos_nrc = {}  # NRC normalizado -> {"evento": Event, "respuesta": dict}
+_vuelos_lock = threading.Lock()
+_vuelos_coalescidos = 0  # Consultas resueltas esperando a otro hilo
+
+# Circuit breaker: tras varios fallos seguidos deja de consultar al servidor por un tiempo
+NRC_CB_UMBRAL = 3  # Fallos consecutivos que abren el circuito
+NRC_CB_ESPERA = 10  # Segundos con el circuito abierto antes de enviar una consulta de prueba
+
+_cb_lock = threading.Lock()
+_cb_estado = 'cerrado'  # 'cerrado' (normal), 'abierto' (falla rápido) o 'semiabierto' (probando)
+_cb_fallos = 0
+_cb_desde = 0.0  # Momento en que se abrió el circuito o se lanzó la última prueba
+
+# Respaldo local del catálogo (copia de nrcs.csv sincronizada con LISTAR)
+NRC_RESPALDO_ARCHIVO = None  # Ruta de la copia local; None desactiva el respaldo
+NRC_RESPALDO_INTERVALO = 60  # Segundos entre sincronizaciones
+
+_respaldo_indice = None  # NRC normalizado -> fila {'NRC', 'Materia'}
+_respaldo_version = None  # Versión del catálogo de la que proviene el respaldo
+_respaldo_lock = threading.Lock()  # Serializa las actualizaciones del respaldo (memoria y disco)
+
+# Suscripción a cambios del catálogo (el servidor de NRCs debe estar en modo asyncio)
+NRC_CACHE_TTL_SUSCRITO = 3600  # TTL mientras la suscripción avisa de cada cambio
+NRC_SUSCRIPCION_REINTENTO = 5  # Segundos antes de reintentar (se duplica hasta 60)
+
+_suscripcion_activa = False
+_suscripcion_version = None  # Última versión del catálogo recibida por la suscripción
+
+def configurar_pool_nrc(tamano):
+    """Cambia el número máximo de conexiones del pool"""
+    global NRC_POOL_TAMANO
+    with _pool_condicion:
+        NRC_POOL_TAMANO = max(1, tamano)
+        _pool_condicion.notify_all()
+
+def cerrar_conexion_nrc(conexion):
+    """Cierra una conexión del pool ignorando errores"""
+    nrc_socket, lector = conexion
+    try:
+        lector.close()
+        nrc_socket.close()
+    except OSError:
+        pass
+
+def conexion_saludable(conexion, ultimo_uso):
+    """
+    Verifica una conexión ociosa antes de reutilizarla.
+    Una conexión sana no tiene datos pendientes: si el socket es legible
+    es porque el servidor la cerró (EOF) o dejó basura en el canal.
+    """
+    if time.monotonic() - ultimo_uso > NRC_POOL_MAX_INACTIVIDAD:
+        return False
+    nrc_socket, _ = conexion
+    try:
+        legibles, _, _ = select.select([nrc_socket], [], [], 0)
+    except (OSError, ValueError):
+        return False
+    return not legibles
+
+def abrir_conexion_nrc():
+    """Abre una conexión nueva hacia el servidor de NRCs"""
+    nrc_socket = socket.create_connection((NRC_SERVER_HOST, NRC_SERVER_PORT), timeout=NRC_TIMEOUT)
+    nrc_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return (nrc_socket, nrc_socket.makefile('rb'))
+
+def obtener_conexion_nrc():
+    """
+    Toma una conexión del pool (o abre una si hay cupo).
+    Retorna: (conexion, reutilizada)
+    """
+    global _pool_abiertas
+    limite = time.monotonic() + NRC_POOL_ESPERA
+    
+    with _pool_condicion:
+        while True:
+            while _pool_libres:
+                conexion, ultimo_uso = _pool_libres.pop()
+                if conexion_saludable(conexion, ultimo_uso):
+                    return conexion, True
+                cerrar_conexion_nrc(conexion)
+                _pool_abiertas -= 1
+            
+            if _pool_abiertas < NRC_POOL_TAMANO:
+                _pool_abiertas += 1
+                break
+            
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                raise socket.timeout("No hay conexiones libres hacia el servidor de NRCs")
+            _pool_condicion.wait(restante)
+    
+    # La conexión se abre fuera del lock para no frenar a los demás hilos
+    try:
+        return abrir_conexion_nrc(), False
+    except Exception:
+        with _pool_condicion:
+            _pool_abiertas -= 1
+            _pool_condicion.notify()
+        raise
+
+def liberar_conexion_nrc(conexion, reutilizable=True):
+    """Devuelve una conexión al pool, o la cierra si quedó en un estado inválido"""
+    global _pool_abiertas
+    with _pool_condicion:
+        if reutilizable and _pool_abiertas <= NRC_POOL_TAMANO:
+            _pool_libres.append((conexion, time.monotonic()))
+        else:
+            cerrar_conexion_nrc(conexion)
+            _pool_abiertas -= 1
+        _pool_condicion.notify()
+
+def leer_respuesta_nrc(lector):
+    """Lee una respuesta del servidor de NRCs (una línea JSON, sin límite de tamaño)"""
+    respuesta = lector.readline()
+    if not respuesta:
+        raise ConnectionResetError("El servidor de NRCs cerró la conexión")
+    if not respuesta.endswith(b'\n'):
+        # Respondió, pero sin enmarcado: no entendió el comando completo
+        raise ValueError("Respuesta sin salto de línea del servidor de NRCs")
+    return json.loads(respuesta)
+
+def enviar_comando_nrc(comando):
+    """
+    Envía un comando al servidor de NRCs usando una conexión del pool y lee la respuesta.
+    En una conexión nueva se antepone HOLA: solo vuelve al pool si el servidor anuncia
+    que la mantiene abierta (modo asyncio); el modo secuencial cierra tras cada ráfaga.
+    Si una conexión reutilizada resultó cerrada por el servidor, reconecta y reintenta una vez.
+    """
+    for intento in range(2):
+        conexion, reutilizada = obtener_conexion_nrc()
+        nrc_socket, lector = conexion
+        persistente = reutilizada
+        
+        try:
+            if reutilizada:
+                nrc_socket.sendall(f"{comando}\n".encode('utf-8'))
+            else:
+                # Ambos comandos en la misma ráfaga: el modo secuencial responde los dos antes de cerrar
+                nrc_socket.sendall(f"HOLA\n{comando}\n".encode('utf-8'))
+                persistente = leer_respuesta_nrc(lector).get("persistente") is True
+            resultado = leer_respuesta_nrc(lector)
+        except socket.timeout:
+            liberar_conexion_nrc(conexion, reutilizable=False)
+            raise
+        except OSError:
+            liberar_conexion_nrc(conexion, reutilizable=False)
+            if not reutilizada or intento == 1:
+                raise
+            continue
+        except Exception:
+            liberar_conexion_nrc(conexion, reutilizable=False)
+            raise
+        
+        liberar_conexion_nrc(conexion, reutilizable=persistente)
+        return resultado
+
+def configurar_cache_nrc(tamano=None, ttl=None, ttl_negativo=None):
+    """Ajusta los parámetros de la caché de validaciones y la vacía"""
+    global NRC_CACHE_TAMANO, NRC_CACHE_TTL, NRC_CACHE_TTL_NEGATIVO
+    with _cache_lock:
+        if tamano is not None:
+            NRC_CACHE_TAMANO = max(0, tamano)
+        if ttl is not None:
+            NRC_CACHE_TTL = ttl
+        if ttl_negativo is not None:
+            NRC_CACHE_TTL_NEGATIVO = ttl_negativo
+        _cache_nrc.clear()
+
+def leer_cache_nrc(clave, contar=True):
+    """Retorna la respuesta en caché para un NRC, o None si no existe o expiró"""
+    global _cache_aciertos, _cache_fallos
+    with _cache_lock:
+        entrada = _cache_nrc.get(clave)
+        if entrada is not None:
+            respuesta, expira = entrada
+            if time.monotonic() < expira:
+                _cache_nrc.move_to_end(clave)
+                if contar:
+                    _cache_aciertos += 1
+                return respuesta
+            del _cache_nrc[clave]
+        if contar:
+            _cache_fallos += 1
+        return None
+
+def generacion_cache_nrc():
+    """Retorna la generación actual de la caché (tomarla antes de consultar al servidor)"""
+    return _cache_generacion
+
+def guardar_cache_nrc(clave, respuesta, generacion=None):
+    """
+    Guarda una respuesta del servidor de NRCs, desalojando la menos usada si se llenó.
+    Si la caché se invalidó mientras la consulta estaba en vuelo, la respuesta se descarta.
+    """
+    if NRC_CACHE_TAMANO <= 0:
+        return
+    if _suscripcion_activa:
+        ttl = NRC_CACHE_TTL_SUSCRITO
+    elif respuesta.get("status") == "ok":
+        ttl = NRC_CACHE_TTL
+    else:
+        ttl = NRC_CACHE_TTL_NEGATIVO
+    with _cache_lock:
+        if generacion is not None and generacion != _cache_generacion:
+            return
+        _cache_nrc[clave] = (respuesta, time.monotonic() + ttl)
+        _cache_nrc.move_to_end(clave)
+        while len(_cache_nrc) > NRC_CACHE_TAMANO:
+            _cache_nrc.popitem(last=False)
+
+def invalidar_cache_nrc(clave=None):
+    """Elimina un NRC de la caché, o la vacía completa si no se indica ninguno"""
+    global _cache_generacion
+    with _cache_lock:
+        _cache_generacion += 1
+        if clave is None:
+            _cache_nrc.clear()
+        else:
+            _cache_nrc.pop(clave.strip().upper(), None)
+
+def estadisticas_cache_nrc():
+    """Retorna aciertos, fallos y tamaño actual de la caché de validaciones"""
+    with _cache_lock:
+        total = _cache_aciertos + _cache_fallos
+        return {
+            "aciertos": _cache_aciertos,
+            "fallos": _cache_fallos,
+            "tasa_aciertos": _cache_aciertos / total if total else 0.0,
+            "entradas": len(_cache_nrc),
+            "coalescidas": _vuelos_coalescidos
+        }
+
+def circuito_permite_consulta():
+    """
+    Indica si se puede consultar al servidor de NRCs.
+    Con el circuito abierto falla rápido hasta que pasa NRC_CB_ESPERA;
+    entonces deja pasar una sola consulta de prueba (semiabierto).
+    """
+    global _cb_estado, _cb_desde
+    with _cb_lock:
+        if _cb_estado == 'cerrado':
+            return True
+        if time.monotonic() - _cb_desde < NRC_CB_ESPERA:
+            return False
+        _cb_estado = 'semiabierto'
+        _cb_desde = time.monotonic()
+        print("[Circuito NRC] Semiabierto: probando servidor de NRCs")
+        return True
+
+def registrar_exito_circuito():
+    """Cierra el circuito tras una respuesta del servidor"""
+    global _cb_estado, _cb_fallos
+    with _cb_lock:
+        if _cb_estado != 'cerrado':
+            print("[Circuito NRC] Cerrado: servidor de NRCs recuperado")
+        _cb_estado = 'cerrado'
+        _cb_fallos = 0
+
+def registrar_fallo_circuito():
+    """Cuenta un fallo y abre el circuito al llegar al umbral (o si falló la prueba)"""
+    global _cb_estado, _cb_fallos, _cb_desde
+    with _cb_lock:
+        _cb_fallos += 1
+        if _cb_estado == 'semiabierto' or (_cb_estado == 'cerrado' and _cb_fallos >= NRC_CB_UMBRAL):
+            _cb_estado = 'abierto'
+            _cb_desde = time.monotonic()
+            print(f"[Circuito NRC] Abierto tras {_cb_fallos} fallos: validando sin servidor por {NRC_CB_ESPERA}s")
+
+def estado_circuito_nrc():
+    """Retorna el estado actual del circuit breaker"""
+    with _cb_lock:
+        return _cb_estado
+
+def cargar_respaldo_nrc():
+    """Carga la copia local del catálogo si existe (permite validar aunque el servidor no arranque)"""
+    global _respaldo_indice
+    if not NRC_RESPALDO_ARCHIVO or not os.path.exists(NRC_RESPALDO_ARCHIVO):
+        return
+    try:
+        with open(NRC_RESPALDO_ARCHIVO, 'r', encoding='utf-8') as file:
+            reader = csv.DictReader(file)
+            indice = {row['NRC'].strip().upper(): row for row in reader}
+        with _respaldo_lock:
+            _respaldo_indice = indice
+        print(f"[*] Respaldo de NRCs cargado: {len(_respaldo_indice)} NRCs ({NRC_RESPALDO_ARCHIVO})")
+    except Exception as e:
+        print(f"[ERROR] No se pudo cargar el respaldo de NRCs: {e}")
+
+def guardar_respaldo_nrc(indice):
+    """
+    Escribe el respaldo en disco de forma atómica (nunca queda a medio escribir).
+    El temporal tiene nombre único en el mismo directorio, así dos procesos no se pisan.
+    """
+    directorio, nombre = os.path.split(os.path.abspath(NRC_RESPALDO_ARCHIVO))
+    descriptor, temporal = tempfile.mkstemp(prefix=f"{nombre}.", suffix='.tmp', dir=directorio)
+    try:
+        with open(descriptor, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=['NRC', 'Materia'])
+            writer.writeheader()
+            writer.writerows(indice.values())
+        os.replace(temporal, NRC_RESPALDO_ARCHIVO)
+    except Exception:
+        try:
+            os.remove(temporal)
+        except OSError:
+            pass
+        raise
+
+def actualizar_respaldo_nrc(respuesta, indice_base=None, version_base=None, verificar=False):
+    """
+    Aplica una respuesta de LISTAR (o un evento de la suscripción) al respaldo, bajo el lock.
+    Con verificar=True la respuesta se descarta si el respaldo cambió mientras estaba en vuelo
+    (partía de indice_base/version_base); un delta que no parte de la versión del respaldo
+    también se descarta. Retorna True si el respaldo quedó al día.
+    """
+    global _respaldo_indice, _respaldo_version
+    with _respaldo_lock:
+        if verificar and (_respaldo_indice is not indice_base or _respaldo_version != version_base):
+            return False
+        indice = _respaldo_indice
+        version = _respaldo_version if indice is not None else None
+        if 'data' not in respuesta and respuesta.get('version') == version:
+            return True  # El mismo cambio ya llegó por otro camino
+        if not continua_version(respuesta, version):
+            return False
+        nuevo = aplicar_catalogo_nrc(indice, respuesta)
+        _respaldo_version = respuesta.get('version')
+        if nuevo is not indice:
+            _respaldo_indice = nuevo
+            guardar_respaldo_nrc(nuevo)
+        return True
+
+def aplicar_catalogo_nrc(indice, respuesta):
+    """
+    Aplica una respuesta de LISTAR sobre una copia local del catálogo.
+    Retorna el índice resultante (el mismo si no hubo cambios, uno nuevo si los hubo).
+    """
+    if respuesta.get("no_modificado"):
+        return indice
+    if 'data' in respuesta:
+        return {row['NRC'].strip().upper(): row for row in respuesta['data']}
+    
+    nuevo = dict(indice or {})
+    for clave in respuesta.get('eliminados', []):
+        nuevo.pop(clave, None)
+    for row in respuesta.get('agregados', []):
+        nuevo[row['NRC'].strip().upper()] = row
+    return nuevo
+
+def continua_version(respuesta, version):
+    """True si la respuesta de LISTAR se aplica sobre `version`: catálogo completo o cambios desde ella"""
+    if 'data' in respuesta:
+        return True
+    if respuesta.get("no_modificado"):
+        return respuesta.get('version') == version
+    return version is not None and respuesta.get('desde') == version
+
+def sincronizar_respaldo_nrc():
+    """
+    Actualiza el respaldo con LISTAR condicional: si ya se tiene una versión
+    solo viajan los cambios (o nada). Lo publica en memoria y lo guarda en disco.
+    """
+    if not circuito_permite_consulta():
+        return False
+    
+    with _respaldo_lock:
+        indice = _respaldo_indice
+        version = _respaldo_version
+    try:
+        respuesta = enviar_comando_nrc(f"LISTAR|{version}" if version and indice is not None else "LISTAR")
+    except Exception:
+        registrar_fallo_circuito()
+        return False
+    registrar_exito_circuito()
+    
+    if respuesta.get("status") != "ok":
+        return False
+    # Si la suscripción actualizó el respaldo mientras tanto, este delta ya no aplica
+    return actualizar_respaldo_nrc(respuesta, indice, version, verificar=True)
+
+def iniciar_respaldo_nrc(ruta, intervalo=None):
+    """Activa el respaldo local: lo carga de disco y lo sincroniza en segundo plano"""
+    global NRC_RESPALDO_ARCHIVO, NRC_RESPALDO_INTERVALO
+    NRC_RESPALDO_ARCHIVO = ruta
+    if intervalo is not None:
+        NRC_RESPALDO_INTERVALO = intervalo
+    cargar_respaldo_nrc()
+    
+    def sincronizar_periodicamente():
+        while True:
+            try:
+                sincronizar_respaldo_nrc()
+            except Exception as e:
+                print(f"[ERROR] Sincronizando respaldo de NRCs: {e}")
+            time.sleep(NRC_RESPALDO_INTERVALO)
+    
+    hilo = threading.Thread(target=sincronizar_periodicamente, daemon=True)
+    hilo.start()
+
+def respuesta_sin_servidor(clave, mensaje):
+    """Valida contra el respaldo local cuando no se puede consultar al servidor"""
+    indice = _respaldo_indice
+    if indice is None:
+        return {"status": "error", "mensaje": mensaje}
+    row = indice.get(clave)
+    if row is not None:
+        return {"status": "ok", "data": row}
+    return {"status": "error", "mensaje": f"NRC '{clave}' no existe (catálogo local)"}
+
+def consultar_servidor_nrc(clave):
+    """
+    Consulta un NRC al servidor y guarda la respuesta en caché (nunca lanza excepciones).
+    Si el circuito está abierto o la consulta falla, responde con el respaldo local.
+    """
+    if not circuito_permite_consulta():
+        return respuesta_sin_servidor(clave, "Error: Servidor de NRCs no disponible")
+    
+    generacion = generacion_cache_nrc()
+    try:
+        respuesta = enviar_comando_nrc(f"BUSCAR|{clave}")
+    except socket.timeout:
+        registrar_fallo_circuito()
+        return respuesta_sin_servidor(clave, "Timeout consultando servidor de NRCs")
+    except ConnectionRefusedError:
+        registrar_fallo_circuito()
+        return respuesta_sin_servidor(clave, "Error: Servidor de NRCs no disponible")
+    except Exception as e:
+        registrar_fallo_circuito()
+        return respuesta_sin_servidor(clave, f"Error consultando NRC: {str(e)}")
+    
+    registrar_exito_circuito()
+    guardar_cache_nrc(clave, respuesta, generacion)
+    return respuesta
+
+def consultar_coalescido(clave):
+    """
+    Garantiza una sola consulta en vuelo por NRC.
+    El primer hilo (líder) consulta al servidor; los que llegan mientras tanto
+    esperan su resultado en lugar de abrir consultas propias.
+    """
+    global _vuelos_coalescidos
+    with _vuelos_lock:
+        vuelo = _vuelos_nrc.get(clave)
+        lider = vuelo is None
+        if lider:
+            vuelo = {"evento": threading.Event(), "respuesta": None}
+            _vuelos_nrc[clave] = vuelo
+        else:
+            _vuelos_coalescidos += 1
+    
+    if not lider:
+        # El líder está acotado por los timeouts del pool y del socket
+        if vuelo["evento"].wait(NRC_POOL_ESPERA + 2 * NRC_TIMEOUT):
+            return vuelo["respuesta"]
+        return {"status": "error", "mensaje": "Timeout consultando servidor de NRCs"}
+    
+    try:
+        # Otro líder pudo terminar justo antes de que este hilo tomara el turno
+        respuesta = leer_cache_nrc(clave, contar=False)
+        if respuesta is None:
+            respuesta = consultar_servidor_nrc(clave)
+        vuelo["respuesta"] = respuesta
+    finally:
+        with _vuelos_lock:
+            del _vuelos_nrc[clave]
+        vuelo["evento"].set()
+    return respuesta
+
+def listar_catalogo_nrc(version=None):
+    """
+    Pide el catálogo al servidor de NRCs (LISTAR condicional si se indica la versión).
+    Si no hay servidor responde con el respaldo local completo.
+    """
+    mensaje = "Error: Servidor de NRCs no disponible"
+    if circuito_permite_consulta():
+        try:
+            respuesta = enviar_comando_nrc(f"LISTAR|{version}" if version else "LISTAR")
+            registrar_exito_circuito()
+            return respuesta
+        except socket.timeout:
+            registrar_fallo_circuito()
+            mensaje = "Timeout consultando servidor de NRCs"
+        except Exception as e:
+            registrar_fallo_circuito()
+            if not isinstance(e, ConnectionRefusedError):
+                mensaje = f"Error consultando NRC: {str(e)}"
+    
+    with _respaldo_lock:
+        indice = _respaldo_indice
+        version_respaldo = _respaldo_version
+    if indice is None:
+        return {"status": "error", "mensaje": mensaje}
+    if version and version == version_respaldo:
+        return {"status": "ok", "version": version, "no_modificado": True}
+    return {"status": "ok", "version": version_respaldo, "data": list(indice.values())}
+
+def aplicar_evento_catalogo(evento):
+    """
+    Invalida en caché los NRCs que cambiaron y actualiza el respaldo local.
+    Un delta que no parte de la última versión recibida (se perdió un evento)
+    se descarta y se pide el catálogo completo.
+    """
+    global _suscripcion_version
+    if evento.get("status") != "ok":
+        return
+    if 'data' not in evento and evento.get('version') == _suscripcion_version:
+        return  # Ya aplicado: llegó junto con el catálogo inicial de la suscripción
+    if not continua_version(evento, _suscripcion_version):
+        print(f"[!] Cambio del catálogo desde la versión {evento.get('desde')}, pero se tiene la "
+              f"{_suscripcion_version}: se pide el catálogo completo")
+        evento = listar_catalogo_completo()
+    
+    if 'data' in evento:
+        # Catálogo completo: no se sabe qué cambió
+        invalidar_cache_nrc()
+    elif not evento.get("no_modificado"):
+        for clave in evento.get('eliminados', []):
+            invalidar_cache_nrc(clave)
+        for row in evento.get('agregados', []):
+            invalidar_cache_nrc(row['NRC'])
+        print(f"[Suscripción] Catálogo actualizado a versión {evento.get('version')}: "
+              f"{len(evento.get('agregados', []))} agregados, {len(evento.get('eliminados', []))} eliminados")
+    
+    _suscripcion_version = evento.get('version')
+    if NRC_RESPALDO_ARCHIVO and not actualizar_respaldo_nrc(evento):
+        # El respaldo iba por otra versión: se reemplaza por el catálogo completo
+        actualizar_respaldo_nrc(listar_catalogo_completo())
+
+def listar_catalogo_completo():
+    """LISTAR sin versión para resincronizar; si el servidor no responde se pierde la suscripción"""
+    respuesta = enviar_comando_nrc("LISTAR")
+    if respuesta.get("status") != "ok" or 'data' not in respuesta:
+        raise ConnectionError(respuesta.get("mensaje", "No se pudo obtener el catálogo completo"))
+    return respuesta
+
+def escuchar_cambios_catalogo():
+    """Se suscribe al servidor de NRCs y procesa eventos hasta que se pierde la conexión"""
+    global _suscripcion_activa, _suscripcion_version
+    with _respaldo_lock:
+        version = _respaldo_version if _respaldo_indice is not None else _suscripcion_version
+    _suscripcion_version = version  # El primer evento trae lo que falta desde esta versión
+    
+    nrc_socket = socket.create_connection((NRC_SERVER_HOST, NRC_SERVER_PORT), timeout=NRC_TIMEOUT)
+    try:
+        nrc_socket.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        nrc_socket.sendall(f"SUSCRIBIR|{version}\n".encode('utf-8') if version else b"SUSCRIBIR\n")
+        lector = nrc_socket.makefile('rb')
+        
+        evento = json.loads(lector.readline())
+        if evento.get("status") != "ok":
+            raise ConnectionError(evento.get("mensaje", "Suscripción rechazada"))
+        
+        # Desde aquí la conexión solo recibe eventos, que pueden tardar horas
+        nrc_socket.settimeout(None)
+        aplicar_evento_catalogo(evento)
+        _suscripcion_activa = True
+        print("[*] Suscrito a cambios del catálogo de NRCs")
+        
+        for linea in lector:
+            aplicar_evento_catalogo(json.loads(linea))
+    finally:
+        if _suscripcion_activa:
+            # Sin avisos la caché podría quedar vieja: se vuelve a los TTL normales
+            _suscripcion_activa = False
+            invalidar_cache_nrc()
+            print("[!] Suscripción al catálogo de NRCs perdida, reintentando...")
+        nrc_socket.close()
+
+def iniciar_suscripcion_nrc():
+    """Mantiene en segundo plano la suscripción a cambios del catálogo, reconectando si se pierde"""
+    def mantener_suscripcion():
+        espera = NRC_SUSCRIPCION_REINTENTO
+        while True:
+            inicio = time.monotonic()
+            try:
+                escuchar_cambios_catalogo()
+            except Exception as e:
+                if espera == NRC_SUSCRIPCION_REINTENTO:
+                    print(f"[!] Sin suscripción al catálogo de NRCs: {e}")
+            # Una suscripción que duró se reintenta pronto; si falla enseguida, cada vez más lento
+            if time.monotonic() - inicio > 60:
+                espera = NRC_SUSCRIPCION_REINTENTO
+            time.sleep(espera)
+            espera = min(espera * 2, 60)
+    
+    hilo = threading.Thread(target=mantener_suscripcion, daemon=True)
+    hilo.start()
+
+# Función para consultar el servidor de NRCs
+def consultar_nrc(nrc):
+    """
+    Consulta al servidor de NRCs si un código es válido.
+    Las respuestas del servidor (válido o no existe) se guardan en caché;
+    los errores de comunicación nunca se guardan. Las consultas concurrentes
+    por el mismo NRC se agrupan en una sola.
+    Retorna: dict con status 'ok' o 'error'
+    """
+    clave = nrc.strip().upper()
+    respuesta = leer_cache_nrc(clave)
+    if respuesta is not None:
+        return respuesta
+    return consultar_coalescido(clave)
+
+def dividir_lote_nrc(claves):
+    """Reparte los códigos en grupos cuyo BUSCAR_MULTI no supera NRC_LOTE_BYTES"""
+    grupos = []
+    grupo = []
+    tamano = len("BUSCAR_MULTI|\n")
+    for clave in claves:
+        largo = len(clave.encode('utf-8')) + 1
+        if grupo and tamano + largo > NRC_LOTE_BYTES:
+            grupos.append(grupo)
+            grupo = []
+            tamano = len("BUSCAR_MULTI|\n")
+        grupo.append(clave)
+        tamano += largo
+    if grupo:
+        grupos.append(grupo)
+    return grupos
+
+def consultar_servidor_nrcs(claves):
+    """
+    Valida varios NRCs con BUSCAR_MULTI (un comando por grupo de hasta NRC_LOTE_BYTES)
+    y guarda cada respuesta en caché.
+    Retorna: dict NRC normalizado -> respuesta
+    """
+    resultados = {}
+    for grupo in dividir_lote_nrc(claves):
+        resultados.update(consultar_grupo_nrcs(grupo))
+    return resultados
+
+def consultar_grupo_nrcs(claves):
+    """
+    Valida un grupo de NRCs con un solo BUSCAR_MULTI.
+    Si el servidor no reconoce el comando o no lo recibió completo se consulta código por código;
+    eso no cuenta como caída del servidor para el circuit breaker.
+    """
+    if not circuito_permite_consulta():
+        return {clave: respuesta_sin_servidor(clave, "Error: Servidor de NRCs no disponible") for clave in claves}
+    
+    generacion = generacion_cache_nrc()
+    try:
+        respuesta = enviar_comando_nrc(f"BUSCAR_MULTI|{','.join(claves)}")
+    except ValueError:
+        # El servidor respondió algo que no es una línea JSON: está activo, pero no entendió el lote
+        registrar_exito_circuito()
+        return {clave: consultar_coalescido(clave) for clave in claves}
+    except Exception as e:
+        registrar_fallo_circuito()
+        if isinstance(e, socket.timeout):
+            mensaje = "Timeout consultando servidor de NRCs"
+        elif isinstance(e, ConnectionRefusedError):
+            mensaje = "Error: Servidor de NRCs no disponible"
+        else:
+            mensaje = f"Error consultando NRC: {str(e)}"
+        return {clave: respuesta_sin_servidor(clave, mensaje) for clave in claves}
+    
+    registrar_exito_circuito()
+    if respuesta.get("status") != "ok":
+        # Servidor de NRCs anterior a BUSCAR_MULTI
+        return {clave: consultar_coalescido(clave) for clave in claves}
+    
+    resultados = {}
+    for clave in claves:
+        resultado = respuesta['data'].get(clave)
+        if resultado is None:
+            resultado = {"status": "error", "mensaje": f"NRC '{clave}' no existe"}
+        guardar_cache_nrc(clave, resultado, generacion)
+        resultados[clave] = resultado
+    return resultados
+
+def consultar_nrcs(nrcs):
+    """
+    Valida un lote de NRCs: primero en caché y el resto en una sola consulta al servidor.
+    Retorna: dict NRC normalizado -> dict con status 'ok' o 'error'
+    """
+    resultados = {}
+    faltantes = []
+    for nrc in nrcs:
+        clave = nrc.strip().upper()
+        if clave in resultados or clave in faltantes:
+            continue
+        respuesta = leer_cache_nrc(clave)
+        if respuesta is not None:
+            resultados[clave] = respuesta
+        else:
+            faltantes.append(clave)
+    
+    if len(faltantes) == 1:
+        resultados[faltantes[0]] = consultar_coalescido(faltantes[0])
+    elif faltantes:
+        resultados.update(consultar_servidor_nrcs(faltantes))
+    return resultados
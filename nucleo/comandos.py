@@ -0,0 +1,254 @@
+"""
+Despacho de comandos del servidor de calificaciones - Laboratorio 2
+Aplicaciones Distribuidas
+Operaciones CRUD sobre el almacén configurado, con validación opcional de NRCs contra
+el servidor de NRCs; lo usan todos los modelos de concurrencia (thread-safe)
+"""
+
+import json
+
+from .cliente_nrc import consultar_nrc, consultar_nrcs, listar_catalogo_nrc
+from .almacenamiento import CAMPOS, EscrituraPendiente
+
+almacen = None  # Almacén de calificaciones elegido al iniciar (CSV + log, binario, fragmentado o SQLite)
+validacion_nrc = True  # Validar los NRCs con el servidor de NRCs antes de escribir
+
+# Paginación de listar: el cursor es el número de la última fila entregada (rowid)
+LIMITE_PAGINA = 500  # Registros por página si el cliente no indica otro
+MAX_LIMITE_PAGINA = 10000
+
+def configurar_comandos(almacen_calificaciones, validar_nrc=True):
+    """Indica el almacén sobre el que operan los comandos y si se validan los NRCs"""
+    global almacen, validacion_nrc
+    almacen = almacen_calificaciones
+    validacion_nrc = validar_nrc
+
+def fila_de(datos):
+    """Fila del almacén con los datos del cliente (todo como texto, igual que al releerla del CSV)"""
+    return dict(zip(CAMPOS, (str(datos[campo]) for campo in ('id', 'nombre', 'materia', 'calificacion'))))
+
+def agregar_calificacion(datos):
+    """Agrega una nueva calificación (thread-safe), validando antes el NRC si la validación está activa"""
+    try:
+        nrc = str(datos.get('materia', ''))
+        detalle = ""
+        if validacion_nrc:
+            print(f"[Validación] Consultando NRC: {nrc}")
+            
+            res_nrc = consultar_nrc(nrc)
+            
+            if res_nrc["status"] != "ok":
+                print(f"[Validación] ✗ NRC inválido: {nrc}")
+                return {"status": "error", "mensaje": f"Materia/NRC no válida: {res_nrc.get('mensaje', 'NRC no existe')}"}
+            
+            print(f"[Validación] ✓ NRC válido: {nrc} - {res_nrc['data']['Materia']}")
+            detalle = f" (NRC: {nrc} - {res_nrc['data']['Materia']})"
+        
+        # Si el NRC es válido, agregar la calificación
+        fila = fila_de(datos)
+        almacen.agregar([fila])
+        
+        return {"status": "success", "mensaje": f"Calificación agregada correctamente{detalle}"}
+    
+    except EscrituraPendiente as e:
+        return {"status": "pendiente", "mensaje": str(e)}
+    except Exception as e:
+        return {"status": "error", "mensaje": str(e)}
+
+def agregar_calificaciones(lista_datos):
+    """
+    Agrega un lote de calificaciones (thread-safe).
+    Con validación, todos los NRCs del lote se validan en una sola consulta (BUSCAR_MULTI);
+    las filas válidas se escriben juntas y se retorna el resultado de cada fila.
+    """
+    try:
+        nrcs = [str(datos.get('materia', '')) for datos in lista_datos]
+        validaciones = None
+        if validacion_nrc:
+            print(f"[Validación] Consultando {len(set(nrcs))} NRCs para {len(lista_datos)} calificaciones")
+            validaciones = consultar_nrcs(nrcs)
+        
+        filas = []
+        resultados = []
+        for datos, nrc in zip(lista_datos, nrcs):
+            res_nrc = validaciones[nrc.strip().upper()] if validaciones else {"status": "ok"}
+            if res_nrc["status"] == "ok":
+                filas.append(fila_de(datos))
+                detalle = f" (NRC: {nrc} - {res_nrc['data']['Materia']})" if validaciones else ""
+                resultados.append({"id": datos['id'], "materia": nrc, "status": "success",
+                                   "mensaje": f"Agregada{detalle}"})
+            else:
+                resultados.append({"id": datos.get('id', ''), "materia": nrc, "status": "error",
+                                   "mensaje": f"Materia/NRC no válida: {res_nrc.get('mensaje', 'NRC no existe')}"})
+        
+        if filas:
+            almacen.agregar(filas)
+        
+        if validaciones:
+            print(f"[Validación] {len(filas)} de {len(lista_datos)} calificaciones con NRC válido")
+        return {
+            "status": "success" if filas else "error",
+            "mensaje": f"{len(filas)} de {len(lista_datos)} calificaciones agregadas",
+            "data": resultados
+        }
+    
+    except EscrituraPendiente as e:
+        return {"status": "pendiente", "mensaje": str(e)}
+    except Exception as e:
+        return {"status": "error", "mensaje": str(e)}
+
+def listar_calificaciones():
+    """Lista todas las calificaciones (thread-safe)"""
+    try:
+        calificaciones = almacen.todas()
+        return {"status": "success", "data": calificaciones}
+    except Exception as e:
+        return {"status": "error", "mensaje": str(e)}
+
+def leer_pagina(cursor, limite, materia=None):
+    """
+    Lee una página de calificaciones del almacén (con el lock tomado solo durante esa página).
+    Retorna: (registros, cursor siguiente o None si se llegó al final)
+    """
+    return almacen.pagina(cursor, limite, materia)
+
+def filtro_materia(datos):
+    """Materia por la que filtrar (normalizada) o None"""
+    materia = (datos.get('materia') or '').strip().upper()
+    return materia or None
+
+def listar_pagina(datos):
+    """Lista una página de calificaciones: datos con 'limite', 'cursor' y 'materia' opcionales"""
+    try:
+        limite = max(1, min(int(datos.get('limite') or LIMITE_PAGINA), MAX_LIMITE_PAGINA))
+        registros, siguiente = leer_pagina(datos.get('cursor'), limite, filtro_materia(datos))
+        return {"status": "success", "data": registros, "cursor": siguiente}
+    except (ValueError, TypeError):
+        return {"status": "error", "mensaje": "Cursor o límite inválido"}
+    except Exception as e:
+        return {"status": "error", "mensaje": str(e)}
+
+def transmitir_calificaciones(datos):
+    """
+    Generador de respuestas parciales para listar en modo stream: cada página
+    se lee, se envía y se libera antes de leer la siguiente. La última trae "fin": true.
+    """
+    try:
+        limite = max(1, min(int(datos.get('limite') or LIMITE_PAGINA), MAX_LIMITE_PAGINA))
+        materia = filtro_materia(datos)
+        cursor = datos.get('cursor')
+        total = 0
+        while True:
+            registros, cursor = leer_pagina(cursor, limite, materia)
+            total += len(registros)
+            if cursor is None:
+                yield {"status": "success", "data": registros, "fin": True, "total": total}
+                return
+            if registros:
+                yield {"status": "success", "data": registros, "fin": False}
+    except (ValueError, TypeError):
+        yield {"status": "error", "mensaje": "Cursor o límite inválido", "fin": True}
+    except Exception as e:
+        yield {"status": "error", "mensaje": str(e), "fin": True}
+
+def buscar_calificacion(id_estudiante):
+    """Busca calificaciones por ID de estudiante (thread-safe)"""
+    try:
+        resultados = almacen.buscar_por_id(str(id_estudiante))
+        
+        if resultados:
+            return {"status": "success", "data": resultados}
+        else:
+            return {"status": "error", "mensaje": "No se encontraron calificaciones para ese ID"}
+    except Exception as e:
+        return {"status": "error", "mensaje": str(e)}
+
+def actualizar_calificacion(datos):
+    """Actualiza una calificación existente (thread-safe) con validación de NRC si cambia"""
+    try:
+        # Si se está cambiando la materia, validar el nuevo NRC
+        nueva_materia = str(datos['nueva_materia']) if datos.get('nueva_materia') else None
+        if nueva_materia and validacion_nrc:
+            print(f"[Validación] Consultando nuevo NRC: {nueva_materia}")
+            res_nrc = consultar_nrc(nueva_materia)
+            
+            if res_nrc["status"] != "ok":
+                print(f"[Validación] ✗ NRC inválido: {nueva_materia}")
+                return {"status": "error", "mensaje": f"Nuevo NRC no válido: {res_nrc.get('mensaje', 'NRC no existe')}"}
+            
+            print(f"[Validación] ✓ Nuevo NRC válido: {nueva_materia} - {res_nrc['data']['Materia']}")
+        
+        actualizado = almacen.actualizar(str(datos['id']), str(datos['materia']), str(datos['calificacion']),
+                                         nueva_materia)
+        
+        if actualizado and nueva_materia and validacion_nrc:
+            mensaje_extra = f" (Nuevo NRC: {nueva_materia} - {res_nrc['data']['Materia']})"
+        else:
+            mensaje_extra = ""
+        
+        if actualizado:
+            return {"status": "success", "mensaje": f"Calificación actualizada correctamente{mensaje_extra}"}
+        else:
+            return {"status": "error", "mensaje": "No se encontró la calificación a actualizar"}
+    except EscrituraPendiente as e:
+        return {"status": "pendiente", "mensaje": str(e)}
+    except Exception as e:
+        return {"status": "error", "mensaje": str(e)}
+
+def eliminar_calificacion(datos):
+    """Elimina una calificación (thread-safe)"""
+    try:
+        eliminado = almacen.eliminar(str(datos['id']), str(datos['materia'])) > 0
+        
+        if eliminado:
+            return {"status": "success", "mensaje": "Calificación eliminada correctamente"}
+        else:
+            return {"status": "error", "mensaje": "No se encontró la calificación a eliminar"}
+    except EscrituraPendiente as e:
+        return {"status": "pendiente", "mensaje": str(e)}
+    except Exception as e:
+        return {"status": "error", "mensaje": str(e)}
+
+def listar_nrcs_disponibles(datos):
+    """
+    Retorna el catálogo de NRCs para mostrar al cliente.
+    Si el cliente envía la versión que ya tiene, solo recibe los cambios (o "no_modificado").
+    """
+    if not validacion_nrc:
+        return {"status": "error", "mensaje": "Este servidor no tiene activa la validación de NRCs"}
+    respuesta = dict(listar_catalogo_nrc(datos.get('version')))
+    if respuesta['status'] == 'ok':
+        respuesta['status'] = 'success'
+    return respuesta
+
+def procesar_comando(comando_json):
+    """Procesa el comando recibido del cliente"""
+    try:
+        comando = json.loads(comando_json)
+        accion = comando.get('accion')
+        
+        if accion == 'agregar':
+            if isinstance(comando['datos'], list):
+                return agregar_calificaciones(comando['datos'])
+            return agregar_calificacion(comando['datos'])
+        elif accion == 'listar':
+            datos = comando.get('datos') or {}
+            if datos.get('stream'):
+                return transmitir_calificaciones(datos)
+            if datos.get('limite') or datos.get('cursor') or datos.get('materia'):
+                return listar_pagina(datos)
+            return listar_calificaciones()
+        elif accion == 'buscar':
+            return buscar_calificacion(comando['datos']['id'])
+        elif accion == 'actualizar':
+            return actualizar_calificacion(comando['datos'])
+        elif accion == 'eliminar':
+            return eliminar_calificacion(comando['datos'])
+        elif accion == 'nrcs':
+            return listar_nrcs_disponibles(comando.get('datos') or {})
+        else:
+            return {"status": "error", "mensaje": "Acción no válida"}
+    except json.JSONDecodeError:
+        return {"status": "error", "mensaje": "Formato JSON inválido"}
+    except Exception as e:
+        return {"status": "error", "mensaje": str(e)}
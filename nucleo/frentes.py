@@ -0,0 +1,489 @@
+"""
+Modelos de concurrencia del servidor de calificaciones - Laboratorio 2
+Aplicaciones Distribuidas
+Frentes intercambiables que reciben comandos y los responden con procesar_comando:
+  - secuencial: un solo cliente y termina (el servidor sin hilos original)
+  - hilos: un hilo por cliente
+  - pool: pool fijo de hilos con cola acotada y respuesta "servidor ocupado"
+  - selectors: muchos clientes en un solo hilo con sockets no bloqueantes
+  - asyncio: event loop con los comandos en un executor acotado
+"""
+
+import socket
+import json
+import threading
+import asyncio
+import itertools
+import queue
+import selectors
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .protocolo import CABECERA, MAX_MENSAJE, recibir_mensaje, enviar_mensaje, enmarcar, extraer_mensaje
+from .comandos import procesar_comando
+
+HOST = '127.0.0.1'
+BACKLOG = 1024  # Conexiones pendientes en cola (limitado también por net.core.somaxconn)
+TRABAJADORES = 32  # Hilos que ejecutan los comandos en los modos pool y asyncio (disco y consultas de NRCs)
+COLA_POOL = 256  # Solicitudes en espera en modo pool; con la cola llena se responde "servidor ocupado"
+ESPERA_CLIENTE = 5  # Segundos que el modo pool espera a que un cliente termine de enviar o recibir un mensaje
+MAX_SALIDA_PENDIENTE = 4 * 1024 * 1024  # Modo selectors: con más respuestas sin enviar, se deja de leer a ese cliente
+MAX_LECTURA_OCUPADO = 1024 * 1024  # Modo pool: bytes que se leen sin bloquear de un cliente rechazado por cola llena
+MODOS = ['secuencial', 'hilos', 'pool', 'selectors', 'asyncio']
+
+nombre_servidor = 'DE CALIFICACIONES'  # Para los mensajes de inicio ("SIN HILOS", "CON HILOS")
+puerto = 5001
+reusar_puerto = False  # Con varios procesos: cada uno abre su socket en el mismo puerto (SO_REUSEPORT)
+
+def configurar_frentes(nombre, puerto_servidor, reusar=False):
+    """Nombre que se muestra al iniciar, puerto y si se comparte el puerto con otros procesos"""
+    global nombre_servidor, puerto, reusar_puerto
+    nombre_servidor = nombre
+    puerto = puerto_servidor
+    reusar_puerto = reusar
+
+def servir(modo, backlog=BACKLOG, trabajadores=TRABAJADORES, tamano_cola=COLA_POOL):
+    """Atiende conexiones con el modelo de concurrencia `modo` hasta Ctrl+C"""
+    if modo == 'secuencial':
+        servir_secuencial()
+    elif modo == 'selectors':
+        servir_selectors(backlog)
+    elif modo == 'pool':
+        servir_pool(backlog, trabajadores, tamano_cola)
+    elif modo == 'asyncio':
+        asyncio.run(servir_asyncio(backlog, trabajadores))
+    else:
+        servir_hilos(backlog)
+
+def servir_secuencial():
+    """Atiende a un solo cliente hasta que se desconecta"""
+    server_socket = crear_socket_servidor(1)
+    
+    try:
+        print(f"[*] Servidor {nombre_servidor} escuchando en {HOST}:{puerto} (modo secuencial)")
+        print("[*] Esperando conexión del cliente...")
+        
+        # Aceptar conexión
+        client_socket, client_address = server_socket.accept()
+        print(f"[+] Cliente conectado desde {client_address}")
+        
+        # Comunicación con el cliente
+        while True:
+            try:
+                data = recibir_mensaje(client_socket)
+                
+                if data is None:
+                    print("[!] Cliente desconectado")
+                    break
+                
+                print(f"[*] Comando recibido: {data}")
+                enviar_respuesta(client_socket, procesar_comando(data))
+            
+            except Exception as e:
+                print(f"[ERROR] Error en comunicación: {e}")
+                break
+        
+        client_socket.close()
+        print("[*] Conexión cerrada")
+    finally:
+        server_socket.close()
+
+def enviar_respuesta(client_socket, respuesta):
+    """Envía la respuesta de procesar_comando (listar en modo stream produce varias respuestas parciales)"""
+    if isinstance(respuesta, dict):
+        enviar_mensaje(client_socket, json.dumps(respuesta))
+    else:
+        for parcial in respuesta:
+            enviar_mensaje(client_socket, json.dumps(parcial))
+
+def manejar_cliente(client_socket, client_address, client_id):
+    """Maneja la comunicación con un cliente específico (ejecutado en un hilo)"""
+    print(f"[+] Cliente {client_id} conectado desde {client_address}")
+    
+    try:
+        while True:
+            # Recibir comando del cliente
+            data = recibir_mensaje(client_socket)
+            
+            if data is None:
+                print(f"[!] Cliente {client_id} desconectado")
+                break
+            
+            print(f"[Cliente {client_id}] Comando recibido: {data[:50]}...")
+            
+            # Procesar comando
+            respuesta = procesar_comando(data)
+            
+            # Enviar respuesta
+            enviar_respuesta(client_socket, respuesta)
+            print(f"[Cliente {client_id}] Respuesta enviada")
+    
+    except Exception as e:
+        print(f"[ERROR] Error con cliente {client_id}: {e}")
+    finally:
+        client_socket.close()
+        print(f"[*] Conexión con cliente {client_id} cerrada")
+
+_contador_asyncio = itertools.count(1)
+_clientes_asyncio = 0  # Conexiones abiertas en modo asyncio
+executor_asyncio = None  # ThreadPoolExecutor de los comandos (modo asyncio)
+limite_executor = None  # Semáforo: comandos en el executor a la vez (el resto espera en el event loop)
+
+async def recibir_mensaje_asyncio(reader):
+    """Como recibir_mensaje, pero sobre un StreamReader de asyncio"""
+    try:
+        cabecera = await reader.readexactly(CABECERA.size)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise ConnectionError("Conexión cerrada a mitad de un mensaje")
+    (longitud,) = CABECERA.unpack(cabecera)
+    if longitud > MAX_MENSAJE:
+        raise ValueError(f"Mensaje de {longitud} bytes excede el máximo permitido")
+    try:
+        datos = await reader.readexactly(longitud)
+    except asyncio.IncompleteReadError:
+        raise ConnectionError("Conexión cerrada a mitad de un mensaje")
+    return datos.decode('utf-8')
+
+async def enviar_mensaje_asyncio(writer, respuesta):
+    """Envía una respuesta con su cabecera de longitud y espera si el cliente lee más lento"""
+    datos = json.dumps(respuesta).encode('utf-8')
+    writer.write(CABECERA.pack(len(datos)) + datos)
+    await writer.drain()
+
+async def ejecutar_bloqueante(funcion, *args):
+    """
+    Ejecuta fuera del event loop una función que bloquea (almacén, consultas de NRCs).
+    Solo entran al executor tantos trabajos como hilos tiene; los demás esperan su turno aquí.
+    """
+    async with limite_executor:
+        return await asyncio.get_running_loop().run_in_executor(executor_asyncio, funcion, *args)
+
+async def manejar_cliente_asyncio(reader, writer):
+    """Maneja la comunicación con un cliente dentro del event loop"""
+    global _clientes_asyncio
+    client_address = writer.get_extra_info('peername')
+    client_id = next(_contador_asyncio)
+    _clientes_asyncio += 1
+    print(f"[+] Cliente {client_id} conectado desde {client_address} (clientes activos: {_clientes_asyncio})")
+    
+    try:
+        while True:
+            data = await recibir_mensaje_asyncio(reader)
+            
+            if data is None:
+                print(f"[!] Cliente {client_id} desconectado")
+                break
+            
+            print(f"[Cliente {client_id}] Comando recibido: {data[:50]}...")
+            
+            respuesta = await ejecutar_bloqueante(procesar_comando, data)
+            
+            # Listar en modo stream: cada página se lee en el executor y se envía antes de pedir la siguiente
+            if isinstance(respuesta, dict):
+                await enviar_mensaje_asyncio(writer, respuesta)
+            else:
+                while True:
+                    parcial = await ejecutar_bloqueante(next, respuesta, None)
+                    if parcial is None:
+                        break
+                    await enviar_mensaje_asyncio(writer, parcial)
+            print(f"[Cliente {client_id}] Respuesta enviada")
+    
+    except Exception as e:
+        print(f"[ERROR] Error con cliente {client_id}: {e}")
+    finally:
+        _clientes_asyncio -= 1
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except Exception:
+            pass
+        print(f"[*] Conexión con cliente {client_id} cerrada")
+
+async def servir_asyncio(backlog, trabajadores):
+    """Atiende miles de conexiones concurrentes en un único hilo con asyncio"""
+    global executor_asyncio, limite_executor
+    executor_asyncio = ThreadPoolExecutor(max_workers=trabajadores, thread_name_prefix='comando')
+    limite_executor = asyncio.Semaphore(trabajadores)
+    try:
+        server = await asyncio.start_server(
+            manejar_cliente_asyncio, HOST, puerto,
+            backlog=backlog, reuse_address=True, reuse_port=reusar_puerto
+        )
+        print(f"[*] Servidor {nombre_servidor} escuchando en {HOST}:{puerto} (modo asyncio, backlog {backlog}, {trabajadores} trabajadores)")
+        print("[*] Esperando conexiones de clientes...")
+        print("[*] Presione Ctrl+C para detener el servidor\n")
+        async with server:
+            await server.serve_forever()
+    finally:
+        executor_asyncio.shutdown(wait=True)
+
+tiempo_medio_pool = 0.01  # Promedio móvil (s) de lo que tarda un comando en modo pool
+
+def estimar_espera(en_cola, trabajadores):
+    """Segundos aproximados hasta que se desocupe la cola, para sugerir cuándo reintentar"""
+    return round(max(0.1, (en_cola / trabajadores + 1) * tiempo_medio_pool), 1)
+
+def responder_ocupado(client_socket, reintentar_en):
+    """
+    Responde "servidor ocupado" a los comandos que no caben en la cola sin bloquear al selector:
+    lee solo lo que ya llegó y envía una respuesta por cada mensaje completo.
+    Retorna True si la conexión puede volver al selector; con un mensaje a medias se debe cerrar.
+    """
+    client_socket.setblocking(False)
+    try:
+        entrada = bytearray()
+        try:
+            while len(entrada) < MAX_LECTURA_OCUPADO:
+                datos = client_socket.recv(65536)
+                if not datos:
+                    return False
+                entrada += datos
+        except BlockingIOError:
+            pass
+        
+        salida = bytearray()
+        ocupado = enmarcar(json.dumps({
+            "status": "error", "ocupado": True, "reintentar_en": reintentar_en, "fin": True,
+            "mensaje": f"Servidor ocupado, reintente en {reintentar_en} s"
+        }))
+        while extraer_mensaje(entrada) is not None:
+            salida += ocupado
+        if entrada:
+            # El resto del mensaje llegaría después y desincronizaría el enmarcado
+            return False
+        return not salida or client_socket.send(salida) == len(salida)
+    except BlockingIOError:
+        return False
+    finally:
+        client_socket.settimeout(ESPERA_CLIENTE)
+
+def atender_solicitudes(solicitudes, devolver):
+    """Hilo del pool: toma una conexión con un comando pendiente, lo responde y la devuelve al selector"""
+    global tiempo_medio_pool
+    while True:
+        client_socket, client_id = solicitudes.get()
+        inicio = time.monotonic()
+        try:
+            data = recibir_mensaje(client_socket)
+            if data is None:
+                print(f"[!] Cliente {client_id} desconectado")
+                client_socket.close()
+                continue
+            
+            print(f"[Cliente {client_id}] Comando recibido: {data[:50]}...")
+            enviar_respuesta(client_socket, procesar_comando(data))
+            print(f"[Cliente {client_id}] Respuesta enviada")
+        except Exception as e:
+            print(f"[ERROR] Error con cliente {client_id}: {e}")
+            client_socket.close()
+            continue
+        
+        tiempo_medio_pool = 0.9 * tiempo_medio_pool + 0.1 * (time.monotonic() - inicio)
+        devolver(client_socket, client_id)
+
+def servir_pool(backlog, trabajadores, tamano_cola):
+    """
+    Pool fijo de hilos con cola acotada. Un selector vigila las conexiones inactivas;
+    cuando una trae un comando se encola para los trabajadores y, si la cola está llena,
+    se responde en el acto "servidor ocupado" con un tiempo sugerido para reintentar.
+    """
+    selector = selectors.DefaultSelector()
+    solicitudes = queue.Queue(maxsize=tamano_cola)
+    devueltas = queue.SimpleQueue()  # Conexiones que los trabajadores terminaron de atender
+    despertar_lectura, despertar_escritura = socket.socketpair()
+    
+    def devolver(client_socket, client_id):
+        devueltas.put((client_socket, client_id))
+        despertar_escritura.send(b'\0')
+    
+    for _ in range(trabajadores):
+        threading.Thread(target=atender_solicitudes, args=(solicitudes, devolver), daemon=True).start()
+    
+    server_socket = crear_socket_servidor(backlog)
+    
+    try:
+        selector.register(server_socket, selectors.EVENT_READ)
+        selector.register(despertar_lectura, selectors.EVENT_READ)
+        print(f"[*] Servidor {nombre_servidor} escuchando en {HOST}:{puerto} (modo pool, {trabajadores} trabajadores, cola de {tamano_cola})")
+        print("[*] Esperando conexiones de clientes...")
+        print("[*] Presione Ctrl+C para detener el servidor\n")
+        
+        client_counter = 0
+        rechazadas = 0
+        
+        while True:
+            for key, _ in selector.select():
+                if key.fileobj is server_socket:
+                    client_socket, client_address = server_socket.accept()
+                    client_counter += 1
+                    client_socket.settimeout(ESPERA_CLIENTE)
+                    selector.register(client_socket, selectors.EVENT_READ, client_counter)
+                    print(f"[+] Cliente {client_counter} conectado desde {client_address}")
+                
+                elif key.fileobj is despertar_lectura:
+                    despertar_lectura.recv(4096)
+                    while not devueltas.empty():
+                        client_socket, client_id = devueltas.get()
+                        selector.register(client_socket, selectors.EVENT_READ, client_id)
+                
+                else:
+                    # Mientras un trabajador la atiende, la conexión sale del selector
+                    client_socket, client_id = key.fileobj, key.data
+                    selector.unregister(client_socket)
+                    try:
+                        solicitudes.put_nowait((client_socket, client_id))
+                        continue
+                    except queue.Full:
+                        pass
+                    
+                    rechazadas += 1
+                    reintentar_en = estimar_espera(solicitudes.qsize(), trabajadores)
+                    print(f"[!] Cola llena: cliente {client_id} rechazado, reintentar en {reintentar_en} s ({rechazadas} rechazos)")
+                    try:
+                        if responder_ocupado(client_socket, reintentar_en):
+                            selector.register(client_socket, selectors.EVENT_READ, client_id)
+                            continue
+                    except Exception as e:
+                        print(f"[ERROR] Error con cliente {client_id}: {e}")
+                    client_socket.close()
+    finally:
+        server_socket.close()
+        selector.close()
+
+def procesar_pendientes(conexion):
+    """
+    Modo selectors: responde en orden los comandos completos recibidos. Un listado en
+    modo stream se va generando página a página a medida que se vacía la salida.
+    """
+    while len(conexion['salida']) < MAX_SALIDA_PENDIENTE:
+        if conexion['stream'] is not None:
+            parcial = next(conexion['stream'], None)
+            if parcial is None:
+                conexion['stream'] = None
+            else:
+                conexion['salida'] += enmarcar(json.dumps(parcial))
+            continue
+        
+        data = extraer_mensaje(conexion['entrada'])
+        if data is None:
+            return
+        print(f"[Cliente {conexion['id']}] Comando recibido: {data[:50]}...")
+        respuesta = procesar_comando(data)
+        if isinstance(respuesta, dict):
+            conexion['salida'] += enmarcar(json.dumps(respuesta))
+        else:
+            conexion['stream'] = respuesta
+
+def atender_conexion(selector, key, eventos):
+    """
+    Modo selectors: lee lo que llegó de un cliente, responde cada comando completo
+    y envía lo que el socket acepte sin bloquear; el resto queda para cuando sea escribible.
+    """
+    client_socket, conexion = key.fileobj, key.data
+    try:
+        if eventos & selectors.EVENT_READ:
+            datos = client_socket.recv(65536)
+            if not datos:
+                print(f"[!] Cliente {conexion['id']} desconectado")
+                cerrar_conexion(selector, client_socket)
+                return
+            conexion['entrada'] += datos
+        procesar_pendientes(conexion)
+        
+        if conexion['salida']:
+            try:
+                enviados = client_socket.send(conexion['salida'])
+                del conexion['salida'][:enviados]
+            except BlockingIOError:
+                pass
+    except Exception as e:
+        print(f"[ERROR] Error con cliente {conexion['id']}: {e}")
+        cerrar_conexion(selector, client_socket)
+        return
+    
+    # Si el cliente no lee sus respuestas se dejan de leer sus comandos hasta que se vacíe la salida
+    interes = selectors.EVENT_READ if len(conexion['salida']) < MAX_SALIDA_PENDIENTE else 0
+    if conexion['salida'] or conexion['stream'] is not None:
+        interes |= selectors.EVENT_WRITE
+    if interes != key.events:
+        selector.modify(client_socket, interes, conexion)
+
+def cerrar_conexion(selector, client_socket):
+    """Quita un cliente del selector y cierra su socket"""
+    selector.unregister(client_socket)
+    client_socket.close()
+
+def servir_selectors(backlog):
+    """Atiende muchos clientes a la vez en un solo hilo, multiplexando los sockets con selectors"""
+    selector = selectors.DefaultSelector()
+    server_socket = crear_socket_servidor(backlog)
+    
+    try:
+        server_socket.setblocking(False)
+        selector.register(server_socket, selectors.EVENT_READ)
+        print(f"[*] Servidor {nombre_servidor} escuchando en {HOST}:{puerto} (modo selectors, backlog {backlog})")
+        print("[*] Esperando conexiones de clientes...")
+        print("[*] Presione Ctrl+C para detener el servidor\n")
+        
+        contador = 0
+        while True:
+            for key, eventos in selector.select():
+                if key.fileobj is server_socket:
+                    client_socket, client_address = server_socket.accept()
+                    client_socket.setblocking(False)
+                    contador += 1
+                    conexion = {"id": contador, "entrada": bytearray(), "salida": bytearray(), "stream": None}
+                    selector.register(client_socket, selectors.EVENT_READ, conexion)
+                    print(f"[+] Cliente {contador} conectado desde {client_address} "
+                          f"(clientes activos: {len(selector.get_map()) - 1})")
+                else:
+                    atender_conexion(selector, key, eventos)
+    finally:
+        for key in list(selector.get_map().values()):
+            key.fileobj.close()
+        selector.close()
+
+def crear_socket_servidor(backlog):
+    """Crea el socket TCP, lo enlaza a HOST:puerto y empieza a escuchar"""
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reusar_puerto:
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    try:
+        server_socket.bind((HOST, puerto))
+        server_socket.listen(backlog)
+    except Exception:
+        server_socket.close()
+        raise
+    return server_socket
+
+def servir_hilos(backlog):
+    """Atiende cada conexión en su propio hilo"""
+    server_socket = crear_socket_servidor(backlog)
+    
+    try:
+        print(f"[*] Servidor {nombre_servidor} escuchando en {HOST}:{puerto} (modo hilos)")
+        print("[*] Esperando conexiones de clientes...")
+        print("[*] Presione Ctrl+C para detener el servidor\n")
+        
+        client_counter = 0
+        
+        while True:
+            # Aceptar conexión
+            client_socket, client_address = server_socket.accept()
+            client_counter += 1
+            
+            # Crear un nuevo hilo para manejar este cliente
+            client_thread = threading.Thread(
+                target=manejar_cliente,
+                args=(client_socket, client_address, client_counter)
+            )
+            client_thread.daemon = True  # El hilo se cierra cuando el programa principal termina
+            client_thread.start()
+            
+            print(f"[*] Clientes activos: {threading.active_count() - 1}")
+    finally:
+        server_socket.close()
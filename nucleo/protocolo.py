@@ -0,0 +1,60 @@
+"""
+Protocolo de mensajes del servidor de calificaciones - Laboratorio 2
+Aplicaciones Distribuidas
+Enmarcado: cabecera de 4 bytes con la longitud (big-endian) + JSON en UTF-8
+"""
+
+import struct
+
+CABECERA = struct.Struct('!I')
+MAX_MENSAJE = 64 * 1024 * 1024  # Tamaño máximo aceptado para un comando
+
+def recibir_exacto(sock, cantidad):
+    """Lee exactamente `cantidad` bytes; retorna None si la conexión se cerró antes de empezar"""
+    buffer = bytearray(cantidad)
+    vista = memoryview(buffer)
+    leidos = 0
+    while leidos < cantidad:
+        n = sock.recv_into(vista[leidos:])
+        if n == 0:
+            if leidos == 0:
+                return None
+            raise ConnectionError("Conexión cerrada a mitad de un mensaje")
+        leidos += n
+    return buffer
+
+def recibir_mensaje(sock):
+    """Recibe un mensaje completo; retorna None si el cliente se desconectó"""
+    cabecera = recibir_exacto(sock, CABECERA.size)
+    if cabecera is None:
+        return None
+    (longitud,) = CABECERA.unpack(cabecera)
+    if longitud > MAX_MENSAJE:
+        raise ValueError(f"Mensaje de {longitud} bytes excede el máximo permitido")
+    datos = recibir_exacto(sock, longitud)
+    if datos is None:
+        raise ConnectionError("Conexión cerrada a mitad de un mensaje")
+    return datos.decode('utf-8')
+
+def enmarcar(texto):
+    """Mensaje con su cabecera de longitud, listo para enviar"""
+    datos = texto.encode('utf-8')
+    return CABECERA.pack(len(datos)) + datos
+
+def enviar_mensaje(sock, texto):
+    """Envía un mensaje completo con su cabecera de longitud"""
+    sock.sendall(enmarcar(texto))
+
+def extraer_mensaje(buffer):
+    """Saca del buffer el primer mensaje si ya llegó completo; si no, retorna None y el buffer queda igual"""
+    if len(buffer) < CABECERA.size:
+        return None
+    (longitud,) = CABECERA.unpack_from(buffer)
+    if longitud > MAX_MENSAJE:
+        raise ValueError(f"Mensaje de {longitud} bytes excede el máximo permitido")
+    fin = CABECERA.size + longitud
+    if len(buffer) < fin:
+        return None
+    mensaje = buffer[CABECERA.size:fin].decode('utf-8')
+    del buffer[:fin]
+    return mensaje
@@ -0,0 +1,328 @@
+"""
+Arranque del servidor de calificaciones - Laboratorio 2
+Aplicaciones Distribuidas
+Opciones de línea de comandos, apertura del almacén y elección del modelo de concurrencia.
+sin_hilos/server.py y con_hilos/server.py llaman a main() con su nombre, puerto,
+archivo CSV, modo por defecto y si validan NRCs; todo se puede cambiar con opciones.
+"""
+
+import csv
+import glob
+import os
+import argparse
+import shutil
+import signal
+import socket
+import sys
+
+from .cliente_nrc import (
+    configurar_pool_nrc, configurar_cache_nrc, estadisticas_cache_nrc,
+    iniciar_respaldo_nrc, iniciar_suscripcion_nrc,
+    NRC_SERVER_PORT, NRC_POOL_TAMANO, NRC_CACHE_TAMANO
+)
+from .almacenamiento import (
+    AlmacenCalificaciones, AlmacenFragmentado, migrar_csv,
+    MAX_ENTRADAS_LOG, FSYNC_MS, FSYNC_REGISTROS
+)
+from .almacen_sqlite import AlmacenSQLite
+from .comandos import configurar_comandos
+from . import frentes
+
+# Archivos del almacén; se derivan del CSV que indica cada servidor (ver configurar_archivos)
+ARCHIVO_CSV = 'calificaciones.csv'
+DIRECTORIO_FRAGMENTOS = 'calificaciones_fragmentos'  # Con --fragmentar: un CSV + log por fragmento
+ARCHIVO_SQLITE = 'calificaciones.db'  # Con --almacen sqlite
+ARCHIVO_BINARIO = 'calificaciones.bin'  # Con --almacen binario: snapshot binario + log
+almacen = None  # Almacén de calificaciones elegido al iniciar (CSV + log, binario, fragmentado o SQLite)
+
+def configurar_archivos(archivo_csv):
+    """Nombres del CSV y de los archivos de los demás almacenes (mismo nombre, otra extensión)"""
+    global ARCHIVO_CSV, DIRECTORIO_FRAGMENTOS, ARCHIVO_SQLITE, ARCHIVO_BINARIO
+    base = os.path.splitext(archivo_csv)[0]
+    ARCHIVO_CSV = archivo_csv
+    DIRECTORIO_FRAGMENTOS = base + '_fragmentos'
+    ARCHIVO_SQLITE = base + '.db'
+    ARCHIVO_BINARIO = base + '.bin'
+
+def ruta_migracion(ruta):
+    """
+    Dónde se arma una migración antes de ponerla en su lugar (misma extensión, así los
+    archivos auxiliares del almacén tampoco chocan con los del definitivo)
+    """
+    base, extension = os.path.splitext(ruta)
+    return base + '.migrando' + extension
+
+def descartar_migracion(temporal):
+    """Borra lo que haya dejado una migración interrumpida (el temporal y sus auxiliares)"""
+    for ruta in glob.glob(glob.escape(temporal) + '*'):
+        if os.path.isdir(ruta):
+            shutil.rmtree(ruta)
+        else:
+            os.remove(ruta)
+
+def migrar_a_sqlite(fsync):
+    """
+    Migra el CSV a una base temporal que reemplaza a ARCHIVO_SQLITE solo al terminar:
+    si el servidor se cae a mitad, al reiniciar no hay base y se vuelve a migrar
+    """
+    temporal = ruta_migracion(ARCHIVO_SQLITE)
+    descartar_migracion(temporal)
+    destino = AlmacenSQLite(temporal, fsync)
+    try:
+        copiadas = migrar_csv(ARCHIVO_CSV, destino)
+        destino.compactar()
+    finally:
+        destino.cerrar()  # Al cerrar la última conexión SQLite vuelca el WAL y lo borra
+    if os.path.exists(temporal + '-wal'):
+        raise OSError(f"La migración a {ARCHIVO_SQLITE} dejó escrituras sin volcar en {temporal}-wal")
+    for auxiliar in (ARCHIVO_SQLITE + '-wal', ARCHIVO_SQLITE + '-shm'):
+        if os.path.exists(auxiliar):
+            os.remove(auxiliar)  # De una base anterior que ya no existe: no se deben aplicar a la nueva
+    os.replace(temporal, ARCHIVO_SQLITE)
+    descartar_migracion(temporal)
+    print(f"[*] {copiadas} calificaciones migradas de {ARCHIVO_CSV} a {ARCHIVO_SQLITE}")
+
+def inicializar_almacen(tipo='csv', max_entradas_log=MAX_ENTRADAS_LOG, fsync_ms=FSYNC_MS, fsync_registros=FSYNC_REGISTROS,
+                        fsync=True, fragmentar=None, fragmentos=8, multiproceso=False, en_linea=False):
+    """
+    Abre el almacén de calificaciones configurado (`multiproceso` si otros procesos lo comparten,
+    `en_linea` para escribir el log y compactar sin hilos, en el hilo que atiende):
+      - 'csv': CSV + log de escrituras cargado en memoria (fragmentado si se indica `fragmentar`)
+      - 'binario': snapshot binario abierto con mmap + log; la primera vez se convierte el CSV
+      - 'sqlite': base SQLite; la primera vez se migran las calificaciones del CSV
+    """
+    global almacen
+    if tipo == 'sqlite':
+        if not os.path.exists(ARCHIVO_SQLITE) and os.path.exists(ARCHIVO_CSV):
+            migrar_a_sqlite(fsync)
+        almacen = AlmacenSQLite(ARCHIVO_SQLITE, fsync)
+        print(f"[*] Base {ARCHIVO_SQLITE} abierta con {len(almacen)} calificaciones")
+    elif fragmentar:
+        inicializar_fragmentos(max_entradas_log, fsync_ms, fsync_registros, fsync, fragmentar, fragmentos, tipo, en_linea)
+    elif tipo == 'binario':
+        inicializar_binario(max_entradas_log, fsync_ms, fsync_registros, fsync, multiproceso, en_linea)
+    else:
+        inicializar_csv(max_entradas_log, fsync_ms, fsync_registros, fsync, multiproceso, en_linea)
+
+def inicializar_fragmentos(max_entradas_log, fsync_ms, fsync_registros, fsync, fragmentar, fragmentos, formato='csv',
+                           en_linea=False):
+    """
+    Abre el almacén fragmentado ('nrc' o 'id'); la primera vez reparte en los
+    fragmentos las calificaciones que ya hubiera en el CSV único (en un directorio
+    temporal que toma el nombre definitivo solo al terminar).
+    """
+    global almacen
+    directorio = DIRECTORIO_FRAGMENTOS if formato == 'csv' else DIRECTORIO_FRAGMENTOS + '_' + formato
+    if not os.path.exists(directorio) and os.path.exists(ARCHIVO_CSV):
+        temporal = ruta_migracion(directorio)
+        descartar_migracion(temporal)
+        destino = AlmacenFragmentado(temporal, fragmentar, fragmentos, fsync=fsync, formato=formato, en_linea=True)
+        try:
+            copiadas = migrar_csv(ARCHIVO_CSV, destino)
+            destino.compactar()  # Deja las filas migradas en los snapshots y no en los logs
+        finally:
+            destino.cerrar()
+        os.replace(temporal, directorio)
+        print(f"[*] {copiadas} calificaciones de {ARCHIVO_CSV} repartidas en {directorio}/")
+    almacen = AlmacenFragmentado(directorio, fragmentar, fragmentos,
+                                 max_entradas_log, fsync_ms, fsync_registros, fsync, formato, en_linea)
+    almacen.iniciar_compactacion()
+    print(f"[*] {len(almacen)} calificaciones cargadas en {len(almacen.fragmentos)} fragmentos (por {fragmentar})")
+
+def inicializar_binario(max_entradas_log=MAX_ENTRADAS_LOG, fsync_ms=FSYNC_MS, fsync_registros=FSYNC_REGISTROS, fsync=True,
+                        multiproceso=False, en_linea=False):
+    """
+    Abre el snapshot binario (mmap) + log; la primera vez convierte las calificaciones del CSV
+    (en un snapshot temporal que reemplaza a ARCHIVO_BINARIO solo al terminar)
+    """
+    global almacen
+    if not os.path.exists(ARCHIVO_BINARIO) and os.path.exists(ARCHIVO_CSV):
+        temporal = ruta_migracion(ARCHIVO_BINARIO)
+        descartar_migracion(temporal)
+        destino = AlmacenCalificaciones(temporal, fsync=fsync, formato='binario', en_linea=True)
+        try:
+            copiadas = migrar_csv(ARCHIVO_CSV, destino)
+            destino.compactar()  # Las filas quedan en el snapshot y el log temporal vacío
+        finally:
+            destino.cerrar()
+        os.replace(temporal, ARCHIVO_BINARIO)
+        descartar_migracion(temporal)
+        print(f"[*] {copiadas} calificaciones convertidas de {ARCHIVO_CSV} a {ARCHIVO_BINARIO}")
+    almacen = AlmacenCalificaciones(ARCHIVO_BINARIO, max_entradas_log, fsync_ms, fsync_registros, fsync, 'binario',
+                                    multiproceso, en_linea)
+    almacen.iniciar_compactacion()
+    print(f"[*] {len(almacen)} calificaciones en {ARCHIVO_BINARIO}")
+
+def inicializar_csv(max_entradas_log=MAX_ENTRADAS_LOG, fsync_ms=FSYNC_MS, fsync_registros=FSYNC_REGISTROS, fsync=True,
+                    multiproceso=False, en_linea=False):
+    """Crea el archivo CSV si no existe y carga las calificaciones (snapshot + log) en memoria"""
+    global almacen
+    if not os.path.exists(ARCHIVO_CSV):
+        with open(ARCHIVO_CSV, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(['ID', 'Nombre', 'Materia', 'Calificacion'])
+        print(f"[*] Archivo {ARCHIVO_CSV} creado")
+    almacen = AlmacenCalificaciones(ARCHIVO_CSV, max_entradas_log, fsync_ms, fsync_registros, fsync,
+                                    multiproceso=multiproceso, en_linea=en_linea)
+    almacen.iniciar_compactacion()
+    print(f"[*] {len(almacen)} calificaciones cargadas en memoria")
+
+def parsear_argumentos(nombre, modo, validar_nrc):
+    """Lee las opciones de línea de comandos; `modo` y `validar_nrc` son los valores por defecto del servidor"""
+    parser = argparse.ArgumentParser(description=f"Servidor de calificaciones {nombre.lower()}")
+    parser.add_argument('--modo', choices=frentes.MODOS, default=modo,
+                        help="Modelo de atención de conexiones: un cliente y termina, un hilo por cliente, pool fijo "
+                             "de hilos, un solo hilo con selectors o event loop asyncio "
+                             f"(por defecto: {modo})")
+    validacion = parser.add_mutually_exclusive_group()
+    validacion.add_argument('--validar-nrc', dest='validar_nrc', action='store_true',
+                            help=f"Validar los NRCs con el servidor de NRCs (puerto {NRC_SERVER_PORT}) antes de escribir"
+                                 + (" (por defecto)" if validar_nrc else ""))
+    validacion.add_argument('--sin-validar-nrc', dest='validar_nrc', action='store_false',
+                            help="No consultar el servidor de NRCs; se acepta cualquier materia"
+                                 + (" (por defecto)" if not validar_nrc else ""))
+    parser.set_defaults(validar_nrc=validar_nrc)
+    parser.add_argument('--backlog', type=int, default=frentes.BACKLOG,
+                        help=f"Tamaño de la cola de conexiones pendientes (por defecto: {frentes.BACKLOG})")
+    parser.add_argument('--trabajadores', type=int, default=frentes.TRABAJADORES, metavar='N',
+                        help=f"Hilos que ejecutan los comandos en los modos pool y asyncio (por defecto: {frentes.TRABAJADORES})")
+    parser.add_argument('--cola', type=int, default=frentes.COLA_POOL, metavar='N',
+                        help=f"Comandos en espera en modo pool antes de responder \"servidor ocupado\" (por defecto: {frentes.COLA_POOL})")
+    parser.add_argument('--nrc-pool', type=int, default=NRC_POOL_TAMANO,
+                        help=f"Conexiones máximas hacia el servidor de NRCs (por defecto: {NRC_POOL_TAMANO})")
+    parser.add_argument('--nrc-cache', type=int, default=NRC_CACHE_TAMANO,
+                        help=f"Entradas máximas de la caché de validaciones, 0 la desactiva (por defecto: {NRC_CACHE_TAMANO})")
+    parser.add_argument('--nrc-respaldo', metavar='RUTA',
+                        help="Copia local de nrcs.csv, sincronizada periódicamente, para validar si el servidor de NRCs no responde")
+    parser.add_argument('--sin-suscripcion', action='store_true',
+                        help="No suscribirse a cambios del catálogo (la caché solo expira por TTL)")
+    parser.add_argument('--almacen', choices=['csv', 'binario', 'sqlite'], default='csv',
+                        help=f"Dónde guardar las calificaciones: CSV + log en memoria, snapshot binario {ARCHIVO_BINARIO} "
+                             f"+ log o base SQLite {ARCHIVO_SQLITE} (por defecto: csv)")
+    parser.add_argument('--compactar-cada', type=int, default=MAX_ENTRADAS_LOG, metavar='N',
+                        help=f"Compactar el log de escrituras al llegar a N entradas (por defecto: {MAX_ENTRADAS_LOG})")
+    parser.add_argument('--fsync-ms', type=int, default=FSYNC_MS, metavar='MS',
+                        help=f"Espera máxima para juntar escrituras en un lote antes del fsync, 0 = fsync inmediato (por defecto: {FSYNC_MS})")
+    parser.add_argument('--fsync-registros', type=int, default=FSYNC_REGISTROS, metavar='N',
+                        help=f"Escrituras por lote que disparan el fsync sin esperar (por defecto: {FSYNC_REGISTROS})")
+    parser.add_argument('--sin-fsync', action='store_true',
+                        help="Confirmar los lotes sin fsync (más rápido, pero una caída del sistema puede perder escrituras confirmadas)")
+    parser.add_argument('--fragmentar', choices=['nrc', 'id'],
+                        help=f"Repartir las calificaciones en {DIRECTORIO_FRAGMENTOS}/: un fragmento por NRC o por hash del ID")
+    parser.add_argument('--fragmentos', type=int, default=8, metavar='N',
+                        help="Número de fragmentos con --fragmentar id (por defecto: 8)")
+    parser.add_argument('--procesos', type=int, default=1, metavar='N',
+                        help="Procesos que atienden en el mismo puerto (SO_REUSEPORT) compartiendo el almacén (por defecto: 1)")
+    args = parser.parse_args()
+    if args.validar_nrc and args.modo in ('secuencial', 'selectors'):
+        # En estos modos el comando se procesa en el único hilo: cada consulta de NRCs frenaría a todos los clientes
+        parser.error(f"--modo {args.modo} no admite --validar-nrc (use hilos, pool o asyncio, o --sin-validar-nrc)")
+    if args.almacen == 'sqlite' and args.fragmentar:
+        parser.error("--fragmentar solo aplica a los almacenes csv y binario")
+    if args.procesos > 1:
+        if not hasattr(socket, 'SO_REUSEPORT') or not hasattr(os, 'fork'):
+            parser.error("--procesos requiere SO_REUSEPORT y fork (Linux, macOS o BSD)")
+        if args.fragmentar:
+            parser.error("--fragmentar no se puede combinar con --procesos")
+        if args.modo == 'secuencial':
+            parser.error("--procesos no aplica al modo secuencial (un solo cliente)")
+    return args
+
+def detener_proceso(signum, frame):
+    """SIGTERM en un proceso hijo: se detiene igual que con Ctrl+C"""
+    raise KeyboardInterrupt
+
+def servir_procesos(args, nombre, puerto):
+    """
+    Pre-fork: lanza `args.procesos` procesos que abren cada uno su socket en el mismo
+    puerto (SO_REUSEPORT, el kernel reparte las conexiones) y comparten el almacén en disco
+    con bloqueo de archivos. Se lanzan de a uno y se espera a que cada uno abra el
+    almacén, así la migración inicial (SQLite o binario) ocurre una sola vez.
+    """
+    frentes.configurar_frentes(nombre, puerto, reusar=True)
+    hijos = []
+    try:
+        for numero in range(args.procesos):
+            lectura, escritura = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                # Proceso hijo: Ctrl+C lo maneja el padre, que avisa con SIGTERM
+                signal.signal(signal.SIGINT, signal.SIG_IGN)
+                signal.signal(signal.SIGTERM, detener_proceso)
+                os.close(lectura)
+                try:
+                    servir(args, multiproceso=True, aviso=escritura)
+                except Exception as e:
+                    print(f"[ERROR] Proceso {os.getpid()}: {e}")
+                finally:
+                    sys.stdout.flush()
+                    os._exit(0)
+            
+            os.close(escritura)
+            listo = os.read(lectura, 1)
+            os.close(lectura)
+            if not listo:
+                print(f"[ERROR] El proceso {pid} terminó antes de abrir el almacén")
+                os.waitpid(pid, 0)
+                break
+            hijos.append(pid)
+            print(f"[*] Proceso {numero + 1}/{args.procesos} listo (pid {pid})")
+        
+        for pid in hijos:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        print(f"\n[!] Deteniendo {len(hijos)} procesos...")
+        for pid in hijos:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in hijos:
+            os.waitpid(pid, 0)
+        print("[*] Servidor cerrado")
+
+def servir(args, multiproceso=False, aviso=None):
+    """Abre el almacén y atiende conexiones con el modo elegido; `aviso` se cierra con el almacén abierto"""
+    if args.validar_nrc:
+        configurar_pool_nrc(args.nrc_pool)
+        configurar_cache_nrc(tamano=args.nrc_cache)
+        if args.nrc_respaldo:
+            iniciar_respaldo_nrc(args.nrc_respaldo)
+        if not args.sin_suscripcion:
+            iniciar_suscripcion_nrc()
+    
+    # Inicializar almacén de calificaciones (los modos de un solo hilo lo usan sin hilos propios)
+    inicializar_almacen(args.almacen, args.compactar_cada, args.fsync_ms, args.fsync_registros, not args.sin_fsync,
+                        args.fragmentar, args.fragmentos, multiproceso, en_linea=args.modo in ('secuencial', 'selectors'))
+    configurar_comandos(almacen, args.validar_nrc)
+    if aviso is not None:
+        os.write(aviso, b'1')
+        os.close(aviso)
+    
+    if args.validar_nrc:
+        print(f"[*] Validación de NRCs: ACTIVA (puerto {NRC_SERVER_PORT}, pool de {args.nrc_pool} conexiones)")
+    else:
+        print("[*] Validación de NRCs: DESACTIVADA")
+    
+    try:
+        frentes.servir(args.modo, args.backlog, args.trabajadores, args.cola)
+    except KeyboardInterrupt:
+        print("\n[!] Servidor detenido por el usuario")
+    except Exception as e:
+        print(f"[ERROR] Error del servidor: {e}")
+    finally:
+        almacen.cerrar()
+        if args.validar_nrc:
+            cache = estadisticas_cache_nrc()
+            print(f"[*] Caché de NRCs: {cache['aciertos']} aciertos, {cache['fallos']} fallos, {cache['entradas']} entradas, {cache['coalescidas']} consultas coalescidas")
+        print("[*] Servidor cerrado")
+
+def main(nombre, puerto, archivo_csv, modo, validar_nrc):
+    """Punto de entrada de los servidores: valores por defecto de cada uno, sobreescribibles con opciones"""
+    configurar_archivos(archivo_csv)
+    args = parsear_argumentos(nombre, modo, validar_nrc)
+    if args.procesos > 1:
+        servir_procesos(args, nombre, puerto)
+    else:
+        frentes.configurar_frentes(nombre, puerto)
+        servir(args)
@@ -0,0 +1,242 @@
+"""
+Snapshot binario de calificaciones - Laboratorio 2
+Aplicaciones Distribuidas
+Formato compacto por columnas que se abre con mmap y se consulta sin cargarlo en memoria
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+CAMPOS = ['ID', 'Nombre', 'Materia', 'Calificacion']
+
+MAGICO = b'CALB'
+VERSION = 2  # La versión 1 (sin rowids) se sigue pudiendo leer
+ORDEN_BYTES = 0 if sys.byteorder == 'little' else 1  # Las columnas se escriben en el orden nativo
+
+# Secciones del archivo, en este orden, cada una alineada a 8 bytes:
+#   materias_pos/materias_txt   diccionario de NRCs (cada materia distinta se guarda una vez)
+#   ids_pos/ids_txt             ID de cada fila (posiciones u32 + texto UTF-8)
+#   nombres_pos/nombres_txt     Nombre de cada fila
+#   materia                     índice en el diccionario de cada fila (u32)
+#   calificacion                calificación de cada fila (float64)
+#   sin_decimal                 1 si la calificación se escribió sin ".0" ("5" y no "5.0")
+#   orden_id                    filas ordenadas por ID (u32), para búsqueda binaria
+#   materia_inicio/por_materia  filas agrupadas por materia (u32), para filtrar sin recorrer
+#   textos                      JSON {fila: texto} de calificaciones que no son un número exacto
+#   rowid                       identificador estable de cada fila (u64, creciente); solo versión 2
+SECCIONES_V1 = ['materias_pos', 'materias_txt', 'ids_pos', 'ids_txt', 'nombres_pos', 'nombres_txt',
+                'materia', 'calificacion', 'sin_decimal', 'orden_id', 'materia_inicio', 'por_materia', 'textos']
+SECCIONES = SECCIONES_V1 + ['rowid']
+CABECERA_V1 = struct.Struct('<4sHBxII' + 'QQ' * len(SECCIONES_V1))
+CABECERA = struct.Struct('<4sHBxIIQ' + 'QQ' * len(SECCIONES))  # ... + siguiente rowid + secciones
+VERSION_ARCHIVO = struct.Struct('<4sH')
+
+def formatear_calificacion(valor, sin_decimal=False):
+    """Texto de una calificación guardada como float (con sin_decimal, "5.0" -> "5")"""
+    texto = repr(valor)
+    return texto[:-2] if sin_decimal and texto.endswith('.0') else texto
+
+def _columna_texto(textos):
+    """Posiciones (u32, una más que textos) y bytes UTF-8 concatenados"""
+    posiciones = array('I', [0])
+    datos = bytearray()
+    for texto in textos:
+        datos += texto.encode('utf-8')
+        posiciones.append(len(datos))
+    return posiciones.tobytes(), bytes(datos)
+
+def escribir_binario(ruta, filas, rowids=None, siguiente_rowid=None):
+    """
+    Escribe un snapshot binario de forma atómica (archivo temporal + reemplazo).
+    `filas` se recorre una sola vez (puede ser un generador) y se guarda directamente
+    por columnas; `rowids` (crecientes, por defecto 1, 2, 3...) identifican cada fila.
+    """
+    ids_pos, ids_txt = array('I', [0]), bytearray()
+    nombres_pos, nombres_txt = array('I', [0]), bytearray()
+    materia, calificacion, sin_decimal, numeros = array('I'), array('d'), array('B'), array('Q')
+    diccionario = {}
+    textos = {}
+    for numero, (fila, rowid) in enumerate(zip(filas, itertools.count(1) if rowids is None else rowids)):
+        if numeros and rowid <= numeros[-1]:
+            raise ValueError(f"Rowid {rowid} fuera de orden en el snapshot")
+        numeros.append(rowid)
+        ids_txt += str(fila['ID']).encode('utf-8')
+        ids_pos.append(len(ids_txt))
+        nombres_txt += str(fila['Nombre']).encode('utf-8')
+        nombres_pos.append(len(nombres_txt))
+        materia.append(diccionario.setdefault(str(fila['Materia']), len(diccionario)))
+        texto = str(fila['Calificacion'])  # Filas de versiones anteriores pueden traer números
+        try:
+            valor = float(texto)
+        except ValueError:
+            valor = None
+        corta = '.' not in texto
+        if valor is None or formatear_calificacion(valor, corta) != texto:
+            textos[numero] = texto  # Se guarda tal cual para que la conversión no pierda nada
+            valor = float('nan')
+        calificacion.append(valor)
+        sin_decimal.append(corta)
+    
+    cantidad = len(numeros)
+    if siguiente_rowid is None:
+        siguiente_rowid = numeros[-1] + 1 if cantidad else 1
+    orden_id = array('I', sorted(range(cantidad), key=lambda fila: ids_txt[ids_pos[fila]:ids_pos[fila + 1]]))
+    materia_inicio = array('I', [0] * (len(diccionario) + 1))
+    for indice in materia:
+        materia_inicio[indice + 1] += 1
+    for indice in range(len(diccionario)):
+        materia_inicio[indice + 1] += materia_inicio[indice]
+    por_materia = array('I', sorted(range(cantidad), key=materia.__getitem__))
+    
+    secciones = {}
+    secciones['materias_pos'], secciones['materias_txt'] = _columna_texto(diccionario)
+    secciones['ids_pos'], secciones['ids_txt'] = ids_pos.tobytes(), bytes(ids_txt)
+    secciones['nombres_pos'], secciones['nombres_txt'] = nombres_pos.tobytes(), bytes(nombres_txt)
+    secciones['materia'] = materia.tobytes()
+    secciones['calificacion'] = calificacion.tobytes()
+    secciones['sin_decimal'] = sin_decimal.tobytes()
+    secciones['orden_id'] = orden_id.tobytes()
+    secciones['materia_inicio'] = materia_inicio.tobytes()
+    secciones['por_materia'] = por_materia.tobytes()
+    secciones['textos'] = json.dumps(textos).encode('utf-8')
+    secciones['rowid'] = numeros.tobytes()
+    
+    temporal = ruta + '.tmp'
+    with open(temporal, 'wb') as file:
+        file.write(bytes(CABECERA.size))
+        ubicaciones = []
+        for nombre in SECCIONES:
+            file.write(bytes(-file.tell() % 8))
+            ubicaciones += [file.tell(), len(secciones[nombre])]
+            file.write(secciones[nombre])
+        file.seek(0)
+        file.write(CABECERA.pack(MAGICO, VERSION, ORDEN_BYTES, cantidad, len(diccionario), siguiente_rowid,
+                                 *ubicaciones))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporal, ruta)
+
+class SnapshotBinario:
+    """
+    Snapshot binario abierto con mmap: las columnas se leen directamente del archivo
+    (el sistema operativo carga solo las páginas que se tocan) y nada se copia a
+    memoria salvo el diccionario de materias.
+    `rowids[i]` es el rowid de la fila i (en la versión 1, i + 1).
+    """
+    
+    def __init__(self, ruta):
+        with open(ruta, 'rb') as file:
+            self.mapa = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        vista = memoryview(self.mapa)
+        magico, version = VERSION_ARCHIVO.unpack_from(self.mapa)
+        if magico != MAGICO or version not in (1, VERSION):
+            raise ValueError(f"{ruta} no es un snapshot binario de calificaciones (versión {VERSION})")
+        if version == 1:
+            nombres_secciones = SECCIONES_V1
+            _, _, orden, self.cantidad, cantidad_materias, *ubicaciones = CABECERA_V1.unpack_from(self.mapa)
+            self.siguiente_rowid = self.cantidad + 1
+        else:
+            nombres_secciones = SECCIONES
+            (_, _, orden, self.cantidad, cantidad_materias, self.siguiente_rowid,
+             *ubicaciones) = CABECERA.unpack_from(self.mapa)
+        if orden != ORDEN_BYTES:
+            raise ValueError(f"{ruta} se escribió en una máquina con otro orden de bytes")
+        
+        secciones = {}
+        for numero, nombre in enumerate(nombres_secciones):
+            inicio, largo = ubicaciones[2 * numero], ubicaciones[2 * numero + 1]
+            secciones[nombre] = vista[inicio:inicio + largo]
+        self.ids_pos = secciones['ids_pos'].cast('I')
+        self.ids_txt = secciones['ids_txt']
+        self.nombres_pos = secciones['nombres_pos'].cast('I')
+        self.nombres_txt = secciones['nombres_txt']
+        self.materia = secciones['materia'].cast('I')
+        self.calificacion = secciones['calificacion'].cast('d')
+        self.sin_decimal = secciones['sin_decimal']
+        self.orden_id = secciones['orden_id'].cast('I')
+        self.materia_inicio = secciones['materia_inicio'].cast('I')
+        self.por_materia = secciones['por_materia'].cast('I')
+        self.textos = {int(fila): texto for fila, texto in json.loads(bytes(secciones['textos'])).items()}
+        self.rowids = secciones['rowid'].cast('Q') if version > 1 else range(1, self.cantidad + 1)
+        
+        materias_pos = secciones['materias_pos'].cast('I')
+        self.materias = [bytes(secciones['materias_txt'][materias_pos[i]:materias_pos[i + 1]]).decode('utf-8')
+                         for i in range(cantidad_materias)]
+        self.materias_normalizadas = {}  # Materia en mayúsculas -> índices del diccionario
+        for indice, nombre in enumerate(self.materias):
+            self.materias_normalizadas.setdefault(nombre.upper(), []).append(indice)
+    
+    def __len__(self):
+        return self.cantidad
+    
+    def _id_bytes(self, fila):
+        return bytes(self.ids_txt[self.ids_pos[fila]:self.ids_pos[fila + 1]])
+    
+    def fila(self, fila):
+        """Fila `fila` (desde 0) como dict"""
+        return {
+            'ID': self._id_bytes(fila).decode('utf-8'),
+            'Nombre': bytes(self.nombres_txt[self.nombres_pos[fila]:self.nombres_pos[fila + 1]]).decode('utf-8'),
+            'Materia': self.materias[self.materia[fila]],
+            'Calificacion': (self.textos[fila] if fila in self.textos
+                             else formatear_calificacion(self.calificacion[fila], self.sin_decimal[fila])),
+        }
+    
+    def filas_de_id(self, id_estudiante):
+        """Números de fila con ese ID, en orden (búsqueda binaria sobre orden_id)"""
+        clave = id_estudiante.encode('utf-8')
+        bajo, alto = 0, self.cantidad
+        while bajo < alto:
+            medio = (bajo + alto) // 2
+            if self._id_bytes(self.orden_id[medio]) < clave:
+                bajo = medio + 1
+            else:
+                alto = medio
+        filas = []
+        while bajo < self.cantidad and self._id_bytes(self.orden_id[bajo]) == clave:
+            filas.append(self.orden_id[bajo])
+            bajo += 1
+        return filas
+    
+    def filas_de_materia(self, materia):
+        """Números de fila de una materia (sin distinguir mayúsculas), en orden"""
+        grupos = [self.por_materia[self.materia_inicio[indice]:self.materia_inicio[indice + 1]]
+                  for indice in self.materias_normalizadas.get(materia.upper(), [])]
+        if len(grupos) == 1:
+            return grupos[0]
+        return sorted(fila for grupo in grupos for fila in grupo)
+
+def leer_filas_csv(ruta):
+    """Generador de filas de un CSV de calificaciones"""
+    with open(ruta, 'r', newline='', encoding='utf-8') as file:
+        for row in csv.DictReader(file):
+            yield {campo: row.get(campo, '') for campo in CAMPOS}
+
+def main():
+    parser = argparse.ArgumentParser(description="Convierte calificaciones entre CSV y snapshot binario")
+    parser.add_argument('conversion', choices=['a-binario', 'a-csv'])
+    parser.add_argument('entrada')
+    parser.add_argument('salida')
+    args = parser.parse_args()
+    
+    if args.conversion == 'a-binario':
+        escribir_binario(args.salida, leer_filas_csv(args.entrada))
+        cantidad = len(SnapshotBinario(args.salida))
+    else:
+        snapshot = SnapshotBinario(args.entrada)
+        cantidad = len(snapshot)
+        with open(args.salida, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=CAMPOS)
+            writer.writeheader()
+            writer.writerows(snapshot.fila(numero) for numero in range(cantidad))
+    print(f"[*] {cantidad} calificaciones convertidas de {args.entrada} a {args.salida}")
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,13 @@ Aplicaciones Distribuidas
 Sistema de gestión de calificaciones
 """
 
+import os
 import socket
 import json
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from nucleo.protocolo import recibir_mensaje, enviar_mensaje  # Mismo enmarcado que el servidor
 
 def mostrar_menu():
     """Muestra el menú de opciones"""
@@ -111,6 +116,9 @@ def mostrar_respuesta(respuesta_json):
                                 print(f"    {key}: {value}")
                 else:
                     print(f"  {respuesta['data']}")
+        elif respuesta['status'] == 'pendiente':
+            # El servidor aplicó el cambio pero todavía no lo pudo guardar en disco
+            print("\n! PENDIENTE:", respuesta.get('mensaje', ''))
         else:
             print("\n✗ ERROR:", respuesta.get('mensaje', 'Error desconocido'))
             
@@ -155,10 +163,13 @@ def main():
             
             try:
                 # Enviar comando al servidor
-                client_socket.send(comando.encode('utf-8'))
+                enviar_mensaje(client_socket, comando)
                 
                 # Recibir respuesta
-                respuesta = client_socket.recv(4096).decode('utf-8')
+                respuesta = recibir_mensaje(client_socket)
+                if respuesta is None:
+                    print("\n[!] El servidor cerró la conexión")
+                    break
                 
                 # Mostrar respuesta
                 mostrar_respuesta(respuesta)
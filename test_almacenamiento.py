@@ -0,0 +1,315 @@
+"""
+Pruebas de los almacenes de calificaciones - Laboratorio 2
+Aplicaciones Distribuidas
+
+Recuperación tras caídas, mismo resultado en todos los almacenes y paginación con cursor
+"""
+import os
+import threading
+import time
+
+import pytest
+
+from nucleo.almacen_sqlite import AlmacenSQLite
+from nucleo import almacenamiento
+from nucleo.almacenamiento import AlmacenCalificaciones, AlmacenFragmentado, EscrituraPendiente, LockLecturaEscritura
+from nucleo.snapshot_binario import SnapshotBinario, escribir_binario
+
+MATERIAS = ['MAT101', 'RED101', 'prog201']
+
+def calificaciones(cantidad, desde=0):
+    """Filas de prueba: varias materias, IDs repetidos y calificaciones con y sin decimales"""
+    return [{"ID": f"E{numero % 40:03d}", "Nombre": f"Estudiante {numero}", "Materia": MATERIAS[numero % 3],
+             "Calificacion": ["15", "17.5", "20.0", "NP"][numero % 4]} for numero in range(desde, desde + cantidad)]
+
+def abrir(tipo, directorio):
+    """Abre (o reabre) un almacén de cada tipo dentro de `directorio`"""
+    if tipo == 'csv':
+        return AlmacenCalificaciones(str(directorio / 'cal.csv'), fsync=False)
+    if tipo == 'binario':
+        return AlmacenCalificaciones(str(directorio / 'cal.bin'), fsync=False, formato='binario')
+    if tipo == 'en_linea':
+        return AlmacenCalificaciones(str(directorio / 'cal.csv'), fsync=False, en_linea=True)
+    if tipo == 'fragmentos_nrc':
+        return AlmacenFragmentado(str(directorio / 'fragmentos'), 'nrc', fsync=False)
+    if tipo == 'fragmentos_id':
+        return AlmacenFragmentado(str(directorio / 'fragmentos'), 'id', 4, fsync=False, formato='binario')
+    return AlmacenSQLite(str(directorio / 'cal.db'), fsync=False)
+
+TIPOS = ['csv', 'binario', 'en_linea', 'fragmentos_nrc', 'fragmentos_id', 'sqlite']
+EN_ORDEN = ['csv', 'binario', 'en_linea', 'sqlite']  # Los fragmentados listan fragmento por fragmento
+
+def escrituras(almacen):
+    """La misma secuencia de escrituras (con una compactación en medio) para cualquier almacén"""
+    almacen.agregar(calificaciones(120))
+    assert almacen.actualizar("E001", "RED101", "11")
+    assert almacen.actualizar("E002", "prog201", "12", "MAT101")  # Cambia de fragmento con 'nrc'
+    assert not almacen.actualizar("E999", "MAT101", "10")
+    assert almacen.eliminar("E003", "MAT101") == 1
+    assert almacen.eliminar("E004", "RED101") == 1
+    almacen.compactar()
+    almacen.agregar(calificaciones(30, 120))
+    assert almacen.actualizar("E005", "prog201", "13", "RED101")
+    assert almacen.eliminar("E006", "MAT101") == 2  # Una de cada tanda
+
+def paginar_todo(almacen, limite, materia=None):
+    """Recorre todas las páginas; retorna las filas en el orden entregado"""
+    filas, cursor = almacen.pagina(None, limite, materia)
+    while cursor is not None:
+        parte, cursor = almacen.pagina(cursor, limite, materia)
+        assert parte
+        filas.extend(parte)
+    return filas
+
+def ordenadas(filas):
+    return sorted(tuple(fila[campo] for campo in ('ID', 'Nombre', 'Materia', 'Calificacion')) for fila in filas)
+
+@pytest.fixture(scope='module')
+def resultados(tmp_path_factory):
+    """Estado de cada almacén tras las mismas escrituras, antes y después de reabrirlo"""
+    resultados = {}
+    for tipo in TIPOS:
+        directorio = tmp_path_factory.mktemp(tipo)
+        almacen = abrir(tipo, directorio)
+        escrituras(almacen)
+        antes = almacen.todas()
+        almacen.cerrar()
+        almacen = abrir(tipo, directorio)
+        resultados[tipo] = (antes, almacen.todas(), len(almacen), almacen.buscar_por_id("E002"))
+        almacen.cerrar()
+    return resultados
+
+@pytest.mark.parametrize('tipo', TIPOS)
+def test_mismo_resultado_en_todos_los_almacenes(resultados, tipo):
+    antes, reabierto, cantidad, de_e002 = resultados[tipo]
+    referencia, _, _, referencia_e002 = resultados['sqlite']
+    assert ordenadas(antes) == ordenadas(referencia)
+    assert ordenadas(reabierto) == ordenadas(referencia)
+    assert cantidad == len(referencia) == 150 - 4
+    assert ordenadas(de_e002) == ordenadas(referencia_e002)
+
+@pytest.mark.parametrize('tipo', EN_ORDEN)
+def test_mismo_orden_de_insercion(resultados, tipo):
+    assert resultados[tipo][1] == resultados['sqlite'][1]
+
+@pytest.mark.parametrize('tipo', TIPOS)
+def test_paginacion_con_cursor_y_materia(tmp_path, tipo):
+    almacen = abrir(tipo, tmp_path)
+    escrituras(almacen)
+    for materia in ['MAT101', 'PROG201']:
+        esperadas = [fila for fila in almacen.todas() if fila['Materia'].upper() == materia]
+        for limite in (1, 7, 1000):
+            filas = paginar_todo(almacen, limite, materia)
+            if tipo in EN_ORDEN:
+                assert filas == esperadas
+            else:
+                assert ordenadas(filas) == ordenadas(esperadas)
+    assert almacen.pagina(None, 10, 'NOEXISTE') == ([], None)
+    almacen.cerrar()
+
+# Con 'id' cada fragmento tiene su cursor: lo agregado a un fragmento ya recorrido no se ve
+@pytest.mark.parametrize('tipo', ['csv', 'binario', 'en_linea', 'fragmentos_nrc', 'sqlite'])
+def test_paginacion_ve_filas_agregadas_al_final(tmp_path, tipo):
+    almacen = abrir(tipo, tmp_path)
+    almacen.agregar(calificaciones(30))
+    filas, cursor = almacen.pagina(None, 4, 'MAT101')
+    almacen.agregar(calificaciones(30, 30))
+    while cursor is not None:
+        parte, cursor = almacen.pagina(cursor, 4, 'MAT101')
+        filas.extend(parte)
+    assert ordenadas(filas) == ordenadas(fila for fila in calificaciones(60) if fila['Materia'] == 'MAT101')
+    almacen.cerrar()
+
+@pytest.mark.parametrize('tipo', ['binario', 'fragmentos_id', 'sqlite'])
+def test_cursor_sigue_valiendo_tras_compactar(tmp_path, tipo):
+    almacen = abrir(tipo, tmp_path)
+    almacen.agregar(calificaciones(60))
+    almacen.eliminar("E000", "MAT101")  # Compactar no debe correr los rowids de las filas siguientes
+    esperadas = paginar_todo(almacen, 1000, 'RED101')
+    filas, cursor = almacen.pagina(None, 5, 'RED101')
+    almacen.compactar()
+    while cursor is not None:
+        parte, cursor = almacen.pagina(cursor, 5, 'RED101')
+        filas.extend(parte)
+    assert filas == esperadas
+    almacen.cerrar()
+
+@pytest.mark.parametrize('formato', ['csv', 'binario'])
+def test_cursor_sigue_valiendo_tras_compactar_otro_proceso(tmp_path, formato):
+    """Dos almacenes multiproceso sobre los mismos archivos: el que pagina recarga el snapshot"""
+    ruta = str(tmp_path / ('cal.csv' if formato == 'csv' else 'cal.bin'))
+    escritor, lector = (AlmacenCalificaciones(ruta, fsync=False, formato=formato, multiproceso=True) for _ in range(2))
+    escritor.agregar(calificaciones(60))
+    for fila in calificaciones(6):  # Al recargar, sin rowids guardados, las siguientes se correrían 6 lugares
+        escritor.eliminar(fila['ID'], fila['Materia'])
+    escritor.eliminar("E019", "prog201")  # La última fila: el siguiente rowid no sale del snapshot
+    filas, cursor = lector.pagina(None, 5, 'RED101')
+    escritor.compactar()
+    escritor.agregar(calificaciones(3, 60))
+    while cursor is not None:
+        parte, cursor = lector.pagina(cursor, 5, 'RED101')
+        filas.extend(parte)
+    assert filas == paginar_todo(escritor, 1000, 'RED101')
+    assert lector.todas() == escritor.todas()
+    lector.agregar(calificaciones(3, 63))
+    # Ambos numeran igual aunque solo uno recargó: el cursor de uno vale en el otro
+    _, cursor = escritor.pagina(None, len(escritor.todas()) - 1)
+    assert lector.pagina(cursor, 10) == (calificaciones(1, 65), None)
+    escritor.cerrar()
+    lector.cerrar()
+
+def test_traslado_entre_fragmentos_conserva_posicion(tmp_path):
+    almacen = abrir('fragmentos_nrc', tmp_path)
+    almacen.agregar(calificaciones(30))
+    antes = [fila['ID'] for fila in paginar_todo(almacen, 1000, 'RED101')]
+    assert almacen.actualizar("E000", "MAT101", "19", "RED101")
+    almacen.compactar()
+    almacen.cerrar()
+    almacen = abrir('fragmentos_nrc', tmp_path)
+    despues = [fila['ID'] for fila in paginar_todo(almacen, 1000, 'RED101')]
+    assert despues == ['E000'] + antes  # E000 se agregó antes que todas las de RED101
+    almacen.cerrar()
+
+@pytest.mark.parametrize('tipo', ['csv', 'binario'])
+def test_recupera_log_con_ultima_linea_incompleta(tmp_path, tipo):
+    almacen = abrir(tipo, tmp_path)
+    almacen.agregar(calificaciones(10))
+    almacen.actualizar("E001", "RED101", "5")
+    esperadas = almacen.todas()
+    ruta_log = almacen.ruta_log
+    almacen.cerrar()
+    with open(ruta_log, 'ab') as log:
+        log.write(b'{"op": "agregar", "filas": [{"ID": "E9')  # Caída a mitad de una escritura
+    
+    almacen = abrir(tipo, tmp_path)
+    assert almacen.todas() == esperadas
+    almacen.agregar(calificaciones(1, 10))  # Se escribe detrás de la última entrada completa
+    almacen.cerrar()
+    almacen = abrir(tipo, tmp_path)
+    assert almacen.todas() == esperadas + calificaciones(1, 10)
+    almacen.cerrar()
+
+@pytest.mark.parametrize('tipo', ['csv', 'binario'])
+def test_recupera_compactacion_sin_snapshot_completo(tmp_path, tipo):
+    """Caída en el paso 2: el log ya pasó a <log>.1 y <snapshot>.nuevo quedó a medias"""
+    almacen = abrir(tipo, tmp_path)
+    almacen.agregar(calificaciones(20))
+    almacen.eliminar("E002", "prog201")
+    esperadas = almacen.todas()
+    almacen.cerrar()
+    os.replace(almacen.ruta_log, almacen.ruta_log_anterior)
+    open(almacen.ruta_log, 'wb').close()
+    with open(almacen.ruta_nuevo, 'wb') as nuevo:
+        nuevo.write(b'basura')
+    
+    almacen = abrir(tipo, tmp_path)
+    assert almacen.todas() == esperadas
+    assert not os.path.exists(almacen.ruta_nuevo) and not os.path.exists(almacen.ruta_log_anterior)
+    almacen.cerrar()
+
+@pytest.mark.parametrize('tipo', ['csv', 'binario'])
+def test_recupera_compactacion_sin_reemplazar_snapshot(tmp_path, tipo):
+    """Caída en el paso 3: <snapshot>.nuevo completo y <log>.1 borrado, pero sin reemplazar el snapshot"""
+    almacen = abrir(tipo, tmp_path)
+    almacen.agregar(calificaciones(20))
+    almacen.actualizar("E003", "MAT101", "1", "RED101")
+    esperadas = almacen.todas()
+    pares, siguiente_rowid = almacen.tabla.congelar()
+    almacen.escribir_snapshot(almacen.ruta_nuevo, pares, siguiente_rowid)
+    almacen.cerrar()
+    os.truncate(almacen.ruta_log, 0)
+    
+    almacen = abrir(tipo, tmp_path)
+    assert almacen.todas() == esperadas
+    assert not os.path.exists(almacen.ruta_nuevo)
+    almacen.cerrar()
+
+@pytest.mark.parametrize('tipo', ['csv', 'binario'])
+def test_log_con_entrada_que_no_se_puede_aplicar(tmp_path, tipo):
+    almacen = abrir(tipo, tmp_path)
+    almacen.agregar([{"ID": 7, "Nombre": "Siete", "Materia": 101, "Calificacion": 95}])  # Se guardan como texto
+    ruta_log = almacen.ruta_log
+    almacen.cerrar()
+    with open(ruta_log, 'ab') as log:
+        log.write(b'{"op": "actualizar", "id": "7"}\n')  # Completa, pero sin materia ni calificacion
+    
+    almacen = abrir(tipo, tmp_path)
+    esperadas = [{"ID": "7", "Nombre": "Siete", "Materia": "101", "Calificacion": "95"}]
+    assert almacen.buscar_por_id("7") == esperadas
+    almacen.agregar(calificaciones(1))  # Se escribe detrás de la entrada omitida
+    almacen.compactar()
+    almacen.cerrar()
+    almacen = abrir(tipo, tmp_path)
+    assert almacen.todas() == esperadas + calificaciones(1)
+    almacen.cerrar()
+
+def test_snapshot_binario_con_campos_numericos(tmp_path):
+    ruta = str(tmp_path / 'cal.bin')
+    escribir_binario(ruta, [{"ID": 7, "Nombre": "Siete", "Materia": 101, "Calificacion": 95},
+                            {"ID": "E1", "Nombre": "Uno", "Materia": "MAT101", "Calificacion": 17.5}])
+    snapshot = SnapshotBinario(ruta)
+    assert [snapshot.fila(fila) for fila in range(len(snapshot))] == [
+        {"ID": "7", "Nombre": "Siete", "Materia": "101", "Calificacion": "95"},
+        {"ID": "E1", "Nombre": "Uno", "Materia": "MAT101", "Calificacion": "17.5"}]
+
+def test_escrituras_simultaneas_comparten_fsync(tmp_path):
+    almacen = AlmacenCalificaciones(str(tmp_path / 'cal.csv'), fsync_ms=50)
+    filas = calificaciones(20)
+    inicio = threading.Barrier(len(filas))
+    def agregar(fila):
+        inicio.wait()
+        almacen.agregar([fila])
+    hilos = [threading.Thread(target=agregar, args=(fila,)) for fila in filas]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert almacen.lotes < len(filas)  # Varias escrituras por cada write + fsync
+    almacen.cerrar()
+    almacen = AlmacenCalificaciones(str(tmp_path / 'cal.csv'))
+    assert ordenadas(almacen.todas()) == ordenadas(filas)
+    almacen.cerrar()
+
+def test_lote_que_falla_queda_pendiente_y_se_reintenta(tmp_path, monkeypatch):
+    almacen = AlmacenCalificaciones(str(tmp_path / 'cal.csv'))
+    fsync = os.fsync
+    fallas = [OSError("disco lleno")]
+    def fsync_que_falla(descriptor):
+        if fallas:
+            raise fallas.pop()
+        fsync(descriptor)
+    monkeypatch.setattr(almacenamiento.os, 'fsync', fsync_que_falla)
+    with pytest.raises(EscrituraPendiente):
+        almacen.agregar(calificaciones(1))
+    assert almacen.todas() == calificaciones(1)  # Aplicada aunque sin confirmar
+    almacen.agregar(calificaciones(1, 1))  # Espera al reintento, que baja ambas una sola vez
+    almacen.cerrar()
+    almacen = AlmacenCalificaciones(str(tmp_path / 'cal.csv'))
+    assert almacen.todas() == calificaciones(2)
+    almacen.cerrar()
+
+def test_lock_lectores_a_la_vez_y_escritor_sin_inanicion():
+    lock = LockLecturaEscritura()
+    orden = []
+    def escribir():
+        with lock.escritura():
+            orden.append('escritor')
+    def leer():
+        with lock.lectura():
+            orden.append('lector nuevo')
+    
+    lock.adquirir_lectura()
+    lock.adquirir_lectura()  # Dos lecturas a la vez no se bloquean
+    escritor = threading.Thread(target=escribir)
+    escritor.start()
+    while not lock.escritores_esperando:
+        time.sleep(0.001)
+    lector = threading.Thread(target=leer)  # Llega con un escritor esperando: espera detrás de él
+    lector.start()
+    time.sleep(0.05)
+    assert orden == []
+    lock.liberar_lectura()
+    lock.liberar_lectura()
+    escritor.join()
+    lector.join()
+    assert orden == ['escritor', 'lector nuevo']
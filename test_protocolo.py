@@ -0,0 +1,431 @@
+"""
+Pruebas del enmarcado de mensajes - Laboratorio 2
+Aplicaciones Distribuidas
+
+Servidor de calificaciones (cabecera de longitud) y servidor de NRCs (una línea por mensaje),
+y lo que se apoya en ellos: catálogo de NRCs, cliente de NRCs y modos del servidor
+"""
+import asyncio
+import json
+import selectors
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import nrcs_server
+from nucleo import cliente_nrc, comandos, frentes
+from nucleo.almacenamiento import AlmacenCalificaciones
+from nucleo.cliente_nrc import leer_respuesta_nrc
+from nucleo.protocolo import CABECERA, MAX_MENSAJE, enmarcar, enviar_mensaje, extraer_mensaje, recibir_mensaje
+
+def comando_grande(tamano=100_000):
+    """Comando JSON de más de `tamano` bytes (con acentos: la longitud es en bytes, no en caracteres)"""
+    return json.dumps({"accion": "agregar", "datos": {"nombre": "Ñandú " * (tamano // 6)}}, ensure_ascii=False)
+
+def enviar_en_hilo(sock, datos, pausa=0.0, parte=1000):
+    """Envía `datos` en partes desde otro hilo (el otro extremo lee mientras tanto)"""
+    def enviar():
+        for inicio in range(0, len(datos), parte):
+            sock.sendall(datos[inicio:inicio + parte])
+            time.sleep(pausa)
+    hilo = threading.Thread(target=enviar)
+    hilo.start()
+    return hilo
+
+def test_mensaje_mayor_a_4kb_por_socket():
+    texto = comando_grande()
+    servidor, cliente = socket.socketpair()
+    with servidor, cliente:
+        hilo = threading.Thread(target=enviar_mensaje, args=(cliente, texto))
+        hilo.start()
+        assert recibir_mensaje(servidor) == texto
+        hilo.join()
+
+def test_extraer_mensaje_que_llega_por_partes():
+    primero, segundo = comando_grande(5000), comando_grande(300)
+    datos = enmarcar(primero) + enmarcar(segundo)
+    buffer = bytearray()
+    recibidos = []
+    for inicio in range(0, len(datos), 1000):
+        buffer += datos[inicio:inicio + 1000]
+        while (mensaje := extraer_mensaje(buffer)) is not None:
+            recibidos.append(mensaje)
+    assert recibidos == [primero, segundo]
+    assert buffer == b''
+
+def test_extraer_mensaje_incompleto_no_consume():
+    buffer = bytearray(enmarcar(comando_grande(5000))[:4097])
+    assert extraer_mensaje(buffer) is None
+    assert len(buffer) == 4097
+
+def test_mensaje_excede_maximo():
+    with pytest.raises(ValueError):
+        extraer_mensaje(bytearray(CABECERA.pack(MAX_MENSAJE + 1)))
+
+def test_conexion_cerrada_a_mitad_de_mensaje():
+    servidor, cliente = socket.socketpair()
+    with servidor:
+        cliente.sendall(enmarcar(comando_grande(5000))[:3000])
+        cliente.close()
+        with pytest.raises(ConnectionError):
+            recibir_mensaje(servidor)
+
+def test_cliente_desconectado_entre_mensajes():
+    servidor, cliente = socket.socketpair()
+    with servidor:
+        cliente.close()
+        assert recibir_mensaje(servidor) is None
+
+def test_nrc_respuesta_mayor_a_4kb():
+    respuesta = {"status": "ok", "nrcs": [{"NRC": f"MAT{i:03d}", "Materia": "Cálculo " * 5} for i in range(500)]}
+    servidor, cliente = socket.socketpair()
+    with servidor, cliente, cliente.makefile('rb') as lector:
+        hilo = enviar_en_hilo(servidor, json.dumps(respuesta).encode('utf-8') + b'\n')
+        assert leer_respuesta_nrc(lector) == respuesta
+        hilo.join()
+
+def test_nrc_respuesta_sin_salto_de_linea():
+    servidor, cliente = socket.socketpair()
+    with cliente, cliente.makefile('rb') as lector:
+        servidor.sendall(b'{"status": "error"}')
+        servidor.close()
+        with pytest.raises(ValueError):
+            leer_respuesta_nrc(lector)
+
+def test_nrc_primera_rafaga_enmarcada_mayor_a_4kb():
+    comando = b'BUSCAR_MULTI|' + b','.join(f'NRC{i:05d}'.encode() for i in range(1000)) + b'\nLISTAR\n'
+    servidor, cliente = socket.socketpair()
+    with servidor, cliente:
+        # Partes separadas por pausas menores que ESPERA_SIN_ENMARCADO
+        hilo = enviar_en_hilo(cliente, comando, pausa=0.01)
+        buffer, enmarcado = nrcs_server.leer_primera_rafaga(servidor)
+        hilo.join()
+        while not buffer.endswith(b'LISTAR\n'):
+            buffer += servidor.recv(65536)
+    assert enmarcado
+    comandos, resto = nrcs_server.separar_comandos(buffer)
+    assert comandos == [comando.split(b'\n')[0].decode(), 'LISTAR'] and resto == b''
+
+def test_nrc_primera_rafaga_sin_enmarcado():
+    servidor, cliente = socket.socketpair()
+    with servidor, cliente:
+        cliente.sendall(b'BUSCAR|MAT101')
+        inicio = time.monotonic()
+        assert nrcs_server.leer_primera_rafaga(servidor) == (b'BUSCAR|MAT101', False)
+        assert time.monotonic() - inicio < nrcs_server.ESPERA_SIN_ENMARCADO  # Comando antiguo completo: sin pausa
+
+def test_nrc_primera_rafaga_con_saludo_partido():
+    servidor, cliente = socket.socketpair()
+    with servidor, cliente:
+        # Pausas mayores que ESPERA_SIN_ENMARCADO: el prefijo de HOLA ya indica enmarcado
+        hilo = enviar_en_hilo(cliente, b'HOLA\n', pausa=nrcs_server.ESPERA_SIN_ENMARCADO * 1.5, parte=2)
+        buffer, enmarcado = nrcs_server.leer_primera_rafaga(servidor)
+        hilo.join()
+    assert (buffer, enmarcado) == (b'HOLA\n', True)
+
+def test_nrc_primera_rafaga_ambigua_espera_la_pausa():
+    servidor, cliente = socket.socketpair()
+    with servidor, cliente:
+        cliente.sendall(b'BUSCAR_PREFIJO|Cal')  # Podría ser el inicio de una línea más larga
+        inicio = time.monotonic()
+        assert nrcs_server.leer_primera_rafaga(servidor) == (b'BUSCAR_PREFIJO|Cal', False)
+        assert time.monotonic() - inicio >= nrcs_server.ESPERA_SIN_ENMARCADO
+
+def test_nrc_separar_comandos_deja_el_resto():
+    comandos, resto = nrcs_server.separar_comandos(b'BUSCAR|MAT101\n\nLISTAR\nBUSCAR|RE')
+    assert comandos == ['BUSCAR|MAT101', 'LISTAR']
+    assert resto == b'BUSCAR|RE'
+
+def test_evento_de_catalogo_fuera_de_secuencia_pide_el_catalogo_completo(monkeypatch, tmp_path):
+    mat101, red101, prog201 = ({"NRC": nrc, "Materia": nrc.lower()} for nrc in ('MAT101', 'RED101', 'PROG201'))
+    completo = {"status": "ok", "version": "v3", "data": [mat101, prog201]}
+    pedidos = []
+    monkeypatch.setattr(cliente_nrc, 'enviar_comando_nrc', lambda comando: pedidos.append(comando) or completo)
+    monkeypatch.setattr(cliente_nrc, 'NRC_RESPALDO_ARCHIVO', str(tmp_path / 'respaldo.csv'))
+    monkeypatch.setattr(cliente_nrc, '_respaldo_indice', {"MAT101": mat101})
+    monkeypatch.setattr(cliente_nrc, '_respaldo_version', 'v1')
+    monkeypatch.setattr(cliente_nrc, '_suscripcion_version', 'v1')
+    
+    cliente_nrc.aplicar_evento_catalogo({"status": "ok", "version": "v2", "desde": "v1",
+                                         "agregados": [red101], "eliminados": []})
+    assert pedidos == [] and cliente_nrc._respaldo_indice == {"MAT101": mat101, "RED101": red101}
+    # Se perdió el cambio de v2 a v3: el delta no se aplica y se pide el catálogo completo
+    cliente_nrc.aplicar_evento_catalogo({"status": "ok", "version": "v4", "desde": "v3",
+                                         "agregados": [], "eliminados": ["MAT101"]})
+    assert pedidos == ['LISTAR']
+    assert cliente_nrc._suscripcion_version == cliente_nrc._respaldo_version == 'v3'
+    assert cliente_nrc._respaldo_indice == {"MAT101": mat101, "PROG201": prog201}
+
+@pytest.fixture
+def catalogo_nrc(tmp_path, monkeypatch):
+    """Catálogo de ejemplo cargado en nrcs_server; retorna la ruta de su nrcs.csv"""
+    ruta = tmp_path / 'nrcs.csv'
+    monkeypatch.setattr(nrcs_server, 'ARCHIVO_NRC', str(ruta))
+    monkeypatch.setattr(nrcs_server, '_catalogo', None)
+    monkeypatch.setattr(nrcs_server, '_historial', OrderedDict())
+    nrcs_server.inicializar_nrc_csv()
+    nrcs_server.recargar_catalogo()
+    return ruta
+
+@pytest.fixture
+def servidor_nrc_local(catalogo_nrc, monkeypatch):
+    """
+    cliente_nrc sin estado previo (caché, circuito, respaldo) y con el servidor de NRCs
+    respondiendo en el mismo proceso; retorna la lista de comandos que le llegan.
+    """
+    enviados = []
+    def enviar(comando):
+        enviados.append(comando)
+        return json.loads(json.dumps(nrcs_server.procesar_comando(comando)))
+    monkeypatch.setattr(cliente_nrc, 'enviar_comando_nrc', enviar)
+    estado = {'_cache_nrc': OrderedDict(), '_cache_aciertos': 0, '_cache_fallos': 0, '_cache_generacion': 0,
+              '_vuelos_nrc': {}, '_vuelos_coalescidos': 0, '_cb_estado': 'cerrado', '_cb_fallos': 0,
+              '_respaldo_indice': None, '_respaldo_version': None, 'NRC_RESPALDO_ARCHIVO': None,
+              '_suscripcion_activa': False, '_suscripcion_version': None}
+    for nombre, valor in estado.items():
+        monkeypatch.setattr(cliente_nrc, nombre, valor)
+    return enviados
+
+def test_cache_nrc_guarda_validos_y_no_existentes(servidor_nrc_local, monkeypatch):
+    for _ in range(3):
+        assert cliente_nrc.consultar_nrc(' mat101 ')['status'] == 'ok'
+        assert cliente_nrc.consultar_nrc('XYZ999')['status'] == 'error'
+    assert servidor_nrc_local == ['BUSCAR|MAT101', 'BUSCAR|XYZ999']
+    estadisticas = cliente_nrc.estadisticas_cache_nrc()
+    assert (estadisticas['aciertos'], estadisticas['fallos'], estadisticas['entradas']) == (4, 2, 2)
+    
+    monkeypatch.setattr(cliente_nrc, 'NRC_CACHE_TTL_NEGATIVO', 0)  # "No existe" vence en el acto
+    monkeypatch.setattr(cliente_nrc, 'NRC_CACHE_TAMANO', 2)
+    cliente_nrc.consultar_nrc('ABC000')  # Desaloja a MAT101, la menos usada
+    cliente_nrc.consultar_nrc('ABC000')
+    cliente_nrc.consultar_nrc('MAT101')
+    assert servidor_nrc_local[2:] == ['BUSCAR|ABC000', 'BUSCAR|ABC000', 'BUSCAR|MAT101']
+
+def esperar_hasta(condicion, limite=5.0):
+    """Espera (sondeando) a que otro hilo haga verdadera la condición"""
+    fin = time.monotonic() + limite
+    while not condicion():
+        assert time.monotonic() < fin, "La condición no se cumplió a tiempo"
+        time.sleep(0.005)
+
+def test_consultas_simultaneas_del_mismo_nrc_se_agrupan(servidor_nrc_local, monkeypatch):
+    liberar = threading.Event()
+    enviar = cliente_nrc.enviar_comando_nrc
+    def enviar_lento(comando):
+        liberar.wait(5)
+        return enviar(comando)
+    monkeypatch.setattr(cliente_nrc, 'enviar_comando_nrc', enviar_lento)
+    
+    respuestas = []
+    hilos = [threading.Thread(target=lambda: respuestas.append(cliente_nrc.consultar_nrc('MAT101')))
+             for _ in range(10)]
+    for hilo in hilos:
+        hilo.start()
+    esperar_hasta(lambda: cliente_nrc._vuelos_coalescidos == 9)  # Todos esperan al primero
+    liberar.set()
+    for hilo in hilos:
+        hilo.join()
+    assert servidor_nrc_local == ['BUSCAR|MAT101']
+    assert len(respuestas) == 10 and all(respuesta['status'] == 'ok' for respuesta in respuestas)
+
+def test_circuito_abre_tras_fallos_y_valida_con_el_respaldo(servidor_nrc_local, monkeypatch):
+    enviar = cliente_nrc.enviar_comando_nrc
+    intentos = []
+    def servidor_caido(comando):
+        intentos.append(comando)
+        raise ConnectionRefusedError()
+    monkeypatch.setattr(cliente_nrc, 'enviar_comando_nrc', servidor_caido)
+    monkeypatch.setattr(cliente_nrc, '_respaldo_indice', {"MAT101": {"NRC": "MAT101", "Materia": "Matemáticas I"}})
+    
+    for nrc in ('MAT101', 'RED101', 'FIS101'):
+        cliente_nrc.consultar_nrc(nrc)
+    assert cliente_nrc.estado_circuito_nrc() == 'abierto' and len(intentos) == cliente_nrc.NRC_CB_UMBRAL
+    # Abierto: no se espera al servidor, se responde con la copia local del catálogo
+    assert cliente_nrc.consultar_nrc('MAT101')['status'] == 'ok'
+    assert 'catálogo local' in cliente_nrc.consultar_nrc('QUI101')['mensaje']
+    assert len(intentos) == cliente_nrc.NRC_CB_UMBRAL
+    assert cliente_nrc.estadisticas_cache_nrc()['entradas'] == 0  # Sin servidor no se guarda nada
+    
+    # Vencida la espera pasa una consulta de prueba; si responde, el circuito se cierra
+    monkeypatch.setattr(cliente_nrc, 'NRC_CB_ESPERA', 0)
+    monkeypatch.setattr(cliente_nrc, 'enviar_comando_nrc', enviar)
+    assert cliente_nrc.consultar_nrc('QUI101')['status'] == 'ok'
+    assert cliente_nrc.estado_circuito_nrc() == 'cerrado'
+    assert servidor_nrc_local == ['BUSCAR|QUI101']
+
+def test_lote_de_nrcs_se_valida_con_buscar_multi(servidor_nrc_local, monkeypatch):
+    cliente_nrc.consultar_nrc('RED101')  # Ya en caché: no viaja en el lote
+    resultados = cliente_nrc.consultar_nrcs(['mat101', 'MAT101', 'RED101', 'FIS102', 'XYZ999'])
+    assert servidor_nrc_local == ['BUSCAR|RED101', 'BUSCAR_MULTI|MAT101,FIS102,XYZ999']
+    assert {clave: resultado['status'] for clave, resultado in resultados.items()} == {
+        'MAT101': 'ok', 'RED101': 'ok', 'FIS102': 'ok', 'XYZ999': 'error'}
+    
+    # Un lote grande se parte en comandos que no superan NRC_LOTE_BYTES
+    monkeypatch.setattr(cliente_nrc, 'NRC_LOTE_BYTES', 100)
+    claves = [f'NRC{numero:05d}' for numero in range(40)]
+    resultados = cliente_nrc.consultar_nrcs(claves)
+    lotes = servidor_nrc_local[2:]
+    assert len(lotes) > 1 and all(len(comando) + 1 <= 100 for comando in lotes)
+    assert sorted(resultados) == claves
+
+def test_listar_condicional_responde_no_modificado_o_delta(catalogo_nrc):
+    completo = nrcs_server.procesar_comando('LISTAR')
+    version = completo['version']
+    assert len(completo['data']) == 10
+    assert nrcs_server.procesar_comando(f'LISTAR|{version}') == {"status": "ok", "version": version,
+                                                                "no_modificado": True}
+    
+    filas = [fila for fila in completo['data'] if fila['NRC'] != 'QUI101']
+    filas.append({"NRC": "IA101", "Materia": "Inteligencia Artificial"})
+    with open(catalogo_nrc, 'w', newline='', encoding='utf-8') as file:
+        file.write('NRC,Materia\n' + ''.join(f"{fila['NRC']},{fila['Materia']}\n" for fila in filas))
+    nrcs_server.recargar_catalogo()
+    
+    delta = nrcs_server.procesar_comando(f'LISTAR|{version}')
+    assert delta['desde'] == version and delta['version'] != version
+    assert delta['agregados'] == [{"NRC": "IA101", "Materia": "Inteligencia Artificial"}]
+    assert delta['eliminados'] == ['QUI101']
+    # El cliente rearma el catálogo nuevo a partir del que tenía y el delta
+    indice = cliente_nrc.aplicar_catalogo_nrc({fila['NRC']: fila for fila in completo['data']}, delta)
+    assert sorted(indice.values(), key=lambda fila: fila['NRC']) == sorted(filas, key=lambda fila: fila['NRC'])
+    assert 'data' in nrcs_server.procesar_comando('LISTAR|desconocida')  # Versión que no está en el historial
+
+def test_suscripcion_recibe_el_catalogo_y_cada_cambio(catalogo_nrc):
+    async def suscribirse():
+        servidor = await asyncio.start_server(nrcs_server.atender_conexion_asyncio, '127.0.0.1', 0)
+        reader, writer = await asyncio.open_connection(*servidor.sockets[0].getsockname())
+        writer.write(b'SUSCRIBIR\n')
+        inicial = json.loads(await reader.readline())
+        with open(catalogo_nrc, 'a', encoding='utf-8') as file:
+            file.write('IA101,Inteligencia Artificial\n')
+        nrcs_server.recargar_catalogo()
+        nrcs_server.notificar_suscriptores(inicial['version'])
+        evento = json.loads(await reader.readline())
+        writer.close()
+        await writer.wait_closed()
+        servidor.close()
+        await servidor.wait_closed()
+        return inicial, evento
+    
+    inicial, evento = asyncio.run(suscribirse())
+    assert inicial['evento'] == 'catalogo' and len(inicial['data']) == 10
+    assert evento['evento'] == 'catalogo' and evento['desde'] == inicial['version']
+    assert evento['agregados'] == [{"NRC": "IA101", "Materia": "Inteligencia Artificial"}]
+    assert evento['eliminados'] == []
+
+def test_buscar_prefijo_por_codigo_y_por_palabras(catalogo_nrc):
+    def codigos(comando):
+        respuesta = nrcs_server.procesar_comando(comando)
+        assert respuesta['status'] == 'ok'
+        return [fila['NRC'] for fila in respuesta['data']]
+    
+    assert codigos('BUSCAR_PREFIJO|fis') == ['FIS101', 'FIS102']
+    assert codigos('BUSCAR_PREFIJO|matematicas') == ['MAT101', 'MAT102']  # Sin tildes ni mayúsculas
+    assert codigos('BUSCAR_PREFIJO|dat ba') == ['BDD101']  # Cada palabra es prefijo de una del nombre
+    assert sorted(codigos('BUSCAR_PREFIJO|ii')) == ['FIS102', 'MAT102', 'PRG102']
+    assert codigos('BUSCAR_PREFIJO|prog|1') == ['PRG101']
+    assert len(codigos('BUSCAR_PREFIJO|i|3')) == 3
+    assert codigos('BUSCAR_PREFIJO|xyz') == []
+    assert nrcs_server.procesar_comando('BUSCAR_PREFIJO|  ')['status'] == 'error'
+
+def comando(accion, datos):
+    return enmarcar(json.dumps({"accion": accion, "datos": datos}))
+
+def test_pool_lleno_responde_ocupado_sin_bloquear():
+    servidor, cliente = socket.socketpair()
+    with servidor, cliente:
+        cliente.sendall(comando("buscar", {"id": "E001"}) + comando("listar", {}))
+        time.sleep(0.05)
+        assert frentes.responder_ocupado(servidor, 0.5)  # La conexión vuelve al selector
+        for _ in range(2):  # Una respuesta por cada comando que ya había llegado
+            respuesta = json.loads(recibir_mensaje(cliente))
+            assert respuesta['ocupado'] and respuesta['reintentar_en'] == 0.5 and respuesta['status'] == 'error'
+        
+        inicio = time.monotonic()
+        assert frentes.responder_ocupado(servidor, 0.5)  # Sin nada pendiente no espera al cliente
+        assert time.monotonic() - inicio < 0.1
+        cliente.sendall(comando("buscar", {"id": "E001"})[:10])
+        time.sleep(0.05)
+        assert not frentes.responder_ocupado(servidor, 0.5)  # Mensaje a medias: se debe cerrar
+
+@pytest.fixture
+def almacen_de_prueba(tmp_path, monkeypatch):
+    """Comandos del servidor de calificaciones sobre un almacén vacío y sin validar NRCs"""
+    almacen = AlmacenCalificaciones(str(tmp_path / 'cal.csv'), fsync=False, en_linea=True)
+    monkeypatch.setattr(comandos, 'almacen', almacen)
+    monkeypatch.setattr(comandos, 'validacion_nrc', False)
+    yield almacen
+    almacen.cerrar()
+
+def test_selectors_atiende_varios_clientes_en_un_hilo(almacen_de_prueba):
+    selector = selectors.DefaultSelector()
+    clientes = []
+    for numero in range(3):
+        servidor, cliente = socket.socketpair()
+        servidor.setblocking(False)
+        cliente.settimeout(5)
+        selector.register(servidor, selectors.EVENT_READ,
+                          {"id": numero, "entrada": bytearray(), "salida": bytearray(), "stream": None})
+        clientes.append(cliente)
+    
+    def atender():
+        """Un solo hilo atiende a todos hasta que no queda nada por leer ni por enviar"""
+        while eventos := selector.select(0.1):
+            for key, mascara in eventos:
+                frentes.atender_conexion(selector, key, mascara)
+    
+    for numero, cliente in enumerate(clientes):
+        cliente.sendall(comando("agregar", {"id": f"E{numero}", "nombre": "Ana", "materia": "MAT101",
+                                            "calificacion": "15"}))
+    atender()
+    for cliente in clientes:
+        assert json.loads(recibir_mensaje(cliente))['status'] == 'success'
+    
+    # Dos comandos en la misma ráfaga, el segundo en modo stream (una respuesta por página)
+    clientes[0].sendall(comando("buscar", {"id": "E2"}) + comando("listar", {"stream": True, "limite": 1}))
+    clientes[1].sendall(comando("buscar", {"id": "E1"}))
+    atender()
+    assert json.loads(recibir_mensaje(clientes[0]))['data'][0]['ID'] == 'E2'
+    paginas = [json.loads(recibir_mensaje(clientes[0])) for _ in range(3)]
+    assert [pagina['data'][0]['ID'] for pagina in paginas] == ['E0', 'E1', 'E2'] and paginas[-1]['fin']
+    assert json.loads(recibir_mensaje(clientes[1]))['data'][0]['ID'] == 'E1'
+    for key in list(selector.get_map().values()):
+        key.fileobj.close()
+    for cliente in clientes:
+        cliente.close()
+
+def test_asyncio_limita_los_comandos_en_el_executor(almacen_de_prueba, monkeypatch):
+    activos = []
+    maximo = []
+    def bloqueante(numero):
+        activos.append(numero)
+        maximo.append(len(activos))
+        time.sleep(0.02)
+        activos.remove(numero)
+        return numero
+    
+    async def probar():
+        monkeypatch.setattr(frentes, 'executor_asyncio', ThreadPoolExecutor(max_workers=4))
+        monkeypatch.setattr(frentes, 'limite_executor', asyncio.Semaphore(2))
+        resultados = await asyncio.gather(*(frentes.ejecutar_bloqueante(bloqueante, numero) for numero in range(8)))
+        
+        # Un cliente real: el comando se ejecuta en el executor y la respuesta llega enmarcada
+        servidor = await asyncio.start_server(frentes.manejar_cliente_asyncio, '127.0.0.1', 0)
+        reader, writer = await asyncio.open_connection(*servidor.sockets[0].getsockname())
+        writer.write(comando("agregar", {"id": "E1", "nombre": "Ana", "materia": "MAT101", "calificacion": "15"})
+                     + comando("buscar", {"id": "E1"}))
+        respuestas = [await frentes.recibir_mensaje_asyncio(reader) for _ in range(2)]
+        writer.close()
+        await writer.wait_closed()
+        servidor.close()
+        await servidor.wait_closed()
+        frentes.executor_asyncio.shutdown()
+        return resultados, [json.loads(respuesta) for respuesta in respuestas]
+    
+    resultados, respuestas = asyncio.run(probar())
+    assert resultados == list(range(8)) and max(maximo) == 2  # Nunca más trabajos a la vez que el semáforo
+    assert respuestas[0]['status'] == 'success' and respuestas[1]['data'][0]['ID'] == 'E1'
@@ -8,6 +8,8 @@ import socket
 import json
 import time
 
+from nucleo.protocolo import recibir_mensaje, enviar_mensaje  # Mismo enmarcado que el servidor
+
 HOST = '127.0.0.1'
 PORT = 5001
 
@@ -23,8 +25,8 @@ def enviar_comando(comando, datos=None):
             "datos": datos if datos else {}
         }
         
-        client.send(json.dumps(mensaje).encode('utf-8'))
-        respuesta = client.recv(4096).decode('utf-8')
+        enviar_mensaje(client, json.dumps(mensaje))
+        respuesta = recibir_mensaje(client)
         
         client.close()
         